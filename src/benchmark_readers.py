@@ -0,0 +1,174 @@
+"""读取后端基准测试：对比各后端在生成工作簿上的加载耗时与峰值内存
+
+用法:
+    python src/benchmark_readers.py --rows 20000 200000
+
+每次测量都在独立的新子进程中执行。峰值内存为子进程常驻内存峰值（getrusage 的 ru_maxrss）
+在读取期间的增长量：包含 calamine 等原生解析器在 Python 分配器之外申请的缓冲，
+tracemalloc 统计不到这部分内存。读取前已导入依赖，增长量不含导入开销。
+子进程由 forkserver 创建：spawn 方式经 fork + exec 启动，ru_maxrss 会保留本进程（已读入
+整个工作簿）在 fork 时的峰值，读取期间的增长被掩盖。
+"""
+
+import argparse
+import multiprocessing as mp
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from excel_agent.excel_loader import Workbook
+from excel_agent.readers import available_backends
+
+SHEET_NAME = "CostDataBase"
+COLUMNS = [
+    "Year",
+    "Scenario",
+    "Month",
+    "Function",
+    "Key",
+    "Cost text",
+    "Category",
+    "Amount",
+]
+MONTHS = [
+    "Oct",
+    "Nov",
+    "Dec",
+    "Jan",
+    "Feb",
+    "Mar",
+    "Apr",
+    "May",
+    "Jun",
+    "Jul",
+    "Aug",
+    "Sep",
+]
+
+
+def generate_workbook(path: Path, n_rows: int, seed: int = 0) -> None:
+    """生成与 CostDataBase 结构相同的工作簿（openpyxl 只写模式，避免生成时占用大量内存）"""
+    from openpyxl import Workbook as OpenpyxlWorkbook
+
+    rng = random.Random(seed)
+    wb = OpenpyxlWorkbook(write_only=True)
+    ws = wb.create_sheet(SHEET_NAME)
+    ws.append(COLUMNS)
+    for _ in range(n_rows):
+        ws.append(
+            [
+                rng.choice(["FY24", "FY25", "FY26"]),
+                rng.choice(["Actual", "Budget1"]),
+                rng.choice(MONTHS),
+                rng.choice(["IT", "HR Allocation", "Procurement"]),
+                rng.choice(["K1", "K2", "K3", "K4"]),
+                f"服务{rng.randrange(500)}",
+                rng.choice(["A", "B"]),
+                round(rng.uniform(-1e5, 1e6), 2),
+            ]
+        )
+    wb.save(path)
+
+
+def _max_rss_bytes() -> int:
+    """当前进程的常驻内存峰值（Linux 的 ru_maxrss 单位为 KB，macOS 为字节）"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _read(path: str, backend: Optional[str], queue: mp.Queue) -> None:
+    """子进程：读取一次并报告耗时与峰值内存"""
+    before = _max_rss_bytes()
+    start = time.perf_counter()
+    with Workbook(path, backend=backend) as workbook:
+        df = workbook.parse(workbook.sheet_names[0])
+        used = workbook.backend
+    seconds = time.perf_counter() - start
+    peak = _max_rss_bytes() - before
+
+    queue.put(
+        {"backend": used, "rows": len(df), "seconds": seconds, "peak_bytes": peak}
+    )
+
+
+def measure(path: Path, backend: Optional[str] = None) -> Dict[str, object]:
+    """在独立子进程中测量一次读取的耗时与峰值内存"""
+    ctx = mp.get_context("forkserver")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_read, args=(str(path), backend, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def run(rows_list: List[int], repeat: int, out_dir: Path) -> pd.DataFrame:
+    records = []
+    for n_rows in rows_list:
+        xlsx = out_dir / f"bench_{n_rows}.xlsx"
+        if not xlsx.exists():
+            print(f"生成 {n_rows} 行工作簿: {xlsx}")
+            generate_workbook(xlsx, n_rows)
+
+        # 直接读取的格式：由同一份数据转换
+        df = pd.read_excel(xlsx, sheet_name=SHEET_NAME)
+        csv = xlsx.with_suffix(".csv")
+        df.to_csv(csv, index=False)
+        targets = [(xlsx, backend) for backend in available_backends()]
+        targets.append((csv, None))
+        try:
+            parquet = xlsx.with_suffix(".parquet")
+            df.to_parquet(parquet, index=False)
+            targets.append((parquet, None))
+        except ImportError:
+            print("未安装 pyarrow，跳过 Parquet")
+
+        for path, backend in targets:
+            for _ in range(repeat):
+                result = measure(path, backend)
+                result["file_rows"] = n_rows
+                result["file_mb"] = round(path.stat().st_size / 1024 / 1024, 2)
+                records.append(result)
+                print(
+                    f"{n_rows:>9} 行  {result['backend']:<9} "
+                    f"{result['seconds']:8.2f}s  "
+                    f"{result['peak_bytes'] / 1024 / 1024:8.1f}MB"
+                )
+
+    return pd.DataFrame(records)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="对比 Excel 读取后端的加载耗时与峰值内存"
+    )
+    parser.add_argument("--rows", type=int, nargs="+", default=[20_000, 200_000])
+    parser.add_argument("--repeat", type=int, default=1, help="每个后端重复测量次数")
+    parser.add_argument(
+        "--out-dir", type=Path, default=None, help="生成文件目录，默认临时目录"
+    )
+    args = parser.parse_args()
+
+    out_dir = args.out_dir or Path(tempfile.mkdtemp(prefix="reader_bench_"))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    print(f"可用 Excel 后端: {', '.join(available_backends())}")
+
+    results = run(args.rows, args.repeat, out_dir)
+    summary = (
+        results.groupby(["file_rows", "backend"])
+        .agg(seconds=("seconds", "median"), peak_mb=("peak_bytes", "median"))
+        .assign(peak_mb=lambda d: (d["peak_mb"] / 1024 / 1024).round(1))
+        .round({"seconds": 2})
+    )
+    print()
+    print(summary.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,43 @@
 """FastAPI HTTP 服务（支持流式输出和多表管理）"""
 
 import json
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 from datetime import datetime, date
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Response
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from langchain_core.messages import HumanMessage, AIMessage
 
 from .config import get_config, load_config, set_config
-from .excel_loader import get_loader, reset_loader
-from .graph import get_graph, reset_graph
+from .excel_loader import get_loader, list_workspaces, reset_loader
+from .jobs import Job, get_job_manager
+from .session import (
+    DEFAULT_SESSION,
+    SESSION_COOKIE,
+    SESSION_HEADER,
+    current_session_id,
+    is_valid_session_id,
+    new_session_id,
+    use_session,
+)
+from .sheet_cache import new_content_hasher
+from .snapshot import SnapshotScheduler, restore_snapshot, save_snapshot
+from .watcher import get_file_watcher
+from .readers import SUPPORTED_SUFFIXES
+from .join_view import JoinTooLargeError
+from .graph import get_graph
 from .stream import stream_chat
 from .logger import get_logger
 
 import tempfile
 import os
+import shutil
 from dotenv import load_dotenv
 
 # 确保在 API 模块加载时也尝试加载环境变量，
@@ -59,11 +77,40 @@ def json_dumps(obj, **kwargs):
     return json.dumps(obj, cls=CustomJSONEncoder, **kwargs)
 
 
+def _watch_restored_tables() -> None:
+    """恢复的表中原先监视源文件的，重新开始监视"""
+    for session_id, workspace in list_workspaces().items():
+        with use_session(session_id):
+            for table in workspace.list_tables():
+                if table["watched"]:
+                    get_file_watcher().watch(workspace, table["id"])
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动时从快照恢复工作区，停止时保存快照（excel.snapshot_enabled）"""
+    excel_config = get_config().excel
+    scheduler: Optional[SnapshotScheduler] = None
+    if excel_config.snapshot_enabled:
+        restored = await run_in_threadpool(restore_snapshot)
+        if restored["tables"]:
+            _watch_restored_tables()
+        scheduler = SnapshotScheduler(excel_config.snapshot_interval_seconds)
+        scheduler.start()
+
+    yield
+
+    if scheduler is not None:
+        scheduler.stop()
+        await run_in_threadpool(save_snapshot)
+
+
 # 创建 FastAPI 应用
 app = FastAPI(
     title="Excel 智能问数 Agent",
     description="基于 LangGraph 的 Excel 数据分析助手 API（支持多表）",
     version="0.2.0",
+    lifespan=lifespan,
 )
 
 # 添加 CORS 中间件
@@ -76,6 +123,86 @@ app.add_middleware(
 )
 
 
+# 上传请求中表单边界与其他字段的开销（请求体大小上限 = 文件大小上限 + 该值）
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+
+def _is_upload_path(path: str) -> bool:
+    """是否为上传 Excel / CSV / Parquet 的接口（/upload、/tables/{table_id}/append）"""
+    if path == "/upload":
+        return True
+    return path.startswith("/tables/") and path.endswith("/append")
+
+
+def _upload_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"文件超过大小上限 {get_config().excel.max_upload_mb}MB",
+    )
+
+
+class UploadSizeLimitMiddleware:
+    """限制上传接口的请求体大小（excel.max_upload_mb）
+
+    Starlette 解析 multipart 表单时先把整个文件写入临时文件，接口函数拿到 UploadFile 时
+    请求体已全部接收。因此在解析之前检查：Content-Length 超过上限时直接返回 413，
+    不读取请求体；未声明长度（分块传输）的请求在累计接收超过上限时中止。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        max_mb = get_config().excel.max_upload_mb
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not max_mb
+            or not _is_upload_path(scope["path"])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = max_mb * 1024 * 1024 + UPLOAD_FORM_OVERHEAD
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > max_bytes:
+            error = _upload_too_large()
+            response = JSONResponse(
+                status_code=error.status_code, content={"detail": error.detail}
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    raise _upload_too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(UploadSizeLimitMiddleware)
+
+
+@app.middleware("http")
+async def bind_session(request: Request, call_next):
+    """按 X-Session-Id 请求头或 Cookie 绑定会话工作区（都未提供时使用默认工作区）"""
+    session_id = request.headers.get(SESSION_HEADER) or request.cookies.get(
+        SESSION_COOKIE
+    )
+    if session_id and not is_valid_session_id(session_id):
+        return JSONResponse(status_code=400, content={"detail": "无效的会话ID"})
+
+    with use_session(session_id or DEFAULT_SESSION):
+        return await call_next(request)
+
+
 @app.get("/favicon.ico")
 async def favicon():
     """返回空 favicon 避免 404"""
@@ -87,6 +214,8 @@ class LoadExcelRequest(BaseModel):
 
     file_path: str
     sheet_name: Optional[str] = None
+    watch: Optional[bool] = None  # 监视源文件变化并自动重新加载，默认使用 excel.watch_files
+    columns: Optional[List[str]] = None  # 只加载这些列，默认全部
 
 
 class LoadExcelResponse(BaseModel):
@@ -100,6 +229,15 @@ class LoadExcelResponse(BaseModel):
     tables: Optional[List[Dict[str, Any]]] = None  # 所有表列表
 
 
+class JobSubmittedResponse(BaseModel):
+    """后台任务已提交响应"""
+
+    success: bool
+    message: str
+    job_id: str
+    status: str
+
+
 class ChatRequest(BaseModel):
     """聊天请求"""
 
@@ -152,11 +290,16 @@ class SetActiveTableRequest(BaseModel):
 
 
 @app.get("/", response_class=HTMLResponse)
-async def root():
-    """返回前端页面"""
+async def root(request: Request):
+    """返回前端页面（浏览器首次访问时分配会话 Cookie，每个浏览器使用独立工作区）"""
     frontend_path = Path(__file__).parent / "frontend" / "index.html"
     if frontend_path.exists():
-        return HTMLResponse(content=frontend_path.read_text(encoding="utf-8"))
+        response = HTMLResponse(content=frontend_path.read_text(encoding="utf-8"))
+        if SESSION_COOKIE not in request.cookies:
+            response.set_cookie(
+                SESSION_COOKIE, new_session_id(), httponly=True, samesite="lax"
+            )
+        return response
     return HTMLResponse(
         content="""
     <html>
@@ -210,6 +353,7 @@ async def list_tables():
         "success": True,
         "tables": loader.list_tables(),
         "active_table_id": loader.active_table_id,
+        "memory": loader.memory_usage(),
     }
 
 
@@ -221,9 +365,6 @@ async def set_active_table(request: SetActiveTableRequest):
     if not loader.set_active_table(request.table_id):
         raise HTTPException(status_code=404, detail=f"表不存在: {request.table_id}")
 
-    # 重置图以使用新的活跃表数据
-    reset_graph()
-
     # 获取新活跃表的信息
     active_loader = loader.get_active_loader()
     structure = active_loader.get_structure() if active_loader else None
@@ -246,9 +387,6 @@ async def delete_table(table_id: str):
     if not loader.remove_table(table_id):
         raise HTTPException(status_code=404, detail=f"表不存在: {table_id}")
 
-    # 重置图
-    reset_graph()
-
     return {
         "success": True,
         "message": f"已删除表: {table_id}",
@@ -282,6 +420,43 @@ class JoinTablesRequest(BaseModel):
     keys2: List[str]  # 表2的连接字段列表
     join_type: str = "inner"
     new_name: str
+    confirm: bool = False  # 预估结果超过膨胀上限时，确认后仍执行连接
+
+
+class JoinEstimateRequest(BaseModel):
+    """连接结果预估请求"""
+
+    table1_id: str
+    table2_id: str
+    keys1: List[str]
+    keys2: List[str]
+    join_type: str = "inner"
+
+
+@app.post("/tables/join/estimate")
+async def estimate_join(request: JoinEstimateRequest):
+    """预估连接结果行数与各连接键的扇出（不执行连接）"""
+    loader = get_loader()
+
+    try:
+        estimate = await run_in_threadpool(
+            loader.estimate_join,
+            table1_id=request.table1_id,
+            table2_id=request.table2_id,
+            keys1=request.keys1,
+            keys2=request.keys2,
+            join_type=request.join_type,
+        )
+        max_expansion = get_config().excel.join_max_expansion
+        return {
+            "success": True,
+            "estimate": estimate.to_dict(),
+            "max_expansion": max_expansion,
+            "requires_confirm": max_expansion > 0
+            and estimate.expansion > max_expansion,
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @app.post("/tables/join")
@@ -290,18 +465,18 @@ async def join_tables(request: JoinTablesRequest):
     loader = get_loader()
 
     try:
-        table_id, structure = loader.join_tables(
+        # 预估与建立行映射在线程池中执行，不阻塞事件循环
+        table_id, structure = await run_in_threadpool(
+            loader.join_tables,
             table1_id=request.table1_id,
             table2_id=request.table2_id,
             keys1=request.keys1,
             keys2=request.keys2,
             join_type=request.join_type,
             new_name=request.new_name,
+            confirm=request.confirm,
         )
 
-        # 重置图
-        reset_graph()
-
         return {
             "success": True,
             "message": f"成功创建连接表: {request.new_name}",
@@ -309,6 +484,12 @@ async def join_tables(request: JoinTablesRequest):
             "structure": structure,
             "tables": loader.list_tables(),
         }
+    except JoinTooLargeError as e:
+        # 需要确认：返回预估结果，客户端确认后带 confirm=true 重新提交
+        raise HTTPException(
+            status_code=409,
+            detail={"message": str(e), "estimate": e.estimate.to_dict()},
+        )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -342,6 +523,19 @@ async def suggest_join(request: SuggestJoinRequest):
 
     try:
         suggestion = suggest_join_config(table1_summary, table2_summary)
+
+        # 附带 AI 建议连接的结果行数预估，避免多对多连接被直接执行
+        try:
+            suggestion["estimate"] = loader.estimate_join(
+                request.table1_id,
+                request.table2_id,
+                suggestion["keys1"],
+                suggestion["keys2"],
+                suggestion["join_type"],
+            ).to_dict()
+        except ValueError as e:
+            logger.warning(f"[AI建议] 连接预估失败: {e}")
+
         return {
             "success": True,
             "suggestion": suggestion,
@@ -353,86 +547,264 @@ async def suggest_join(request: SuggestJoinRequest):
         raise HTTPException(status_code=500, detail=f"AI分析失败: {str(e)}")
 
 
-@app.post("/load", response_model=LoadExcelResponse)
-async def load_excel(request: LoadExcelRequest):
-    """通过文件路径加载 Excel 文件（追加模式）"""
+# 上传分块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+async def _save_upload(file: UploadFile) -> tuple[str, str]:
+    """将上传文件分块写入临时文件，边写边计算内容哈希并检查大小上限
+
+    文件保存在独立临时目录中并保留原始文件名（CSV/Parquet 以文件名作为 Sheet 名）。
+    请求体的大小在表单解析前已由 UploadSizeLimitMiddleware 限制，这里按文件本身的大小再检查一次；
+    写盘与哈希在线程池中执行，不阻塞事件循环。
+
+    Returns:
+        (临时文件路径, 内容哈希)
+    """
+    max_bytes = get_config().excel.max_upload_mb * 1024 * 1024
+    digest = new_content_hasher()
+    size = 0
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="excel_upload_"))
+    tmp_path = tmp_dir / Path(file.filename.replace("\\", "/")).name
+    def write(tmp, chunk: bytes) -> None:
+        digest.update(chunk)
+        tmp.write(chunk)
+
     try:
+        with open(tmp_path, "wb") as tmp:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise _upload_too_large()
+                await run_in_threadpool(write, tmp, chunk)
+    except HTTPException:
+        _remove_upload(str(tmp_path))
+        raise
+    except Exception as e:
+        _remove_upload(str(tmp_path))
+        raise HTTPException(status_code=500, detail=f"处理失败: {str(e)}")
+
+    return str(tmp_path), digest.hexdigest()
+
+
+def _remove_upload(file_path: str) -> None:
+    """删除上传的临时文件及其临时目录"""
+    shutil.rmtree(Path(file_path).parent, ignore_errors=True)
+
+
+def _split_names(value: Optional[str]) -> Optional[List[str]]:
+    """解析逗号分隔的列名参数"""
+    if not value:
+        return None
+    return [name.strip() for name in value.split(",") if name.strip()] or None
+
+
+def _load_job(
+    file_path: str,
+    sheet_name: Optional[str],
+    display_name: Optional[str] = None,
+    content_hash: Optional[str] = None,
+    watch: bool = False,
+    columns: Optional[List[str]] = None,
+    uploaded: bool = False,
+) -> Callable[[Job], Dict[str, Any]]:
+    """构建加载 Excel 的后台任务函数（在工作线程中解析，结果为 LoadExcelResponse）
+
+    uploaded 为 True 时 file_path 是 _save_upload 保存的临时文件，解析失败时删除其临时目录。
+    """
+
+    def run(job: Job) -> Dict[str, Any]:
         loader = get_loader()
-        table_id, structure = loader.add_table(request.file_path, request.sheet_name)
+        try:
+            table_id, structure = loader.add_table(
+                file_path, sheet_name, job.update, content_hash, columns
+            )
+        except Exception:
+            if uploaded:
+                _remove_upload(file_path)
+            raise
 
-        # 获取预览
-        active_loader = loader.get_active_loader()
-        preview = active_loader.get_preview() if active_loader else None
+        # 更新文件名（临时文件路径替换为原始文件名）
+        if display_name:
+            table_info = loader.get_table_info(table_id)
+            if table_info:
+                table_info.filename = display_name
+
+        if watch:
+            get_file_watcher().watch(loader, table_id)
 
-        # 重置图以使用新的 Excel 数据
-        reset_graph()
+        # 获取预览
+        table_loader = loader.get_table(table_id)
+        preview = table_loader.get_preview() if table_loader else None
 
         return LoadExcelResponse(
             success=True,
-            message=f"成功加载 Excel 文件: {request.file_path}",
+            message=f"成功加载 Excel 文件: {display_name or file_path}",
             table_id=table_id,
             structure=structure,
             preview=preview,
             tables=loader.list_tables(),
-        )
-    except FileNotFoundError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"加载失败: {str(e)}")
+        ).model_dump()
+
+    return run
+
+
+@app.post("/load", response_model=JobSubmittedResponse, status_code=202)
+async def load_excel(request: LoadExcelRequest):
+    """通过文件路径加载 Excel 文件（追加模式，后台解析，通过 /jobs/{job_id} 查询结果）"""
+    if not Path(request.file_path).exists():
+        raise HTTPException(status_code=404, detail=f"文件不存在: {request.file_path}")
+
+    watch = request.watch
+    if watch is None:
+        watch = get_config().excel.watch_files
+
+    job = get_job_manager().submit(
+        "load",
+        _load_job(
+            request.file_path, request.sheet_name, watch=watch, columns=request.columns
+        ),
+        message=f"加载 Excel 文件: {request.file_path}",
+    )
+    return JobSubmittedResponse(
+        success=True, message=job.message, job_id=job.id, status=job.status
+    )
+
 
+@app.post("/upload", response_model=JobSubmittedResponse, status_code=202)
+async def upload_excel(
+    file: UploadFile = File(...),
+    sheet_name: Optional[str] = None,
+    columns: Optional[str] = None,
+):
+    """上传 Excel / CSV / Parquet 文件（追加模式，后台解析，通过 /jobs/{job_id} 查询结果）
 
-@app.post("/upload", response_model=LoadExcelResponse)
-async def upload_excel(file: UploadFile = File(...), sheet_name: Optional[str] = None):
-    """上传 Excel 文件（追加模式，会添加到多表管理器）"""
+    columns 为逗号分隔的列名，指定时只加载这些列。
+    """
     if not file.filename:
         raise HTTPException(status_code=400, detail="未提供文件")
 
     # 检查文件扩展名
     suffix = Path(file.filename).suffix.lower()
-    if suffix not in [".xlsx", ".xls", ".xlsm"]:
+    if suffix not in SUPPORTED_SUFFIXES:
         raise HTTPException(status_code=400, detail=f"不支持的文件格式: {suffix}")
 
-    try:
-        # 保存到临时文件
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            content = await file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
+    column_list = _split_names(columns)
+
+    # 分块保存到临时文件，同时计算内容哈希
+    tmp_path, content_hash = await _save_upload(file)
+
+    # 解析放到后台任务中执行，接口立即返回
+    job = get_job_manager().submit(
+        "upload",
+        _load_job(
+            tmp_path,
+            sheet_name,
+            file.filename,
+            content_hash,
+            columns=column_list,
+            uploaded=True,
+        ),
+        message=f"上传并加载 Excel 文件: {file.filename}",
+    )
+    return JobSubmittedResponse(
+        success=True, message=job.message, job_id=job.id, status=job.status
+    )
+
+
+def _append_job(
+    table_id: str,
+    file_path: str,
+    sheet_name: Optional[str],
+    key_columns: Optional[List[str]],
+    display_name: str,
+) -> Callable[[Job], Dict[str, Any]]:
+    """构建增量追加的后台任务函数"""
 
-        # 加载 Excel（追加模式）
+    def run(job: Job) -> Dict[str, Any]:
         loader = get_loader()
-        table_id, structure = loader.add_table(tmp_path, sheet_name)
+        try:
+            result = loader.append_table(
+                table_id, file_path, sheet_name, key_columns, job.update
+            )
+        finally:
+            _remove_upload(file_path)
 
-        # 更新文件名（临时文件路径替换为原始文件名）
-        table_info = loader.get_table_info(table_id)
-        if table_info:
-            table_info.filename = file.filename
+        return {
+            "success": True,
+            "message": (
+                f"已追加 {display_name}: 写入 {result['appended']} 行，"
+                f"替换 {result['replaced']} 行"
+            ),
+            **result,
+            "tables": loader.list_tables(),
+        }
 
-        # 获取预览
-        active_loader = loader.get_active_loader()
-        preview = active_loader.get_preview() if active_loader else None
+    return run
 
-        # 重置图
-        reset_graph()
 
-        return LoadExcelResponse(
-            success=True,
-            message=f"成功上传并加载 Excel 文件: {file.filename}",
-            table_id=table_id,
-            structure=structure,
-            preview=preview,
-            tables=loader.list_tables(),
-        )
+@app.post(
+    "/tables/{table_id}/append", response_model=JobSubmittedResponse, status_code=202
+)
+async def append_table(
+    table_id: str,
+    file: UploadFile = File(...),
+    sheet_name: Optional[str] = None,
+    keys: Optional[str] = None,
+):
+    """上传增量数据（Excel 或 CSV）追加到已加载的表（后台执行，通过 /jobs/{job_id} 查询结果）
+
+    keys 为逗号分隔的按键更新列：增量中出现的键会替换表中同键的全部行；
+    不传时使用配置 excel.upsert_keys，均未配置时纯追加。
+    """
+    if get_loader().get_table(table_id) is None:
+        raise HTTPException(status_code=404, detail=f"表不存在: {table_id}")
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="未提供文件")
+
+    suffix = Path(file.filename).suffix.lower()
+    if suffix not in SUPPORTED_SUFFIXES:
+        raise HTTPException(status_code=400, detail=f"不支持的文件格式: {suffix}")
+
+    key_columns = _split_names(keys)
+    tmp_path, _ = await _save_upload(file)
+
+    job = get_job_manager().submit(
+        "append",
+        _append_job(table_id, tmp_path, sheet_name, key_columns, file.filename),
+        message=f"追加增量数据到表 {table_id}: {file.filename}",
+    )
+    return JobSubmittedResponse(
+        success=True, message=job.message, job_id=job.id, status=job.status
+    )
+
+
+@app.get("/jobs")
+async def list_jobs():
+    """获取当前会话的后台任务列表"""
+    jobs = get_job_manager().list_jobs(current_session_id())
+    return {"success": True, "jobs": [job.to_dict() for job in jobs]}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """查询后台任务的状态、进度与结果（只能查询当前会话提交的任务）"""
+    job = get_job_manager().get(job_id)
+    if job is None or job.session_id != current_session_id():
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    return {"success": True, **job.to_dict()}
+
+
+@app.post("/snapshot")
+async def snapshot():
+    """立即保存所有会话工作区的快照（服务重启后自动恢复）"""
+    try:
+        result = await run_in_threadpool(save_snapshot)
     except Exception as e:
-        # 清理临时文件
-        if "tmp_path" in locals():
-            try:
-                os.unlink(tmp_path)
-            except:
-                pass
-        raise HTTPException(status_code=500, detail=f"处理失败: {str(e)}")
+        logger.error(f"保存工作区快照失败: {e}")
+        raise HTTPException(status_code=500, detail=f"保存快照失败: {str(e)}")
+    return {"success": True, **result}
 
 
 @app.post("/chat", response_model=ChatResponse)
@@ -553,9 +925,8 @@ async def chat_stream(request: ChatRequest):
 
 @app.post("/reset")
 async def reset():
-    """重置 Agent 状态（清空所有表）"""
+    """重置 Agent 状态（清空当前会话的所有表）"""
     reset_loader()
-    reset_graph()
     return {"success": True, "message": "已重置 Agent 状态，所有表已清空"}
 
 
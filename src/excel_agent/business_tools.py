@@ -3,7 +3,7 @@ from typing import Any, Dict, Optional, List
 import pandas as pd
 from langchain_core.tools import tool
 from .excel_loader import get_loader
-from .tools import _df_to_result
+from .tools import _df_to_result, _select
 
 @tool
 def get_service_details(
@@ -25,37 +25,27 @@ def get_service_details(
         包含服务内容（Cost text）和代码（Key）的列表。
     """
     loader = get_loader()
-    tables = loader.get_loaded_dataframes()
+    tables = loader.get_loaded_tables()
     
     cdb = tables.get("CostDataBase")
     if cdb is None:
         return {"error": "未找到 CostDataBase 表，请先加载数据。"}
 
-    # 构建查询条件
-    query_parts = [f"Function == '{function}'"]
-    
-    if year:
-        query_parts.append(f"Year == '{year}'")
-    
-    if scenario:
-        query_parts.append(f"Scenario == '{scenario}'")
-        
-    query_str = " and ".join(query_parts)
+    # 构建查询条件（year/scenario 未提供时不筛选）
+    conditions = {"Function": function, "Year": year or None, "Scenario": scenario or None}
     
     try:
-        filtered_df = cdb.query(query_str)
-        
         # 提取相关列并去重
         # 假设主要关注 'Cost text' 和 'Key'，如果还有其他描述性字段也可以加上
         # 根据之前的日志，列名有 ['BL', 'CC', 'Year', 'Scenario', 'Month', 'Key', 'Function', 'Cost text', 'Account', 'Category', 'Amount']
         target_cols = ['Cost text', 'Key']
         # 确保列存在
-        available_cols = [c for c in target_cols if c in filtered_df.columns]
+        available_cols = [c for c in target_cols if c in cdb.columns]
         
         if not available_cols:
              return {"error": f"CostDataBase 中未找到目标列 {target_cols}"}
 
-        result_df = filtered_df[available_cols].drop_duplicates()
+        result_df = _select(cdb, conditions, available_cols).drop_duplicates()
         
         return _df_to_result(result_df)
         
@@ -0,0 +1,148 @@
+"""加载后的列类型压缩 - 低基数字符串转 category
+
+数值列（金额等度量）保持 float64/int64：降为 float32 会让 sum/mean 在低精度下累加而失真，
+降为窄整数会让查询中的算术（如 s * 100）静默溢出。需要更窄类型的列（如 ID）在 Sheet 结构中显式声明。
+"""
+
+from dataclasses import dataclass, field
+from typing import Collection, Dict, List, Tuple
+
+import pandas as pd
+
+# 财年月份顺序（10 月起始）
+FISCAL_MONTHS = [
+    "Oct",
+    "Nov",
+    "Dec",
+    "Jan",
+    "Feb",
+    "Mar",
+    "Apr",
+    "May",
+    "Jun",
+    "Jul",
+    "Aug",
+    "Sep",
+]
+
+# 有序维度：列名 -> 取值顺序（列中所有取值都在顺序表内时才会转换）
+ORDERED_DIMENSIONS: Dict[str, List[str]] = {
+    "Month": FISCAL_MONTHS,
+}
+
+
+@dataclass
+class CompactionReport:
+    """类型压缩报告"""
+
+    bytes_before: int = 0
+    bytes_after: int = 0
+    # 列名 -> "旧类型 -> 新类型"
+    converted_columns: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "bytes_saved": self.bytes_saved,
+            "converted_columns": self.converted_columns,
+        }
+
+
+def _is_string_column(col: pd.Series) -> bool:
+    """对象列中的非空值是否全部为字符串"""
+    if col.dtype != object:
+        return False
+    non_null = col.dropna()
+    if non_null.empty:
+        return False
+    return bool(non_null.map(type).eq(str).all())
+
+
+def _compact_column(col: pd.Series, max_category_ratio: float) -> pd.Series:
+    """压缩单列，无法压缩时原样返回"""
+    name = str(col.name)
+
+    if _is_string_column(col):
+        order = ORDERED_DIMENSIONS.get(name)
+        if order is not None and col.dropna().isin(order).all():
+            return col.astype(pd.CategoricalDtype(categories=order, ordered=True))
+
+        n_unique = col.nunique(dropna=True)
+        if len(col) and n_unique / len(col) <= max_category_ratio:
+            return col.astype("category")
+        return col
+
+    return col
+
+
+def compact_dataframe(
+    df: pd.DataFrame, max_category_ratio: float = 0.5, exclude: Collection = ()
+) -> Tuple[pd.DataFrame, CompactionReport]:
+    """压缩 DataFrame 的列类型
+
+    - 低基数字符串列（去重值 / 行数 <= max_category_ratio）转为 category
+    - ORDERED_DIMENSIONS 中的列（如 Month）转为有序 category
+    - 数值列保持原类型（不降精度）
+
+    Args:
+        df: 原始 DataFrame
+        max_category_ratio: 转为 category 的最大去重比例
+        exclude: 不压缩的列（如已按声明结构确定类型的列）
+
+    Returns:
+        (压缩后的 DataFrame, 压缩报告)
+    """
+    report = CompactionReport(bytes_before=int(df.memory_usage(deep=True).sum()))
+
+    result = df.copy(deep=False)
+    for i, name in enumerate(df.columns):
+        if name in exclude:
+            continue
+        original = df.iloc[:, i]
+        compacted = _compact_column(original, max_category_ratio)
+        if compacted.dtype != original.dtype:
+            report.converted_columns[str(name)] = (
+                f"{original.dtype} -> {compacted.dtype}"
+            )
+            result.isetitem(i, compacted)
+
+    report.bytes_after = int(result.memory_usage(deep=True).sum())
+    return result, report
+
+
+def concat_aligned(base: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    """将增量行追加到已压缩的表后，保持列类型
+
+    category 列按需扩展分类（新取值追加到分类末尾，已有编码不变），
+    数值列由 pandas 取公共类型（如 int16 与 int64 合并为 int64）。
+
+    Args:
+        base: 原表（不会被修改）
+        delta: 列名与原表一致的增量行
+
+    Returns:
+        合并后的新 DataFrame（行索引重新编号）
+    """
+    base = base.copy(deep=False)
+    delta = delta[list(base.columns)].copy(deep=False)
+    for i in range(len(base.columns)):
+        col = base.iloc[:, i]
+        if not isinstance(col.dtype, pd.CategoricalDtype):
+            continue
+        categories = list(col.cat.categories)
+        known = set(categories)
+        new_values = [v for v in delta.iloc[:, i].dropna().unique() if v not in known]
+        dtype = col.dtype
+        if new_values:
+            dtype = pd.CategoricalDtype(
+                categories + new_values, ordered=col.cat.ordered
+            )
+            base.isetitem(i, col.cat.set_categories(dtype.categories))
+        delta.isetitem(i, delta.iloc[:, i].astype(dtype))
+
+    return pd.concat([base, delta], ignore_index=True)
@@ -3,7 +3,7 @@
 import os
 import re
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
 import yaml
 from pydantic import BaseModel, Field
@@ -67,6 +67,17 @@ class ModelConfig(BaseModel):
         }
 
 
+class SheetSchema(BaseModel):
+    """数据 Sheet 的声明式结构：加载时按声明投影列、指定类型，结构漂移时直接报错"""
+
+    columns: List[str] = Field(default_factory=list)  # 只加载这些列，为空表示全部
+    # 列名 -> 类型（如 float64、int32、str），读取时直接按该类型解析
+    dtypes: Dict[str, str] = Field(default_factory=dict)
+    categorical: List[str] = Field(default_factory=list)  # 无序分类维度
+    ordered: Dict[str, List[str]] = Field(default_factory=dict)  # 有序维度 -> 取值顺序
+    infer_types: bool = True  # 未声明类型的列是否仍按启发式压缩（compact_dtypes）
+
+
 class ExcelConfig(BaseModel):
     """Excel 配置"""
 
@@ -74,6 +85,73 @@ class ExcelConfig(BaseModel):
     default_result_limit: int = 20
     max_result_limit: int = 1000
 
+    # 解析结果本地缓存（按文件内容哈希寻址，需要 pyarrow）
+    cache_enabled: bool = True
+    cache_dir: str = ".excel_cache"
+    cache_max_mb: int = 2048  # 缓存总大小上限，超出后按 LRU 淘汰
+
+    # Excel 读取后端：auto（已安装的最快后端）/ openpyxl / calamine（需 pip install python-calamine）
+    reader_backend: str = "auto"
+
+    # CSV 读取：列名 -> 类型提示（如 {"Amount": "float64", "CC": "str"}），依次尝试的编码
+    csv_dtypes: Dict[str, str] = Field(default_factory=dict)
+    csv_encodings: List[str] = Field(default_factory=lambda: ["utf-8-sig", "gb18030"])
+
+    # 按 Sheet 名声明的结构（见 SheetSchema），未声明的 Sheet 按原方式推断类型
+    sheet_schemas: Dict[str, SheetSchema] = Field(default_factory=dict)
+
+    # 超大 Sheet 流式读取：单元格数（行×列）达到阈值时逐行只读解析，0 表示禁用
+    streaming_threshold_cells: int = 2_000_000
+    streaming_chunk_rows: int = 50_000  # 每批转换为列缓冲的行数
+
+    # 加载后类型压缩：低基数字符串转 category（数值列保持原类型）
+    compact_dtypes: bool = True
+    category_max_ratio: float = 0.5  # 去重值 / 行数 不超过该比例的字符串列转为 category
+
+    # 注入 Prompt 的字段值字典：总 Token 预算与每列最多保留的取值数
+    value_dictionary_token_budget: int = 3000
+    value_dictionary_max_values: int = 30
+
+    # 连接表以惰性视图保存（源表引用 + 行映射），按需物化；开启后首次物化完整表时缓存结果
+    join_view_cache_full: bool = False
+    # 预估连接结果行数超过两表行数之和的该倍数时拒绝执行（需确认），0 表示不限制
+    join_max_expansion: float = 10.0
+
+    # 已加载表的内存预算：驻留内存超过预算时，最近最少访问的表溢出到本地列式文件，
+    # 访问时自动读回（需要 pyarrow），0 表示不限制
+    memory_budget_mb: int = 4096
+    spill_dir: str = ".excel_spill"
+
+    # 后台导入任务的工作线程数（上传/加载在线程池中解析，不阻塞事件循环）
+    ingest_workers: int = 2
+    # 上传文件大小上限，0 表示不限制：请求体在解析表单前按 Content-Length 检查（未声明长度时按累计接收量），
+    # 超过上限返回 413，不接收整个文件
+    max_upload_mb: int = 200
+
+    # 监视通过路径加载的源文件（轮询修改时间与大小），变化时在后台重新加载并原子替换
+    watch_files: bool = False  # /load 未指定 watch 时的默认值
+    watch_interval_seconds: float = 5.0
+
+    # 增量追加：Sheet 名 -> 按键更新的列（增量中出现的键会替换表中同键的全部行），未配置时纯追加
+    upsert_keys: Dict[str, List[str]] = Field(default_factory=dict)
+
+    # 工作区快照：定期及停止服务时将各会话的表（无压缩 Feather）、表信息、连接关系与活跃表
+    # 写入本地目录，启动服务时恢复（数据在首次访问时以内存映射读取，需要 pyarrow）
+    snapshot_enabled: bool = False
+    snapshot_dir: str = ".excel_snapshot"
+    snapshot_interval_seconds: float = 300.0  # 定期快照间隔，0 表示只在停止服务时保存
+
+    # 建立二级索引（取值 -> 行号）的维度列，等值筛选直接查索引；category 类型的列也会建立索引
+    index_columns: List[str] = Field(
+        default_factory=lambda: ["Year", "Scenario", "Function", "BL", "CC", "Key"]
+    )
+
+    # 筛选结果缓存：按（表、数据版本、规范化的筛选条件）缓存命中的行号，LRU 淘汰，0 表示不缓存
+    filter_cache_mb: int = 64
+
+    # 会话工作区（按 X-Session-Id 请求头或 Cookie 隔离）空闲超过该时长后回收，0 表示不回收
+    session_idle_minutes: int = 240
+
 
 class ServerConfig(BaseModel):
     """服务器配置"""
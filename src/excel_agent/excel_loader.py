@@ -1,14 +1,55 @@
 """Excel 加载与管理模块 - 支持多表管理"""
 
+import hashlib
+import os
+import shutil
+import threading
+import time
 import uuid,json
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Hashable, List, Optional
 
 import pandas as pd
 
+from .compaction import CompactionReport, compact_dataframe, concat_aligned
 from .config import get_config
+from .join_view import (
+    JOIN_SUFFIXES,
+    ColumnSource,
+    JoinEstimate,
+    JoinTooLargeError,
+    JoinView,
+    estimate_join_rows,
+)
+from .indexes import update_column_index
+from .jobs import sessions_with_active_jobs
+from .logger import get_logger
+from .readers import SUPPORTED_SUFFIXES, SheetReader, backend_cache_tag, open_reader
+from .session import DEFAULT_SESSION, current_session_id
+from .sheet_schema import (
+    SchemaDriftError,
+    apply_schema,
+    check_columns,
+    conform_delta,
+    get_sheet_schema,
+    projected_columns,
+    reader_dtypes,
+)
+from .sheet_cache import (
+    WorkbookManifest,
+    file_content_hash,
+    get_sheet_cache,
+    read_feather_mapped,
+)
+from .value_dictionary import (
+    build_table_values,
+    build_value_dictionary,
+    update_table_values,
+)
+
+logger = get_logger("excel_agent.excel_loader")
 
 # ============== 外部配置：字段名白名单 ==============
 # 在此配置需要保留所有类型值的字段名，可根据需求随时修改
@@ -29,6 +70,258 @@ class TableInfo:
     loaded_at: datetime = field(default_factory=datetime.now)
     is_joined: bool = False  # 是否为连接表
     source_tables: List[str] = field(default_factory=list)  # 源表名称列表
+    watched: bool = False  # 是否监视源文件变化并自动重新加载
+
+
+# 上下文 Sheet：不作为数据表加载，而是作为 Agent 的业务上下文
+CONTEXT_SHEETS = ["解释和逻辑", "问题"]
+
+
+def _frame_to_text(df: pd.DataFrame) -> str:
+    """将上下文 Sheet 转换为 Markdown 文本"""
+    try:
+        return df.to_markdown(index=False)
+    except ImportError:
+        # 如果缺少 tabulate，降级使用 to_string
+        return df.to_string(index=False)
+
+
+def _validate_excel_path(file_path: str) -> None:
+    """校验文件存在且为支持的格式（Excel，或直接读取的 CSV/Parquet）"""
+    path = Path(file_path)
+    if not path.exists():
+        raise FileNotFoundError(f"文件不存在: {file_path}")
+
+    if path.suffix.lower() not in SUPPORTED_SUFFIXES:
+        raise ValueError(f"不支持的文件格式: {path.suffix}")
+
+
+def _resolve_sheet_name(all_sheets: List[str], sheet_name: Optional[str]) -> str:
+    """确定要加载的工作表，未指定时取第一个数据 Sheet"""
+    if sheet_name is None:
+        # 排除掉上下文 Sheet，寻找第一个数据 Sheet
+        data_sheets = [s for s in all_sheets if s not in CONTEXT_SHEETS]
+        return data_sheets[0] if data_sheets else all_sheets[0]
+
+    if sheet_name not in all_sheets:
+        raise ValueError(f"工作表 '{sheet_name}' 不存在，可用工作表: {all_sheets}")
+    return sheet_name
+
+
+def _load_options(
+    sheet_name: str, columns: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """影响解析结果的加载选项（参与缓存键计算，含声明结构的列投影与列类型）"""
+    options: Dict[str, Any] = {"reader": backend_cache_tag()}
+    schema = get_sheet_schema(sheet_name)
+    usecols = projected_columns(schema, columns)
+    if usecols:
+        options["columns"] = usecols
+    dtypes = reader_dtypes(schema, columns)
+    if dtypes:
+        options["dtypes"] = dtypes
+    return options
+
+
+def _share_key(
+    content_hash: str, sheet_name: str, columns: Optional[List[str]] = None
+) -> tuple:
+    """可共享数据的键：内容相同、Sheet 相同且加载/压缩选项相同的表数据完全一致"""
+    excel_config = get_config().excel
+    options = {
+        **_load_options(sheet_name, columns),
+        "compact_dtypes": excel_config.compact_dtypes,
+        "category_max_ratio": excel_config.category_max_ratio,
+    }
+    schema = get_sheet_schema(sheet_name)
+    if schema is not None:
+        options["schema"] = schema.model_dump()
+    return (content_hash, sheet_name, json.dumps(options, sort_keys=True))
+
+
+# 溢出文件的引用：文件路径 -> 引用该文件的加载器 uid。共享同一数据（share_key 相同）的表
+# 溢出到同一个文件，最后一个引用释放时才删除文件
+_spill_refs: Dict[Path, set] = {}
+_spill_refs_lock = threading.Lock()
+
+
+def _spill_file_path(spill_dir: str, share_key: Optional[tuple], uid: str) -> Path:
+    """溢出文件路径：有共享键时按共享键命名（共享数据的表共用），否则按加载器标识命名"""
+    if share_key is None:
+        return Path(spill_dir) / f"{uid}.feather"
+    digest = hashlib.sha256(json.dumps(list(share_key)).encode("utf-8")).hexdigest()
+    return Path(spill_dir) / f"shared_{digest[:32]}.feather"
+
+
+def _release_spill_file(path: Path, uid: str) -> None:
+    """释放加载器对溢出文件的引用，没有其他引用时删除文件"""
+    with _spill_refs_lock:
+        refs = _spill_refs.get(path)
+        if refs is not None:
+            refs.discard(uid)
+            if refs:
+                return
+            del _spill_refs[path]
+        path.unlink(missing_ok=True)
+
+
+def _read_delta(
+    file_path: str,
+    sheet_name: Optional[str] = None,
+    on_rows: Optional[Callable[[int], None]] = None,
+) -> pd.DataFrame:
+    """读取增量数据（CSV 或 Excel 的一个 Sheet，默认第一个数据 Sheet）"""
+    with Workbook(file_path, on_rows=on_rows) as workbook:
+        return workbook.parse(_resolve_sheet_name(workbook.sheet_names, sheet_name))
+
+
+def _is_text_column(col: pd.Series) -> bool:
+    """列的非空取值是否全部为字符串（category 列看其分类）"""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        values: Any = col.cat.categories
+    elif col.dtype == object:
+        values = col
+    else:
+        return False
+    return pd.api.types.infer_dtype(values, skipna=True) == "string"
+
+
+def _validate_delta(base: pd.DataFrame, delta: pd.DataFrame) -> None:
+    """校验增量数据与表结构一致（列名相同，数值列不能写入非数值，文本列不能写入非文本）"""
+    missing = [c for c in base.columns if c not in delta.columns]
+    extra = [c for c in delta.columns if c not in base.columns]
+    if missing or extra:
+        raise ValueError(f"增量数据的列与表不一致：缺少 {missing}，多出 {extra}")
+
+    for column in base.columns:
+        col = delta[column]
+        if not col.notna().any():
+            continue
+        is_numeric = pd.api.types.is_numeric_dtype
+        if is_numeric(base[column].dtype) and not is_numeric(col.dtype):
+            raise ValueError(f"增量数据的列 '{column}' 不是数值类型: {col.dtype}")
+        if _is_text_column(base[column]) and not _is_text_column(col):
+            # 如数值混入文本维度的分类，筛选与分组会把 5 和 "5" 当作不同取值
+            invalid = [v for v in col.dropna().unique() if not isinstance(v, str)]
+            raise ValueError(
+                f"增量数据的列 '{column}' 为文本列，出现非文本取值 {invalid[:10]}"
+            )
+
+
+# 支持增量更新的派生结果：缓存键类型 -> 更新函数(旧结果, 缓存键, 被移除的行, 新写入的行)，
+# 追加数据后这些结果直接在旧结果上更新，其余派生结果按新版本重新计算
+_DELTA_UPDATERS: Dict[
+    str, Callable[[Any, Hashable, pd.DataFrame, pd.DataFrame], Any]
+] = {
+    "table_values": lambda values, key, removed, added: update_table_values(
+        values, removed, added, key[1]
+    ),
+    "column_index": lambda index, key, removed, added: update_column_index(
+        index, removed, added, key[1]
+    ),
+}
+
+
+# 计入内存预算的索引类派生结果（均提供 nbytes），表溢出到磁盘时一并释放
+_INDEX_KINDS = ("column_index", "search_index")
+
+
+def _cache_kind(key: Hashable) -> Hashable:
+    """派生结果缓存键的类型（如 ("column_index", "Year") -> "column_index"）"""
+    return key[0] if isinstance(key, tuple) else key
+
+
+class Workbook:
+    """已打开的 Excel 工作簿
+
+    整个工作簿（zip 包与共享字符串表）只打开、解析一次，
+    数据 Sheet 与上下文 Sheet 都从同一个读取后端句柄中读取（见 readers.open_reader）。
+    同一文件加载多个 Sheet 时（如 CostDataBase 与 Table7），应复用同一个实例。
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        on_rows: Optional[Callable[[int], None]] = None,
+        backend: Optional[str] = None,
+    ):
+        """
+        Args:
+            file_path: 文件路径（Excel，或直接读取的 CSV/Parquet）
+            on_rows: 流式读取时的进度回调，参数为当前 Sheet 已读取的行数
+            backend: Excel 读取后端，默认使用 excel.reader_backend
+        """
+        _validate_excel_path(file_path)
+
+        self.file_path = file_path
+        self._on_rows = on_rows
+        self._reader: SheetReader = open_reader(file_path, backend)
+        self.sheet_names: List[str] = list(self._reader.sheet_names)
+
+        self._contexts_loaded = False
+        self._business_logic_context = ""
+        self._common_questions_context = ""
+
+    def __enter__(self) -> "Workbook":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """关闭底层文件句柄"""
+        self._reader.close()
+
+    @property
+    def backend(self) -> str:
+        """实际使用的读取后端"""
+        return self._reader.backend
+
+    def parse(
+        self,
+        sheet_name: str,
+        columns: Optional[List[str]] = None,
+        dtypes: Optional[Dict[str, str]] = None,
+    ) -> pd.DataFrame:
+        """从已打开的句柄中解析指定 Sheet（columns 指定时只读取这些列，dtypes 为列类型）"""
+        return self._reader.parse(
+            sheet_name, on_rows=self._on_rows, columns=columns, dtypes=dtypes
+        )
+
+    def header(self, sheet_name: str) -> List[Any]:
+        """只读取指定 Sheet 的列名"""
+        return self._reader.header(sheet_name)
+
+    @property
+    def business_logic_context(self) -> str:
+        """「解释和逻辑」Sheet 的文本内容"""
+        self._load_contexts()
+        return self._business_logic_context
+
+    @property
+    def common_questions_context(self) -> str:
+        """「问题」Sheet 的文本内容"""
+        self._load_contexts()
+        return self._common_questions_context
+
+    def _load_contexts(self) -> None:
+        """解析上下文 Sheet（每个工作簿只解析一次）"""
+        if self._contexts_loaded:
+            return
+        self._contexts_loaded = True
+
+        try:
+            if "解释和逻辑" in self.sheet_names:
+                # 限制行数以减少 Token 消耗 (防止上下文溢出)
+                logic_df = self._reader.parse("解释和逻辑", nrows=20)
+                self._business_logic_context = _frame_to_text(logic_df)
+
+            if "问题" in self.sheet_names:
+                # 限制行数以减少 Token 消耗
+                questions_df = self._reader.parse("问题", nrows=5)
+                self._common_questions_context = _frame_to_text(questions_df)
+        except Exception as e:
+            print(f"Warning: Failed to load context sheets: {e}")
 
 
 class ExcelLoader:
@@ -36,9 +329,32 @@ class ExcelLoader:
 
     def __init__(self):
         self._df: Optional[pd.DataFrame] = None
+        self._view: Optional[JoinView] = None  # 连接表的惰性视图（此时 _df 为空）
         self._file_path: Optional[str] = None
         self._sheet_name: Optional[str] = None
         self._all_sheets: List[str] = []
+        self.content_hash: Optional[str] = None  # 源文件内容哈希
+        self._compaction: Optional[CompactionReport] = None  # 类型压缩报告
+        # 数据与源文件解析结果一致时的共享键（见 _share_key），数据被替换后清空
+        self.share_key: Optional[tuple] = None
+        self.load_columns: Optional[List[str]] = None  # 只加载了这些列（列投影）
+        self.uid: str = uuid.uuid4().hex  # 加载器唯一标识
+        # 连接表的来源（见 MultiExcelLoader.join_tables），快照时据此重建连接视图
+        self.join_lineage: Optional[Dict[str, Any]] = None
+
+        # 内存预算：冷表可溢出到本地列式文件，访问时再读回
+        self.last_access: float = time.monotonic()
+        self.on_page_in: Optional[Callable[["ExcelLoader"], None]] = None
+        self._spilled: bool = False
+        self._spill_path: Optional[Path] = None
+        self._spill_version: Optional[int] = None  # 溢出文件对应的数据版本
+        self._spill_failed_version: Optional[int] = None
+        self._spill_external: bool = False  # 溢出文件为工作区快照文件，不由本表删除
+        self._data_lock = threading.RLock()  # 溢出与读回互斥
+
+        # 数据版本：每次替换数据时递增，派生结果（结构、摘要、预览等）按版本缓存
+        self._version: int = 0
+        self._derived_cache: Dict[Hashable, Any] = {}
 
         # 业务逻辑上下文
         self.business_logic_context: str = ""
@@ -47,99 +363,543 @@ class ExcelLoader:
     @property
     def is_loaded(self) -> bool:
         """是否已加载文件"""
-        return self._df is not None
+        return self._df is not None or self._view is not None or self._spilled
+
+    @property
+    def is_spilled(self) -> bool:
+        """数据是否已溢出到磁盘（下次访问时读回）"""
+        return self._spilled
 
     @property
     def dataframe(self) -> pd.DataFrame:
-        """获取 DataFrame"""
-        if self._df is None:
+        """获取 DataFrame（连接视图会物化完整表，已溢出的表会从磁盘读回）"""
+        self.last_access = time.monotonic()
+        if self._view is not None:
+            return self._view.to_frame()
+
+        with self._data_lock:
+            paged_in = self._spilled
+            if paged_in:
+                self._page_in()
+            df = self._df
+        if df is None:
             raise ValueError("未加载 Excel 文件")
-        return self._df
 
-    def load(self, file_path: str, sheet_name: Optional[str] = None) -> Dict[str, Any]:
+        # 读回后通知管理器重新检查内存预算（在数据锁之外调用，避免与管理器锁互相等待）
+        if paged_in and self.on_page_in is not None:
+            self.on_page_in(self)
+        return df
+
+    @property
+    def column_source(self) -> ColumnSource:
+        """按列取数的数据源：普通表为 DataFrame，连接表为惰性视图（只物化用到的列）"""
+        if self._view is not None:
+            return self._view
+        return self.dataframe
+
+    @property
+    def columns(self) -> List[Any]:
+        """列名列表"""
+        return list(self.column_source.columns)
+
+    @property
+    def memory_bytes(self) -> int:
+        """数据占用的内存（连接视图只计算视图自身的开销）"""
+        if self._view is not None:
+            return self._view.memory_bytes
+        return self.cached(
+            "memory_bytes",
+            lambda: int(self.dataframe.memory_usage(deep=True).sum()),
+        )
+
+    @property
+    def index_bytes(self) -> int:
+        """当前数据版本的索引（列索引、全文索引）占用的内存"""
+        return sum(
+            value.nbytes
+            for key, value in list(self._derived_cache.items())
+            if _cache_kind(key) in _INDEX_KINDS and value is not None
+        )
+
+    @property
+    def resident_bytes(self) -> int:
+        """当前驻留内存的字节数（数据与索引，已溢出的表为 0）"""
+        return 0 if self._spilled else self.memory_bytes + self.index_bytes
+
+    @property
+    def is_spillable(self) -> bool:
+        """是否可以溢出到磁盘（连接视图本身很小，不溢出）"""
+        return (
+            self._df is not None
+            and self._spill_failed_version != self._version
+            and isinstance(self._df.index, pd.RangeIndex)
+            and self._df.index.start == 0
+            and self._df.index.step == 1
+        )
+
+    def spill(self, spill_dir: str) -> bool:
+        """将数据写入本地 Feather 文件并释放内存，返回是否成功
+
+        数据版本未变时复用上次写入的文件，反复溢出/读回不会重复写盘。
+        """
+        with self._data_lock:
+            return self._spill(spill_dir)
+
+    def _spill(self, spill_dir: str) -> bool:
+        if not self.is_spillable:
+            return False
+
+        # 释放前先记录内存大小，供预算统计使用
+        self.memory_bytes
+
+        path = self._spill_path
+        if self._spill_version != self._version or path is None or not path.exists():
+            path = _spill_file_path(spill_dir, self.share_key, self.uid)
+            with _spill_refs_lock:
+                # 共享同一数据的表已写入该文件时直接引用，不重复写盘
+                shared = self.share_key is not None and bool(_spill_refs.get(path))
+                if not (shared and path.exists()):
+                    tmp_path = path.with_suffix(".tmp")
+                    try:
+                        path.parent.mkdir(parents=True, exist_ok=True)
+                        self._df.to_feather(tmp_path)
+                        os.replace(tmp_path, path)
+                    except Exception as e:
+                        logger.warning(
+                            f"表无法溢出到磁盘，保持驻留: {self._sheet_name} ({e})"
+                        )
+                        tmp_path.unlink(missing_ok=True)
+                        self._spill_failed_version = self._version
+                        return False
+                _spill_refs.setdefault(path, set()).add(self.uid)
+            if self._spill_path not in (None, path) and not self._spill_external:
+                _release_spill_file(self._spill_path, self.uid)
+            self._spill_path = path
+            self._spill_version = self._version
+            self._spill_external = False
+
+        self._df = None
+        self._spilled = True
+        # 索引同样释放，读回后按需重建
+        for key in [k for k in self._derived_cache if _cache_kind(k) in _INDEX_KINDS]:
+            del self._derived_cache[key]
+        logger.info(f"表已溢出到磁盘: {self._sheet_name} -> {path.name}")
+        return True
+
+    def _page_in(self) -> None:
+        """从溢出文件读回数据（快照文件以内存映射方式读取）"""
+        if self._spill_external:
+            self._df = read_feather_mapped(self._spill_path)
+            self._derived_cache.pop("memory_bytes", None)
+        else:
+            self._df = pd.read_feather(self._spill_path)
+        self._spilled = False
+        logger.info(f"表已从磁盘读回: {self._sheet_name}")
+
+    def adopt(self, df: pd.DataFrame) -> None:
+        """已溢出的表直接接管其他表读回的同一份数据（共享数据的表不重复读盘）"""
+        with self._data_lock:
+            if self._spilled:
+                self._df = df
+                self._spilled = False
+
+    def release(self) -> None:
+        """释放溢出文件（表被移除或数据被替换时调用，共享的文件在最后一个引用释放时删除）"""
+        with self._data_lock:
+            if self._spill_path is not None and not self._spill_external:
+                _release_spill_file(self._spill_path, self.uid)
+            self._spill_path = None
+            self._spill_version = None
+            self._spill_external = False
+
+    def take(
+        self,
+        rows: Optional[Any] = None,
+        columns: Optional[List[Any]] = None,
+    ) -> pd.DataFrame:
+        """按行号和列名取子表（连接视图只物化这部分数据）
+
+        Args:
+            rows: 行号数组，默认全部行
+            columns: 列名列表，默认全部列
+
+        Returns:
+            DataFrame，索引为原始行标签
+        """
+        if self._view is not None:
+            return self._view.materialize(columns, rows)
+        df = self.dataframe
+        if rows is None:
+            return df if columns is None else df[columns]
+        if columns is None:
+            return df.iloc[rows]
+        if not df.columns.is_unique:
+            return df[columns].iloc[rows]
+        # 逐列按行号取值：只复制命中的行与需要的列，不复制整列或整表
+        return pd.DataFrame(
+            {c: df[c].iloc[rows] for c in columns}, columns=columns, copy=False
+        )
+
+    @property
+    def version(self) -> int:
+        """当前数据版本"""
+        return self._version
+
+    def _set_dataframe(self, df: pd.DataFrame) -> None:
+        """替换数据并递增版本，旧版本的派生结果全部失效"""
+        self.release()
+        self._df = df
+        self._view = None
+        self._spilled = False
+        self.share_key = None
+        self._version += 1
+        self._derived_cache = {}
+
+    def _set_view(self, view: JoinView) -> None:
+        """以连接视图作为数据，递增版本"""
+        self.release()
+        self._df = None
+        self._view = view
+        self._spilled = False
+        self.share_key = None
+        self._version += 1
+        self._derived_cache = {}
+
+    def apply_delta(
+        self, delta: pd.DataFrame, key_columns: Optional[List[str]] = None
+    ) -> Dict[str, int]:
+        """追加增量行，或按键替换同键的行（upsert）
+
+        写时复制：生成新的 DataFrame 并递增版本，不修改可能被其他表或连接视图共享的旧数据。
+        支持增量更新的派生结果（见 _DELTA_UPDATERS）在旧结果上更新，不重新扫描整张表。
+
+        Args:
+            delta: 增量数据，列名必须与表一致
+            key_columns: 按键更新的列；增量中出现的键会替换表中同键的全部行，默认纯追加
+
+        Returns:
+            {"appended": 写入行数, "replaced": 被替换行数, "total_rows": 新行数, "version": 新版本}
+
+        Raises:
+            SchemaDriftError: 表的 Sheet 声明了结构，增量数据与之不一致
+            ValueError: 增量数据的列或类型与表不一致
+        """
+        if self._view is not None:
+            raise ValueError("连接表不支持追加数据")
+
+        # 在数据锁外取数（可能触发读回），替换前再确认版本未变
+        base = self.dataframe
+        version = self._version
+        schema = get_sheet_schema(self._sheet_name)
+        if schema is not None:
+            delta = conform_delta(base, delta, schema, self._sheet_name)
+        _validate_delta(base, delta)
+
+        if key_columns:
+            missing = [c for c in key_columns if c not in base.columns]
+            if missing:
+                raise ValueError(f"按键更新的列不存在: {missing}")
+            replaced = pd.MultiIndex.from_frame(base[key_columns]).isin(
+                pd.MultiIndex.from_frame(delta[key_columns])
+            )
+            removed = base[replaced]
+            kept = base[~replaced].reset_index(drop=True) if replaced.any() else base
+        else:
+            removed = base.iloc[:0]
+            kept = base
+
+        new_df = concat_aligned(kept, delta)
+        added = new_df.iloc[len(kept) :]
+
+        with self._data_lock:
+            if self._version != version:
+                raise RuntimeError("表数据在追加过程中被修改，请重试")
+            old_cache = self._derived_cache
+            self._set_dataframe(new_df)
+            for key, value in old_cache.items():
+                updater = _DELTA_UPDATERS.get(_cache_kind(key))
+                if updater is not None:
+                    self._derived_cache[key] = updater(value, key, removed, added)
+
+        logger.info(
+            f"表已追加数据: {self._sheet_name} +{len(added)} 行"
+            f"（替换 {len(removed)} 行），共 {len(new_df)} 行"
+        )
+        return {
+            "appended": len(added),
+            "replaced": len(removed),
+            "total_rows": len(new_df),
+            "version": self._version,
+        }
+
+    def cached(self, key: Hashable, builder: Callable[[], Any]) -> Any:
+        """获取按数据版本缓存的派生结果，当前版本未计算过时调用 builder 生成
+
+        Args:
+            key: 派生结果的键（如 "structure"、("preview", 5)）
+            builder: 生成派生结果的函数
+
+        Returns:
+            当前数据版本下的派生结果
+        """
+        cache = self._derived_cache
+        if key not in cache:
+            cache[key] = builder()
+        return cache[key]
+
+    def load(
+        self,
+        file_path: str,
+        sheet_name: Optional[str] = None,
+        workbook: Optional["Workbook"] = None,
+        content_hash: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
         """加载 Excel 文件
 
         Args:
             file_path: Excel 文件路径
             sheet_name: 工作表名称，默认加载第一个
+            workbook: 已打开的工作簿句柄，传入时复用其解析结果（同一文件加载多个 Sheet）
+            content_hash: 文件内容哈希，传入时将解析结果写入本地缓存
+            columns: 只加载这些列（Parquet 只解码投影的列），默认全部
 
         Returns:
             文件结构信息
         """
-        path = Path(file_path)
-        if not path.exists():
-            raise FileNotFoundError(f"文件不存在: {file_path}")
+        if workbook is None:
+            with Workbook(file_path) as wb:
+                return self.load(file_path, sheet_name, wb, content_hash, columns)
 
-        if path.suffix.lower() not in [".xlsx", ".xls", ".xlsm"]:
-            raise ValueError(f"不支持的文件格式: {path.suffix}")
+        self._all_sheets = workbook.sheet_names
+        self.business_logic_context = workbook.business_logic_context
+        self.common_questions_context = workbook.common_questions_context
 
-        # 获取所有工作表名称
-        xlsx = pd.ExcelFile(file_path)
-        self._all_sheets = xlsx.sheet_names
+        sheet_name = _resolve_sheet_name(self._all_sheets, sheet_name)
 
-        # 尝试加载特定上下文 Sheet
+        # 声明了结构的 Sheet：先按表头校验，再只读取声明的列并按声明类型解析
+        schema = get_sheet_schema(sheet_name)
+        if schema is not None:
+            check_columns(sheet_name, workbook.header(sheet_name), schema, columns)
         try:
-            if "解释和逻辑" in self._all_sheets:
-                logic_df = pd.read_excel(file_path, sheet_name="解释和逻辑")
-                # 限制行数以减少 Token 消耗 (防止上下文溢出)
-                if len(logic_df) > 20:
-                    logic_df = logic_df.head(20)
-
-                # 将 DataFrame 转换为 Markdown 文本
-                try:
-                    self.business_logic_context = logic_df.to_markdown(index=False)
-                except ImportError:
-                    # 如果缺少 tabulate，降级使用 to_string 或 to_csv
-                    self.business_logic_context = logic_df.to_string(index=False)
-
-            if "问题" in self._all_sheets:
-                questions_df = pd.read_excel(file_path, sheet_name="问题")
-                # 限制行数以减少 Token 消耗
-                if len(questions_df) > 5:
-                    questions_df = questions_df.head(5)
+            df = workbook.parse(
+                sheet_name,
+                projected_columns(schema, columns),
+                reader_dtypes(schema, columns) or None,
+            )
+        except ValueError as e:
+            if schema is None:
+                raise
+            raise SchemaDriftError(sheet_name, f"数据无法按声明的类型读取: {e}") from e
+
+        # 加载数据（直接从已打开的句柄解析，不再重复打开文件）
+        self._set_dataframe(df)
+        self._file_path = workbook.file_path
+        self._sheet_name = sheet_name
+        self.content_hash = content_hash
+        self.load_columns = columns
+
+        if content_hash:
+            manifest = WorkbookManifest(
+                sheet_names=self._all_sheets,
+                business_logic_context=self.business_logic_context,
+                common_questions_context=self.common_questions_context,
+            )
+            get_sheet_cache().put(
+                content_hash,
+                sheet_name,
+                self._df,
+                manifest,
+                _load_options(sheet_name, columns),
+            )
 
-                try:
-                    self.common_questions_context = questions_df.to_markdown(
-                        index=False
-                    )
-                except ImportError:
-                    self.common_questions_context = questions_df.to_string(index=False)
-        except Exception as e:
-            print(f"Warning: Failed to load context sheets: {e}")
+        self._compact()
+        if content_hash:
+            self.share_key = _share_key(content_hash, sheet_name, columns)
+        return self.get_structure()
 
-        # 确定要加载的工作表
-        if sheet_name is None:
-            # 排除掉上下文 Sheet，寻找第一个数据 Sheet
-            data_sheets = [
-                s for s in self._all_sheets if s not in ["解释和逻辑", "问题"]
-            ]
-            if data_sheets:
-                sheet_name = data_sheets[0]
-            else:
-                sheet_name = self._all_sheets[0]
-        elif sheet_name not in self._all_sheets:
-            raise ValueError(
-                f"工作表 '{sheet_name}' 不存在，可用工作表: {self._all_sheets}"
-            )
+    def load_from_cache(
+        self,
+        file_path: str,
+        sheet_name: Optional[str],
+        content_hash: str,
+        columns: Optional[List[str]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """尝试从本地列式缓存加载，未命中返回 None
 
-        # 加载数据
-        self._df = pd.read_excel(file_path, sheet_name=sheet_name)
+        Args:
+            file_path: Excel 文件路径（仅用于记录来源）
+            sheet_name: 工作表名称，默认加载第一个数据 Sheet
+            content_hash: 文件内容哈希
+            columns: 只加载的列（见 load）
+
+        Returns:
+            命中时返回文件结构信息
+        """
+        cache = get_sheet_cache()
+        manifest = cache.get_manifest(content_hash)
+        if manifest is None:
+            return None
+
+        sheet_name = _resolve_sheet_name(manifest.sheet_names, sheet_name)
+        cached = cache.get(
+            content_hash, sheet_name, _load_options(sheet_name, columns)
+        )
+        if cached is None:
+            return None
+
+        self._set_dataframe(cached.dataframe)
         self._file_path = file_path
         self._sheet_name = sheet_name
+        self._all_sheets = manifest.sheet_names
+        self.business_logic_context = manifest.business_logic_context
+        self.common_questions_context = manifest.common_questions_context
+        self.content_hash = content_hash
+        self.load_columns = columns
+
+        self._compact()
+        self.share_key = _share_key(content_hash, sheet_name, columns)
+        return self.get_structure()
+
+    def share_from(self, source: "ExcelLoader", file_path: str) -> Dict[str, Any]:
+        """与另一张内容相同的表共享同一份不可变数据（不重新解析）
+
+        Args:
+            source: 已加载的源表（share_key 非空）
+            file_path: 本表的文件路径（仅用于记录来源）
 
+        Returns:
+            文件结构信息
+        """
+        self._set_dataframe(source.dataframe)
+        self._file_path = file_path
+        self._sheet_name = source._sheet_name
+        self._all_sheets = list(source._all_sheets)
+        self.business_logic_context = source.business_logic_context
+        self.common_questions_context = source.common_questions_context
+        self.content_hash = source.content_hash
+        self._compaction = source._compaction
+        self.load_columns = source.load_columns
+        self.share_key = source.share_key
         return self.get_structure()
 
+    def snapshot_state(self) -> Dict[str, Any]:
+        """可序列化的加载器状态（不含数据，数据由工作区快照单独保存，见 snapshot.py）"""
+        return {
+            "file_path": self._file_path,
+            "sheet_name": self._sheet_name,
+            "all_sheets": list(self._all_sheets),
+            "content_hash": self.content_hash,
+            "share_key": list(self.share_key) if self.share_key else None,
+            "load_columns": self.load_columns,
+            "business_logic_context": self.business_logic_context,
+            "common_questions_context": self.common_questions_context,
+            "compaction": asdict(self._compaction) if self._compaction else None,
+            # 连接视图的内存只含行映射，恢复为物化表后按数据文件大小估算
+            "memory_bytes": None if self._view is not None else self.memory_bytes,
+        }
+
+    def restore_snapshot(self, state: Dict[str, Any], data_path: Path) -> None:
+        """从工作区快照恢复
+
+        数据不立即读取：表以已溢出状态登记，数据仍在快照文件中，首次访问时以内存映射读回。
+
+        Args:
+            state: snapshot_state() 的结果
+            data_path: 快照数据文件（无压缩 Feather）
+        """
+        with self._data_lock:
+            self.release()
+            self._df = None
+            self._view = None
+            self._version += 1
+            # 读回前按快照中的大小参与内存预算，读回后重新计算
+            memory_bytes = state["memory_bytes"] or data_path.stat().st_size
+            self._derived_cache = {"memory_bytes": memory_bytes}
+            self._spilled = True
+            self._spill_path = data_path
+            self._spill_version = self._version
+            self._spill_external = True
+
+        self._file_path = state["file_path"]
+        self._sheet_name = state["sheet_name"]
+        self._all_sheets = list(state["all_sheets"])
+        self.content_hash = state["content_hash"]
+        self.share_key = tuple(state["share_key"]) if state["share_key"] else None
+        self.load_columns = state["load_columns"]
+        self.business_logic_context = state["business_logic_context"]
+        self.common_questions_context = state["common_questions_context"]
+        if state["compaction"]:
+            self._compaction = CompactionReport(**state["compaction"])
+
+    @property
+    def snapshot_file(self) -> Optional[Path]:
+        """数据仍与恢复时的快照文件一致（未被修改）时返回该文件"""
+        if self._spill_external and self._spill_version == self._version:
+            return self._spill_path
+        return None
+
+    def export_feather(self, path: Path) -> None:
+        """将当前数据写入无压缩 Feather 文件（可内存映射读取）
+
+        已溢出的表直接复制溢出文件，不读回内存；连接视图写入物化后的完整表。
+        """
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            with self._data_lock:
+                if self._spilled:
+                    shutil.copyfile(self._spill_path, tmp_path)
+                else:
+                    df = self._view.to_frame() if self._view is not None else self._df
+                    if df is None:
+                        raise ValueError("未加载 Excel 文件")
+                    df.reset_index(drop=True).to_feather(
+                        tmp_path, compression="uncompressed"
+                    )
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def _compact(self) -> None:
+        """加载后压缩列类型（低基数字符串转 category）
+
+        声明了结构的 Sheet 按声明确定列类型，只压缩未声明类型的列。
+        """
+        excel_config = get_config().excel
+        schema = get_sheet_schema(self._sheet_name)
+        if schema is not None and self._df is not None:
+            df, self._compaction = apply_schema(
+                self._df,
+                schema,
+                self._sheet_name,
+                excel_config.compact_dtypes,
+                excel_config.category_max_ratio,
+            )
+            self._set_dataframe(df)
+            return
+        if not excel_config.compact_dtypes or self._df is None:
+            return
+        df, self._compaction = compact_dataframe(
+            self._df, excel_config.category_max_ratio
+        )
+        self._set_dataframe(df)
+
     def get_structure(self) -> Dict[str, Any]:
-        """获取 Excel 结构信息"""
-        if self._df is None:
+        """获取 Excel 结构信息（按数据版本缓存）"""
+        if not self.is_loaded:
             raise ValueError("未加载 Excel 文件")
 
-        config = get_config()
+        return self.cached("structure", self._build_structure)
+
+    def _build_structure(self) -> Dict[str, Any]:
+        """计算结构信息（逐列计算，连接视图不会物化完整表）"""
+        source = self.column_source
 
         # 列信息
         columns_info = []
-        for col in self._df.columns:
-            col_data = self._df[col]
+        for col in source.columns:
+            col_data = source[col]
             dtype = str(col_data.dtype)
             non_null = col_data.count()
             null_count = col_data.isna().sum()
@@ -157,9 +917,12 @@ class ExcelLoader:
             "file_path": self._file_path,
             "sheet_name": self._sheet_name,
             "all_sheets": self._all_sheets,
-            "total_rows": len(self._df),
-            "total_columns": len(self._df.columns),
+            "total_rows": len(source),
+            "total_columns": len(source.columns),
             "columns": columns_info,
+            "memory_bytes": self.memory_bytes,
+            "is_view": self._view is not None,
+            "compaction": self._compaction.to_dict() if self._compaction else None,
         }
 
     def get_preview(self, n_rows: Optional[int] = None) -> Dict[str, Any]:
@@ -171,27 +934,36 @@ class ExcelLoader:
         Returns:
             预览数据
         """
-        if self._df is None:
+        if not self.is_loaded:
             raise ValueError("未加载 Excel 文件")
 
         config = get_config()
         if n_rows is None:
             n_rows = config.excel.max_preview_rows
 
-        preview_df = self._df.head(n_rows)
+        return self.cached(("preview", n_rows), lambda: self._build_preview(n_rows))
+
+    def _build_preview(self, n_rows: int) -> Dict[str, Any]:
+        """计算数据预览"""
+        source = self.column_source
+        preview_df = source.head(n_rows)
 
         return {
-            "columns": list(self._df.columns),
+            "columns": list(source.columns),
             "data": preview_df.to_dict(orient="records"),
             "preview_rows": len(preview_df),
-            "total_rows": len(self._df),
+            "total_rows": len(source),
         }
 
     def get_summary(self) -> str:
         """获取 Excel 摘要信息（用于 Agent 上下文）"""
-        if self._df is None:
+        if not self.is_loaded:
             return "未加载 Excel 文件"
 
+        return self.cached("summary", self._build_summary)
+
+    def _build_summary(self) -> str:
+        """生成摘要文本"""
         structure = self.get_structure()
         preview = self.get_preview()
 
@@ -242,6 +1014,9 @@ class MultiExcelLoader:
         self._tables: Dict[str, ExcelLoader] = {}  # table_id -> ExcelLoader
         self._table_infos: Dict[str, TableInfo] = {}  # table_id -> TableInfo
         self._active_table_id: Optional[str] = None
+        # 后台导入任务与请求处理并发修改表注册信息，登记/删除/切换时加锁
+        self._lock = threading.RLock()
+        self.closed = False  # 工作区已关闭（会话回收或重置）
 
     @property
     def is_loaded(self) -> bool:
@@ -254,21 +1029,203 @@ class MultiExcelLoader:
         return self._active_table_id
 
     def add_table(
-        self, file_path: str, sheet_name: Optional[str] = None
+        self,
+        file_path: str,
+        sheet_name: Optional[str] = None,
+        progress: Optional[Callable[..., None]] = None,
+        content_hash: Optional[str] = None,
+        columns: Optional[List[str]] = None,
     ) -> tuple[str, Dict[str, Any]]:
         """添加一张新表
 
         Args:
             file_path: Excel 文件路径
             sheet_name: 工作表名称
+            progress: 进度回调（见 add_tables）
+            content_hash: 已知的文件内容哈希（见 add_tables）
+            columns: 只加载这些列（见 add_tables）
 
         Returns:
             (表ID, 结构信息)
         """
-        # 创建新的加载器并加载数据
+        return self.add_tables(
+            file_path, [sheet_name], progress, content_hash, columns
+        )[0]
+
+    def add_tables(
+        self,
+        file_path: str,
+        sheet_names: List[Optional[str]],
+        progress: Optional[Callable[..., None]] = None,
+        content_hash: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+    ) -> List[tuple[str, Dict[str, Any]]]:
+        """从同一个 Excel 文件添加多张表
+
+        内容与 Sheet 都相同的表已加载时直接共享其数据（各自登记表信息，内存只占一份）；
+        否则优先从本地列式缓存读取；未命中的 Sheet 共享同一次工作簿解析。
+
+        Args:
+            file_path: Excel 文件路径
+            sheet_names: 工作表名称列表（None 表示第一个数据 Sheet）
+            progress: 进度回调，以关键字参数报告 sheets_total / sheets_parsed / rows_read
+            content_hash: 已知的文件内容哈希（如上传时边写边算），传入时不再重新读文件计算
+            columns: 只加载这些列，默认全部（Parquet 只解码投影的列）
+
+        Returns:
+            [(表ID, 结构信息), ...]，最后一张表自动设为活跃表
+        """
+        _validate_excel_path(file_path)
+
+        rows_read = 0
+
+        def report(**fields: Any) -> None:
+            if progress is not None:
+                progress(**fields)
+
+        report(sheets_total=len(sheet_names), sheets_parsed=0, rows_read=0)
+
+        if content_hash is None:
+            content_hash = file_content_hash(file_path)
+
+        results = []
+        workbook: Optional[Workbook] = None
+
+        def open_workbook() -> Workbook:
+            # 缓存未命中时按需打开工作簿（多个 Sheet 只打开一次）
+            nonlocal workbook
+            if workbook is None:
+                workbook = Workbook(
+                    file_path, on_rows=lambda n: report(rows_read=rows_read + n)
+                )
+            return workbook
+
+        try:
+            for sheet_name in sheet_names:
+                loader, structure = self._load_sheet(
+                    file_path, sheet_name, content_hash, open_workbook, columns
+                )
+                table_id = self._register_table(loader, file_path, structure)
+                results.append((table_id, structure))
+
+                rows_read += structure["total_rows"]
+                report(sheets_parsed=len(results), rows_read=rows_read)
+        finally:
+            if workbook is not None:
+                workbook.close()
+
+        return results
+
+    def _load_sheet(
+        self,
+        file_path: str,
+        sheet_name: Optional[str],
+        content_hash: str,
+        open_workbook: Callable[[], Workbook],
+        columns: Optional[List[str]] = None,
+    ) -> tuple[ExcelLoader, Dict[str, Any]]:
+        """加载单个 Sheet：优先共享已加载的相同数据，其次读本地缓存，最后解析工作簿"""
         loader = ExcelLoader()
-        structure = loader.load(file_path, sheet_name)
+        source = self._find_shared(content_hash, sheet_name, columns)
+        if source is not None:
+            structure = loader.share_from(source, file_path)
+            logger.info(
+                f"表内容与已加载的表相同，共享数据: {structure['sheet_name']}"
+            )
+            return loader, structure
+
+        structure = loader.load_from_cache(
+            file_path, sheet_name, content_hash, columns
+        )
+        if structure is None:
+            structure = loader.load(
+                file_path, sheet_name, open_workbook(), content_hash, columns
+            )
+        return loader, structure
+
+    def reload_table(
+        self, table_id: str, progress: Optional[Callable[..., None]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """从源文件重新加载表，并原子地替换为新数据
+
+        源文件内容哈希与表数据加载时的哈希相同时直接跳过（如只更新了修改时间），
+        已追加到表中的增量数据得以保留；内容变化时，增量数据会被源文件内容覆盖。
+        替换的是表ID指向的加载器，正在执行的查询仍持有旧加载器和旧 DataFrame，
+        看到的是一致的快照；以该表为源的连接表随后按新数据重建。
+
+        Args:
+            table_id: 表ID
+            progress: 进度回调，以关键字参数报告 rows_read
 
+        Returns:
+            新的结构信息；内容未变化或表已被删除时返回 None
+        """
+        old = self.get_table(table_id)
+        info = self.get_table_info(table_id)
+        if not old or not info or info.is_joined:
+            return None
+
+        content_hash = file_content_hash(info.file_path)
+        if old.content_hash is not None and content_hash == old.content_hash:
+            return None
+
+        def on_rows(n: int) -> None:
+            if progress is not None:
+                progress(rows_read=n)
+
+        with Workbook(info.file_path, on_rows=on_rows) as workbook:
+            loader, structure = self._load_sheet(
+                info.file_path,
+                info.sheet_name,
+                content_hash,
+                lambda: workbook,
+                old.load_columns,
+            )
+
+        with self._lock:
+            if self._tables.get(table_id) is not old:
+                return None  # 重新加载期间表被删除或替换
+            self._tables[table_id] = loader
+            info.total_rows = structure["total_rows"]
+            info.total_columns = structure["total_columns"]
+            info.loaded_at = datetime.now()
+
+        loader.on_page_in = self._on_page_in
+        old.release()
+        self._refresh_joins(table_id)
+        self._enforce_memory_budget(keep=loader)
+        logger.info(f"表已从源文件重新加载: {info.filename} ({table_id})")
+        return structure
+
+    def _find_shared(
+        self,
+        content_hash: str,
+        sheet_name: Optional[str],
+        columns: Optional[List[str]] = None,
+    ) -> Optional[ExcelLoader]:
+        """查找内容哈希、Sheet 和加载选项都相同且数据未被修改的已加载表（跨会话工作区）"""
+        loaders = [
+            loader
+            for loader in self._peer_loaders()
+            if loader.share_key is not None and loader.content_hash == content_hash
+        ]
+        if not loaders:
+            return None
+
+        try:
+            sheet_name = _resolve_sheet_name(loaders[0]._all_sheets, sheet_name)
+        except ValueError:
+            return None
+        key = _share_key(content_hash, sheet_name, columns)
+        for loader in loaders:
+            if loader.share_key == key:
+                return loader
+        return None
+
+    def _register_table(
+        self, loader: ExcelLoader, file_path: str, structure: Dict[str, Any]
+    ) -> str:
+        """登记已加载的表并设为活跃表，返回表ID"""
         # 生成唯一ID
         table_id = str(uuid.uuid4())[:8]
 
@@ -276,20 +1233,68 @@ class MultiExcelLoader:
         filename = Path(file_path).name
 
         # 存储表信息
-        self._tables[table_id] = loader
-        self._table_infos[table_id] = TableInfo(
-            id=table_id,
-            filename=filename,
-            file_path=file_path,
-            sheet_name=structure["sheet_name"],
-            total_rows=structure["total_rows"],
-            total_columns=structure["total_columns"],
-        )
+        with self._lock:
+            self._tables[table_id] = loader
+            self._table_infos[table_id] = TableInfo(
+                id=table_id,
+                filename=filename,
+                file_path=file_path,
+                sheet_name=structure["sheet_name"],
+                total_rows=structure["total_rows"],
+                total_columns=structure["total_columns"],
+            )
+
+            # 自动设为活跃表
+            self._active_table_id = table_id
+
+        loader.on_page_in = self._on_page_in
+        self._enforce_memory_budget(keep=loader)
+
+        return table_id
+
+    def append_table(
+        self,
+        table_id: str,
+        file_path: str,
+        sheet_name: Optional[str] = None,
+        key_columns: Optional[List[str]] = None,
+        progress: Optional[Callable[..., None]] = None,
+    ) -> Dict[str, Any]:
+        """将增量文件（Excel Sheet 或 CSV）追加到已加载的表
+
+        Args:
+            table_id: 表ID
+            file_path: 增量文件路径
+            sheet_name: 增量数据所在的 Sheet，默认第一个数据 Sheet
+            key_columns: 按键更新的列，默认使用 excel.upsert_keys 中该表 Sheet 的配置
+            progress: 进度回调，以关键字参数报告 rows_read
+
+        Returns:
+            追加结果（见 ExcelLoader.apply_delta），附带 table_id
+        """
+        loader = self.get_table(table_id)
+        info = self.get_table_info(table_id)
+        if not loader or not info:
+            raise ValueError("指定的表不存在")
+        if key_columns is None:
+            key_columns = get_config().excel.upsert_keys.get(info.sheet_name)
+
+        def on_rows(n: int) -> None:
+            if progress is not None:
+                progress(rows_read=n)
 
-        # 自动设为活跃表
-        self._active_table_id = table_id
+        delta = _read_delta(file_path, sheet_name, on_rows)
+        if projected_columns(get_sheet_schema(info.sheet_name), loader.load_columns):
+            # 表只加载了部分列时，增量数据同样只保留这些列
+            delta = delta[[c for c in delta.columns if c in set(loader.columns)]]
+        result = loader.apply_delta(delta, key_columns)
 
-        return table_id, structure
+        with self._lock:
+            info.total_rows = result["total_rows"]
+        self._refresh_joins(table_id)
+        self._enforce_memory_budget(keep=loader)
+
+        return {"table_id": table_id, **result}
 
     def remove_table(self, table_id: str) -> bool:
         """删除指定表
@@ -300,20 +1305,161 @@ class MultiExcelLoader:
         Returns:
             是否删除成功
         """
-        if table_id not in self._tables:
-            return False
+        with self._lock:
+            if table_id not in self._tables:
+                return False
+
+            self._tables[table_id].release()
+            del self._tables[table_id]
+            del self._table_infos[table_id]
+
+            # 如果删除的是活跃表，切换到另一张表或设为None
+            if self._active_table_id == table_id:
+                if self._tables:
+                    self._active_table_id = next(iter(self._tables.keys()))
+                else:
+                    self._active_table_id = None
 
-        del self._tables[table_id]
-        del self._table_infos[table_id]
+        return True
 
-        # 如果删除的是活跃表，切换到另一张表或设为None
-        if self._active_table_id == table_id:
-            if self._tables:
-                self._active_table_id = next(iter(self._tables.keys()))
-            else:
-                self._active_table_id = None
+    # ===================== 内存预算 =====================
 
-        return True
+    def _peer_loaders(self) -> List[ExcelLoader]:
+        """所有会话工作区中的表（数据共享与内存预算在进程内全局生效）
+
+        依次短暂持有各工作区的锁取快照，不嵌套加锁。
+        """
+        with _workspaces_lock:
+            workspaces = list(_workspaces.values())
+        if not any(workspace is self for workspace in workspaces):
+            workspaces.append(self)
+
+        loaders: List[ExcelLoader] = []
+        for workspace in workspaces:
+            with workspace._lock:
+                loaders.extend(workspace._tables.values())
+        return loaders
+
+    def _on_page_in(self, loader: ExcelLoader) -> None:
+        """表从磁盘读回后，共享同一数据的表一并接管读回的数据，再重新检查内存预算"""
+        df = loader._df
+        if loader.share_key is not None and df is not None:
+            for other in self._peer_loaders():
+                if other is not loader and other.share_key == loader.share_key:
+                    other.adopt(df)
+        self._enforce_memory_budget(keep=loader)
+
+    def _resident_bytes(self, loaders: List[ExcelLoader]) -> int:
+        """驻留内存总量（多张表共享的同一份数据只计算一次，各表的索引分别计算）"""
+        seen = set()
+        total = 0
+        for loader in loaders:
+            if loader.is_spilled:
+                continue
+            total += loader.index_bytes
+            if loader._df is not None:
+                if id(loader._df) in seen:
+                    continue
+                seen.add(id(loader._df))
+            total += loader.memory_bytes
+        return total
+
+    def _enforce_memory_budget(self, keep: Optional[ExcelLoader] = None) -> None:
+        """驻留内存超过 excel.memory_budget_mb 时，按最近最少访问溢出冷表
+
+        预算按进程内所有会话工作区统计。被连接视图引用的源表即使溢出也无法释放内存，
+        因此不参与溢出；共享同一份数据的表作为一组一起溢出。
+
+        Args:
+            keep: 不参与溢出的表（通常是刚加载或刚读回的表）
+        """
+        excel_config = get_config().excel
+        budget = excel_config.memory_budget_mb * 1024 * 1024
+        if budget <= 0:
+            return
+
+        with _memory_lock:
+            self._spill_cold_tables(budget, excel_config.spill_dir, keep)
+
+    def _spill_cold_tables(
+        self, budget: int, spill_dir: str, keep: Optional[ExcelLoader]
+    ) -> None:
+        """溢出最近最少访问的表，直到驻留内存不超过预算"""
+        loaders = self._peer_loaders()
+        total = self._resident_bytes(loaders)
+        if total <= budget:
+            return
+
+        pinned = {
+            id(frame)
+            for loader in loaders
+            if loader._view is not None
+            for frame in loader._view.base_frames()
+        }
+        # 按数据分组：共享同一 DataFrame 的表必须全部溢出才能释放内存
+        groups: Dict[int, List[ExcelLoader]] = {}
+        for loader in loaders:
+            if loader._df is not None:
+                groups.setdefault(id(loader._df), []).append(loader)
+        candidates = sorted(
+            (
+                group
+                for frame_id, group in groups.items()
+                if frame_id not in pinned
+                and all(
+                    loader is not keep and loader.is_spillable for loader in group
+                )
+            ),
+            key=lambda group: max(loader.last_access for loader in group),
+        )
+        for group in candidates:
+            if total <= budget:
+                break
+            size = group[0].memory_bytes + sum(l.index_bytes for l in group)
+            if all([loader.spill(spill_dir) for loader in group]):
+                total -= size
+
+        if total > budget:
+            logger.warning(
+                f"驻留内存 {total / 1024 / 1024:.1f}MB 仍超过预算 "
+                f"{budget / 1024 / 1024:.0f}MB（无更多可溢出的表）"
+            )
+
+    def memory_usage(self) -> Dict[str, Any]:
+        """内存预算使用情况（total_resident_bytes 为所有会话工作区合计，与预算比较）"""
+        with self._lock:
+            loaders = list(self._tables.values())
+        resident = [l for l in loaders if not l.is_spilled]
+        spilled = [l for l in loaders if l.is_spilled]
+        return {
+            "budget_bytes": get_config().excel.memory_budget_mb * 1024 * 1024,
+            "resident_bytes": self._resident_bytes(loaders),
+            "total_resident_bytes": self._resident_bytes(self._peer_loaders()),
+            "spilled_bytes": sum(l.memory_bytes for l in spilled),
+            "index_bytes": sum(l.index_bytes for l in resident),
+            "resident_tables": len(resident),
+            "spilled_tables": len(spilled),
+            "shared_tables": sum(1 for l in loaders if self._shared_with(l, loaders)),
+        }
+
+    def _shared_with(
+        self, loader: ExcelLoader, loaders: List[ExcelLoader]
+    ) -> List[ExcelLoader]:
+        """与指定表共享同一份数据的其他表"""
+        if loader.share_key is None:
+            return []
+        return [
+            other
+            for other in loaders
+            if other is not loader and other.share_key == loader.share_key
+        ]
+
+    def close(self) -> None:
+        """删除所有表的溢出文件"""
+        with self._lock:
+            self.closed = True
+            for loader in self._tables.values():
+                loader.release()
 
     def get_table(self, table_id: str) -> Optional[ExcelLoader]:
         """获取指定表的加载器"""
@@ -344,15 +1490,26 @@ class MultiExcelLoader:
         Returns:
             是否设置成功
         """
-        if table_id not in self._tables:
-            return False
-        self._active_table_id = table_id
+        with self._lock:
+            if table_id not in self._tables:
+                return False
+            self._active_table_id = table_id
         return True
 
     def list_tables(self) -> List[Dict[str, Any]]:
         """获取所有表的信息列表"""
         result = []
-        for table_id, info in self._table_infos.items():
+        with self._lock:
+            entries = [
+                (table_id, info, self._tables[table_id])
+                for table_id, info in self._table_infos.items()
+            ]
+        ids = {id(loader): table_id for table_id, _, loader in entries}
+        loaders = [loader for _, _, loader in entries]
+        for table_id, info, loader in entries:
+            shared_with = [
+                ids[id(other)] for other in self._shared_with(loader, loaders)
+            ]
             result.append(
                 {
                     "id": info.id,
@@ -364,6 +1521,10 @@ class MultiExcelLoader:
                     "is_active": table_id == self._active_table_id,
                     "is_joined": info.is_joined,
                     "source_tables": info.source_tables,
+                    "watched": info.watched,
+                    "resident": not loader.is_spilled,
+                    "memory_bytes": loader.memory_bytes,
+                    "shared_with": shared_with,
                 }
             )
         return result
@@ -372,42 +1533,26 @@ class MultiExcelLoader:
         """获取指定表的列名列表"""
         loader = self.get_table(table_id)
         if loader and loader.is_loaded:
-            return list(loader.dataframe.columns)
+            return loader.columns
         return []
 
-    def join_tables(
+    def _validate_join(
         self,
         table1_id: str,
         table2_id: str,
         keys1: List[str],
         keys2: List[str],
-        join_type: str = "inner",
-        new_name: str = "连接表",
-    ) -> tuple[str, Dict[str, Any]]:
-        """连接两张表（支持多字段连接）
-
-        Args:
-            table1_id: 表1 ID
-            table2_id: 表2 ID
-            keys1: 表1 连接字段列表
-            keys2: 表2 连接字段列表
-            join_type: 连接类型 (inner/left/right/outer)
-            new_name: 新表名称
-
-        Returns:
-            (新表ID, 结构信息)
-        """
+        join_type: str,
+    ) -> tuple[ColumnSource, ColumnSource]:
+        """校验连接参数，返回两表的数据源"""
         # 验证表存在
         loader1 = self.get_table(table1_id)
         loader2 = self.get_table(table2_id)
         if not loader1 or not loader2:
             raise ValueError("指定的表不存在")
 
-        info1 = self.get_table_info(table1_id)
-        info2 = self.get_table_info(table2_id)
-
-        df1 = loader1.dataframe
-        df2 = loader2.dataframe
+        df1 = loader1.column_source
+        df2 = loader2.column_source
 
         # 验证字段数量一致
         if len(keys1) != len(keys2):
@@ -429,48 +1574,218 @@ class MultiExcelLoader:
         if join_type not in valid_join_types:
             raise ValueError(f"不支持的连接类型: {join_type}，可选: {valid_join_types}")
 
-        # 执行连接
-        merged_df = pd.merge(
-            df1,
-            df2,
+        return df1, df2
+
+    def estimate_join(
+        self,
+        table1_id: str,
+        table2_id: str,
+        keys1: List[str],
+        keys2: List[str],
+        join_type: str = "inner",
+    ) -> JoinEstimate:
+        """预估两表连接的结果行数与各连接键的扇出（不执行连接）
+
+        Args:
+            table1_id: 表1 ID
+            table2_id: 表2 ID
+            keys1: 表1 连接字段列表
+            keys2: 表2 连接字段列表
+            join_type: 连接类型 (inner/left/right/outer)
+
+        Returns:
+            JoinEstimate
+        """
+        df1, df2 = self._validate_join(table1_id, table2_id, keys1, keys2, join_type)
+        return estimate_join_rows(df1, df2, keys1, keys2, join_type)
+
+    def join_tables(
+        self,
+        table1_id: str,
+        table2_id: str,
+        keys1: List[str],
+        keys2: List[str],
+        join_type: str = "inner",
+        new_name: str = "连接表",
+        confirm: bool = False,
+    ) -> tuple[str, Dict[str, Any]]:
+        """连接两张表（支持多字段连接）
+
+        连接前先根据连接键频次预估结果行数，超过两表行数之和的
+        excel.join_max_expansion 倍时拒绝执行，除非 confirm=True。
+
+        Args:
+            table1_id: 表1 ID
+            table2_id: 表2 ID
+            keys1: 表1 连接字段列表
+            keys2: 表2 连接字段列表
+            join_type: 连接类型 (inner/left/right/outer)
+            new_name: 新表名称
+            confirm: 是否确认执行超过膨胀上限的连接
+
+        Returns:
+            (新表ID, 结构信息)
+
+        Raises:
+            JoinTooLargeError: 预估结果超过膨胀上限且未确认
+        """
+        df1, df2 = self._validate_join(table1_id, table2_id, keys1, keys2, join_type)
+        info1 = self.get_table_info(table1_id)
+        info2 = self.get_table_info(table2_id)
+
+        # 预估结果行数，防止多对多连接耗尽内存
+        max_expansion = get_config().excel.join_max_expansion
+        if max_expansion > 0 and not confirm:
+            estimate = estimate_join_rows(df1, df2, keys1, keys2, join_type)
+            if estimate.expansion > max_expansion:
+                raise JoinTooLargeError(estimate, max_expansion)
+
+        new_loader = self._create_join_loader(
+            table1_id, table2_id, keys1, keys2, join_type, new_name
+        )
+        view = new_loader.column_source
+
+        # 生成唯一ID
+        table_id = str(uuid.uuid4())[:8]
+
+        # 存储表信息
+        with self._lock:
+            self._tables[table_id] = new_loader
+            self._table_infos[table_id] = TableInfo(
+                id=table_id,
+                filename=f"🔗 {new_name}",
+                file_path=f"[连接表] {new_name}",
+                sheet_name="merged",
+                total_rows=len(view),
+                total_columns=len(view.columns),
+                is_joined=True,
+                source_tables=[info1.filename, info2.filename],
+            )
+
+            # 自动设为活跃表
+            self._active_table_id = table_id
+
+        self._enforce_memory_budget(keep=new_loader)
+
+        return table_id, new_loader.get_structure()
+
+    def _refresh_joins(self, table_id: str) -> None:
+        """源表数据被替换后，重建以它为源的连接表（含连接表之上的连接表）
+
+        连接视图引用的是源表当时的数据，不重建会继续返回旧数据。
+        """
+        changed = {table_id}
+        for info, loader in self.table_entries():
+            lineage = loader.join_lineage
+            if lineage is None or not (
+                {lineage["table1_id"], lineage["table2_id"]} & changed
+            ):
+                continue
+            try:
+                new_loader = self._create_join_loader(
+                    lineage["table1_id"],
+                    lineage["table2_id"],
+                    lineage["keys1"],
+                    lineage["keys2"],
+                    lineage["join_type"],
+                    lineage["new_name"],
+                )
+            except Exception as e:
+                logger.warning(f"连接表无法重建，已保留旧数据: {info.filename} ({e})")
+                continue
+            with self._lock:
+                if self._tables.get(info.id) is not loader:
+                    continue  # 期间被删除或替换
+                self._tables[info.id] = new_loader
+                info.total_rows = len(new_loader.column_source)
+                info.total_columns = len(new_loader.column_source.columns)
+            loader.release()
+            changed.add(info.id)
+            logger.info(f"连接表已按源表的新数据重建: {info.filename}")
+
+    def _create_join_loader(
+        self,
+        table1_id: str,
+        table2_id: str,
+        keys1: List[str],
+        keys2: List[str],
+        join_type: str,
+        new_name: str,
+    ) -> ExcelLoader:
+        """创建连接表的加载器：只计算行映射，列数据按需从源表物化"""
+        loader1 = self.get_table(table1_id)
+        loader2 = self.get_table(table2_id)
+        view = JoinView(
+            loader1.column_source,
+            loader2.column_source,
             left_on=keys1,
             right_on=keys2,
             how=join_type,
-            suffixes=("_表1", "_表2"),
+            suffixes=JOIN_SUFFIXES,
+            cache_full=get_config().excel.join_view_cache_full,
         )
 
-        # 创建新的加载器
         new_loader = ExcelLoader()
-        new_loader._df = merged_df
+        new_loader._set_view(view)
         new_loader._file_path = f"[连接表] {new_name}"
         new_loader._sheet_name = "merged"
         new_loader._all_sheets = ["merged"]
+        # 记录来源及其数据版本，源表未被修改时快照只需保存连接关系
+        new_loader.join_lineage = {
+            "table1_id": table1_id,
+            "table2_id": table2_id,
+            "keys1": list(keys1),
+            "keys2": list(keys2),
+            "join_type": join_type,
+            "new_name": new_name,
+            "source_uids": [loader1.uid, loader2.uid],
+            "source_versions": [loader1.version, loader2.version],
+        }
+        return new_loader
 
-        # 生成唯一ID
-        table_id = str(uuid.uuid4())[:8]
-
-        # 存储表信息
-        self._tables[table_id] = new_loader
-        self._table_infos[table_id] = TableInfo(
-            id=table_id,
-            filename=f"🔗 {new_name}",
-            file_path=f"[连接表] {new_name}",
-            sheet_name="merged",
-            total_rows=len(merged_df),
-            total_columns=len(merged_df.columns),
-            is_joined=True,
-            source_tables=[info1.filename, info2.filename],
-        )
+    # ===================== 工作区快照 =====================
 
-        # 自动设为活跃表
-        self._active_table_id = table_id
+    def table_entries(self) -> List[tuple[TableInfo, ExcelLoader]]:
+        """所有表的 (表信息, 加载器)，按加载顺序（连接表在其源表之后）"""
+        with self._lock:
+            return [
+                (self._table_infos[table_id], loader)
+                for table_id, loader in self._tables.items()
+            ]
 
-        return table_id, new_loader.get_structure()
+    def restore_table(self, info: TableInfo, loader: ExcelLoader) -> None:
+        """以快照中的表ID登记已恢复的表（不改变活跃表）"""
+        with self._lock:
+            self._tables[info.id] = loader
+            self._table_infos[info.id] = info
+        loader.on_page_in = self._on_page_in
+
+    def restore_join(self, info: TableInfo, lineage: Dict[str, Any]) -> None:
+        """按连接关系重建连接表（源表须已恢复）"""
+        if not self.get_table(lineage["table1_id"]) or not self.get_table(
+            lineage["table2_id"]
+        ):
+            raise ValueError(f"连接表的源表不存在: {info.filename}")
+        loader = self._create_join_loader(
+            lineage["table1_id"],
+            lineage["table2_id"],
+            lineage["keys1"],
+            lineage["keys2"],
+            lineage["join_type"],
+            lineage["new_name"],
+        )
+        self.restore_table(info, loader)
 
     def get_loaded_dataframes(self) -> Dict[str, pd.DataFrame]:
         """获取所有已加载的 DataFrame，键为文件名（无后缀，已清洗）"""
-        dataframes = {}
-        for table_id, loader in self._tables.items():
+        return {
+            name: loader.dataframe for name, loader in self.get_loaded_tables().items()
+        }
+
+    def get_loaded_tables(self) -> Dict[str, ExcelLoader]:
+        """获取所有已加载的表（不读取数据），键同 get_loaded_dataframes"""
+        tables = {}
+        for table_id, loader in list(self._tables.items()):
             if not loader.is_loaded:
                 continue
 
@@ -492,9 +1807,9 @@ class MultiExcelLoader:
             if clean_name and clean_name[0].isdigit():
                 clean_name = f"df_{clean_name}"
 
-            dataframes[clean_name] = loader.dataframe
+            tables[clean_name] = loader
 
-        return dataframes
+        return tables
 
     def get_active_summary(self) -> str:
         """获取当前活跃表的摘要"""
@@ -535,6 +1850,9 @@ class MultiExcelLoader:
         """
         获取当前对象中所有表的「表-字段-字段值」层级结构的 JSON 格式字符串
         新增：1. 字符串字段值去除首尾空白 2. 字段值列表去重（可选保留首次出现顺序）
+
+        每列先做向量化去重，只对去重后的值做类型判断与清洗；
+        每张表的字段值按数据版本缓存，只有数据变化的表才会重新计算。
         
         Args:
             ensure_ascii: 是否确保 ASCII 编码（False 支持中文显示）
@@ -544,91 +1862,32 @@ class MultiExcelLoader:
         Returns:
             结构化的 JSON 字符串
         """
-          # 1. 构建层级化的 Python 字典（表->字段->字段值）
-        all_tables_data = {}
         # 初始化白名单：优先使用方法传入值，无则使用外部全局配置
-        target_whitelist = field_whitelist or FIELD_WHITELIST
-        
-        for table_id, loader in self._tables.items():
+        target_whitelist = tuple(field_whitelist or FIELD_WHITELIST)
+
+        # 1. 构建层级化的 Python 字典（表->字段->字段值）
+        all_tables_data = {}
+        for table_id, loader in list(self._tables.items()):
             # 跳过未成功加载数据的表
             if not loader or not loader.is_loaded:
                 continue
-            
+
             # 获取表的元信息，用于构建表的标识
             table_info = self.get_table_info(table_id)
             if not table_info:
                 continue
-            
+
             # 表的唯一标识（组合 ID、文件名、工作表名，提高可读性）
             table_identifier = f"{table_info.filename}（ID：{table_id}，Sheet：{table_info.sheet_name}）"
-            
-            # 获取表的 DataFrame 并转换为字典格式（方便提取字段和值）
-            df = loader.dataframe
-            # 处理 pandas 中的特殊类型（NaT、NaN 等），转为 JSON 可序列化格式
-            df_clean = df.where(pd.notna(df), None)  # NaN/NaT 替换为 None
-            
-            # 构建字段-字段值结构：仅保留字符串类型，去空白+去重
-            field_values = {}
-            for column in df_clean.columns:
-                # 提取该列所有值
-                column_values = df_clean[column].tolist()
-                processed_values = []
-                
-                # 步骤1：根据字段是否在白名单，执行不同的筛选/保留逻辑
-                if column in target_whitelist:
-                    # 分支1：白名单字段 - 保留所有类型值，仅对字符串做去空白处理
-                    for val in column_values:
-                        # 对字符串类型：去首尾空白
-                        if isinstance(val, str):
-                            stripped_val = val.strip()
-                            # 保留去空白后的字符串（包括空字符串，如需过滤可添加判断）
-                            processed_values.append(stripped_val)
-                        # 对时间类型：格式化为 ISO 字符串（保证 JSON 可序列化）
-                        elif isinstance(val, pd.Timestamp) or isinstance(val, datetime):
-                            processed_values.append(val.isoformat())
-                        # 其他所有类型：直接保留（数字、布尔、None 等）
-                        else:
-                            processed_values.append(val)
-                else:
-                    # 分支2：非白名单字段 - 仅保留字符串类型值，且去空白
-                    for val in column_values:
-                        if isinstance(val, str):
-                            stripped_val = val.strip()
-                            # 可选：过滤去空白后的空字符串
-                            if stripped_val:
-                                processed_values.append(stripped_val)
-                
-                # 步骤2：对处理后的列表进行去重（兼容所有类型）
-                deduplicated_values = []
-                if keep_order:
-                    # 保留首次出现顺序的去重（推荐，兼容不可哈希类型）
-                    seen = set()
-                    for val in processed_values:
-                        # 处理不可哈希类型（如列表），转为字符串判断唯一性
-                        try:
-                            # 可哈希类型直接使用，不可哈希类型转为字符串
-                            val_hashable = val if isinstance(val, (int, float, str, bool, None.__class__)) else str(val)
-                        except:
-                            val_hashable = str(val)
-                        
-                        if val_hashable not in seen:
-                            seen.add(val_hashable)
-                            deduplicated_values.append(val)
-                else:
-                    # 高效去重（不保留顺序），兼容不可哈希类型降级处理
-                    try:
-                        deduplicated_values = list(set(processed_values))
-                    except:
-                        seen = set()
-                        for val in processed_values:
-                            val_hashable = str(val)
-                            if val_hashable not in seen:
-                                seen.add(val_hashable)
-                                deduplicated_values.append(val)
-                
-                # 存入最终处理结果
-                field_values[column] = deduplicated_values
-            
+
+            # 字段-字段值结构按数据版本缓存
+            field_values = loader.cached(
+                ("field_values", target_whitelist, keep_order),
+                lambda: _build_field_values(
+                    loader.column_source, target_whitelist, keep_order
+                ),
+            )
+
             # 将当前表的数据存入总字典
             all_tables_data[table_identifier] = {
                 "table_meta": {
@@ -642,7 +1901,7 @@ class MultiExcelLoader:
                 },
                 "field_values": field_values
             }
-        
+
         # 2. 将 Python 字典转换为 JSON 字符串
         try:
             json_str = json.dumps(
@@ -655,19 +1914,183 @@ class MultiExcelLoader:
         except Exception as e:
             raise Exception(f"JSON 序列化失败：{str(e)}") from e
 
-# 全局实例 - 使用多表管理器
-_loader: Optional[MultiExcelLoader] = None
+    def get_value_dictionary(self,
+                             question: Optional[str] = None,
+                             token_budget: Optional[int] = None,
+                             field_whitelist: List[str] = None
+                             ) -> str:
+        """
+        获取按 Token 预算裁剪的「表-字段-{取值: 次数}」JSON（用于注入 Prompt）
+
+        与 get_all_tables_field_values_json 不同，高基数列只保留最常见的取值并标注
+        剩余数量；提供用户问题时，问题中提到的列和取值会被优先保留。
+
+        Args:
+            question: 当前用户问题
+            token_budget: Token 预算，默认使用 excel.value_dictionary_token_budget
+            field_whitelist: 保留所有类型值的字段白名单
+
+        Returns:
+            JSON 字符串
+        """
+        target_whitelist = tuple(field_whitelist or FIELD_WHITELIST)
+
+        tables = []
+        for table_id, loader in list(self._tables.items()):
+            if not loader or not loader.is_loaded:
+                continue
+            table_info = self.get_table_info(table_id)
+            if not table_info:
+                continue
+
+            table_identifier = f"{table_info.filename}（ID：{table_id}，Sheet：{table_info.sheet_name}）"
+            table_values = loader.cached(
+                ("table_values", target_whitelist),
+                lambda: build_table_values(loader.column_source, target_whitelist),
+            )
+            tables.append((table_identifier, table_values))
+
+        return build_value_dictionary(tables, question, token_budget)
+
+
+def _dedupe(values: List[Any], keep_order: bool) -> List[Any]:
+    """去重（兼容不可哈希类型），可选保留首次出现顺序"""
+    seen = set()
+    result = []
+    for val in values:
+        # 可哈希类型直接使用，不可哈希类型转为字符串
+        key = val if isinstance(val, (int, float, str, bool, type(None))) else str(val)
+        if key not in seen:
+            seen.add(key)
+            result.append(val)
+    if not keep_order:
+        result.sort(key=str)
+    return result
+
+
+def _column_field_values(
+    col: pd.Series, keep_all_types: bool, keep_order: bool
+) -> List[Any]:
+    """提取单列的去重字段值
+
+    Args:
+        col: 列数据
+        keep_all_types: True 保留所有类型值（白名单字段），False 仅保留非空字符串
+        keep_order: 是否保留首次出现顺序
+    """
+    # 数值/日期等列不可能包含字符串，非白名单字段直接跳过，无需扫描
+    if not keep_all_types and not (
+        col.dtype == object
+        or isinstance(col.dtype, pd.CategoricalDtype)
+        or pd.api.types.is_string_dtype(col.dtype)
+    ):
+        return []
+
+    # 向量化去重（哈希实现，保留首次出现顺序），之后只处理去重后的少量值
+    uniques = col.drop_duplicates().tolist()
+
+    processed = []
+    for val in uniques:
+        # 对字符串类型：去首尾空白
+        if isinstance(val, str):
+            stripped = val.strip()
+            if stripped or keep_all_types:
+                processed.append(stripped)
+        elif not keep_all_types:
+            # 非白名单字段：仅保留字符串
+            continue
+        # 对时间类型：格式化为 ISO 字符串（保证 JSON 可序列化）
+        elif isinstance(val, (pd.Timestamp, datetime)):
+            processed.append(None if pd.isna(val) else val.isoformat())
+        # 空值统一为 None
+        elif val is None or (isinstance(val, float) and pd.isna(val)):
+            processed.append(None)
+        # 其他所有类型：直接保留（数字、布尔等）
+        else:
+            processed.append(val)
+
+    # 去空白后可能出现新的重复值，再去重一次
+    return _dedupe(processed, keep_order)
+
+
+def _build_field_values(
+    df: ColumnSource, field_whitelist: tuple, keep_order: bool
+) -> Dict[str, List[Any]]:
+    """构建一张表的「字段 -> 去重字段值」结构（白名单字段保留所有类型值）"""
+    return {
+        column: _column_field_values(
+            df[column], column in field_whitelist, keep_order
+        )
+        for column in df.columns
+    }
+
+
+# 会话工作区：会话 ID -> MultiExcelLoader。各工作区有独立的表列表、活跃表和连接表，
+# 内容相同的表跨工作区共享同一份不可变 DataFrame（写入时替换为新对象，不原地修改）
+_workspaces: Dict[str, MultiExcelLoader] = {}
+_workspace_access: Dict[str, float] = {}
+_workspaces_lock = threading.RLock()
+
+# 内存预算检查与溢出在所有工作区间互斥
+_memory_lock = threading.RLock()
+
+
+def _evict_idle_workspaces() -> None:
+    """关闭空闲超过 excel.session_idle_minutes 的会话工作区
+
+    默认工作区不回收；有未完成后台任务（如仍在解析的上传）的工作区也不回收，
+    任务结束后按最后访问时间重新计算空闲时长。
+    """
+    idle_seconds = get_config().excel.session_idle_minutes * 60
+    if idle_seconds <= 0:
+        return
+    now = time.monotonic()
+    busy = sessions_with_active_jobs()
+    for session_id, last_access in list(_workspace_access.items()):
+        if session_id in busy:
+            _workspace_access[session_id] = now
+            continue
+        if session_id != DEFAULT_SESSION and now - last_access > idle_seconds:
+            _workspaces.pop(session_id).close()
+            del _workspace_access[session_id]
+            logger.info(f"会话工作区空闲超时，已关闭: {session_id}")
 
 
 def get_loader() -> MultiExcelLoader:
-    """获取全局 MultiExcelLoader 实例"""
-    global _loader
-    if _loader is None:
-        _loader = MultiExcelLoader()
-    return _loader
+    """获取当前会话的 MultiExcelLoader 实例（未指定会话时为默认工作区）"""
+    session_id = current_session_id()
+    with _workspaces_lock:
+        _evict_idle_workspaces()
+        loader = _workspaces.get(session_id)
+        if loader is None:
+            loader = _workspaces[session_id] = MultiExcelLoader()
+        _workspace_access[session_id] = time.monotonic()
+    return loader
+
+
+def list_workspaces() -> Dict[str, MultiExcelLoader]:
+    """所有会话工作区（会话ID -> 工作区）"""
+    with _workspaces_lock:
+        return dict(_workspaces)
+
+
+def install_workspace(session_id: str, workspace: MultiExcelLoader) -> None:
+    """登记会话工作区（如从快照恢复），替换并关闭同名的旧工作区"""
+    with _workspaces_lock:
+        old = _workspaces.get(session_id)
+        _workspaces[session_id] = workspace
+        _workspace_access[session_id] = time.monotonic()
+    if old is not None and old is not workspace:
+        old.close()
 
 
 def reset_loader() -> None:
-    """重置全局 MultiExcelLoader 实例"""
-    global _loader
-    _loader = MultiExcelLoader()
+    """重置当前会话的工作区（其他会话不受影响）"""
+    session_id = current_session_id()
+    with _workspaces_lock:
+        old = _workspaces.get(session_id)
+        _workspaces[session_id] = MultiExcelLoader()
+        _workspace_access[session_id] = time.monotonic()
+    if old is not None:
+        old.close()
+
@@ -124,7 +124,8 @@ def load_context_node(state: AgentState) -> AgentState:
     if not state.get("trace_id"):
         state["trace_id"] = str(uuid.uuid4())
 
-    all_tables_field_values = loader.get_all_tables_field_values_json()
+    # 按 Token 预算裁剪的字段值字典，问题中提到的列和取值优先
+    all_tables_field_values = loader.get_value_dictionary(user_query)
     knowledge_context = loader.get_active_loader().business_logic_context
     # common_questions_context = loader.get_active_loader().common_questions_context
     with open(
@@ -598,7 +599,8 @@ def build_graph() -> StateGraph:
     return workflow.compile()
 
 
-# 全局图实例
+# 全局图实例：图中不保存表数据（各节点运行时通过 get_loader() 读取调用方会话的工作区），
+# 所有会话共用同一个实例，加载、切换或删除表后无需重建
 _graph = None
 
 
@@ -611,6 +613,6 @@ def get_graph():
 
 
 def reset_graph():
-    """重置图实例"""
+    """重置图实例（影响所有会话，仅用于修改节点或提示词后重新编译）"""
     global _graph
     _graph = None
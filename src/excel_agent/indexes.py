@@ -0,0 +1,206 @@
+"""维度列二级索引 - 取值 -> 升序行号，等值条件直接查索引，多个条件按行号求交集
+
+业务问题几乎都按 Year、Scenario、Function、BL、CC、Key 等维度做等值筛选。
+索引以 CSR 结构保存一列：按取值分组的行号数组（组内升序）与各组的偏移，
+查询一个取值只需切片，不扫描列；多个等值条件从最短的行号数组开始逐个求交集。
+
+建立索引的列：excel.index_columns 中配置的列，以及 category 类型的列（加载时压缩出的低基数维度）。
+索引在首次按该列做等值筛选时建立，保存在加载器按数据版本缓存的派生结果中；
+追加数据（apply_delta）时在旧索引上增量更新，不重新扫描整列。
+"""
+
+from typing import Any, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .config import get_config
+
+
+class ColumnIndex:
+    """单列索引：取值 -> 升序行号（空值不入索引）"""
+
+    def __init__(
+        self, values: pd.Index, row_ids: np.ndarray, offsets: np.ndarray, n_rows: int
+    ):
+        """
+        Args:
+            values: 各组的取值
+            row_ids: 按取值分组的行号，组内升序
+            offsets: 第 i 组的行号为 row_ids[offsets[i]:offsets[i + 1]]
+            n_rows: 建立索引时表的行数
+        """
+        self.values = values
+        self.row_ids = row_ids
+        self.offsets = offsets
+        self.n_rows = n_rows
+        row_ids.flags.writeable = False
+
+    @classmethod
+    def build(cls, col: pd.Series) -> "ColumnIndex":
+        """对一列建立索引（category 列直接使用其编码）"""
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            codes = col.cat.codes.to_numpy()
+            values = col.cat.categories
+        else:
+            codes, values = pd.factorize(col, use_na_sentinel=True)
+            values = pd.Index(values)
+        return cls._from_codes(codes, values, np.arange(len(col)), len(col))
+
+    @classmethod
+    def _from_codes(
+        cls, codes: np.ndarray, values: pd.Index, row_ids: np.ndarray, n_rows: int
+    ) -> "ColumnIndex":
+        valid = codes >= 0
+        if not valid.all():
+            codes, row_ids = codes[valid], row_ids[valid]
+        # 稳定排序：同组内保持行号升序
+        order = np.argsort(codes, kind="stable")
+        counts = np.bincount(codes, minlength=len(values))
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        dtype = np.int32 if n_rows < np.iinfo(np.int32).max else np.int64
+        return cls(values, row_ids[order].astype(dtype), offsets, n_rows)
+
+    @property
+    def nbytes(self) -> int:
+        values = self.values.memory_usage(deep=True)
+        return int(self.row_ids.nbytes + self.offsets.nbytes + values)
+
+    def lookup(self, value: Any) -> np.ndarray:
+        """等于 value 的行号（升序）；value 为元组时为等于任一候选值的行号"""
+        candidates = list(value) if isinstance(value, tuple) else [value]
+        positions = self.values.get_indexer(candidates)
+        return self.rows_of(positions[positions >= 0])
+
+    def count(self, positions: np.ndarray) -> int:
+        """若干组的行数之和（不取行号）"""
+        positions = np.asarray(positions, dtype=np.int64)
+        return int((self.offsets[positions + 1] - self.offsets[positions]).sum())
+
+    def rows_of(self, positions: np.ndarray) -> np.ndarray:
+        """若干组（按取值在 values 中的位置）的行号合并，升序"""
+        groups = [
+            self.row_ids[self.offsets[p] : self.offsets[p + 1]]
+            for p in np.unique(positions)
+        ]
+        if not groups:
+            return self.row_ids[:0]
+        if len(groups) == 1:
+            return groups[0]
+        # 各组互不相交，排序即可
+        return np.sort(np.concatenate(groups))
+
+    def _group_of_entries(self) -> np.ndarray:
+        """row_ids 中每个元素所属的组号"""
+        return np.repeat(np.arange(len(self.values)), np.diff(self.offsets))
+
+    def updated(self, removed_rows: np.ndarray, added: pd.Series) -> "ColumnIndex":
+        """按被移除的行与追加的行生成新版本的索引
+
+        与 ExcelLoader.apply_delta 的行布局一致：保留的行按原顺序排在前面（行号前移），
+        追加的行排在末尾。
+
+        Args:
+            removed_rows: 被移除的行号
+            added: 追加行的该列取值
+        """
+        groups = self._group_of_entries()
+        row_ids = self.row_ids.astype(np.int64)
+        if len(removed_rows):
+            removed_rows = np.sort(np.asarray(removed_rows, dtype=np.int64))
+            keep = ~np.isin(row_ids, removed_rows, assume_unique=True)
+            groups, row_ids = groups[keep], row_ids[keep]
+            row_ids -= np.searchsorted(removed_rows, row_ids)
+        n_kept = self.n_rows - len(removed_rows)
+
+        values = self.values
+        added_codes = values.get_indexer(added)
+        new = (added_codes < 0) & added.notna().to_numpy()
+        if new.any():
+            values = values.append(pd.Index(pd.unique(added[new])))
+            added_codes = values.get_indexer(added)
+
+        codes = np.concatenate([groups, added_codes])
+        row_ids = np.concatenate([row_ids, n_kept + np.arange(len(added))])
+        return self._from_codes(codes, values, row_ids, n_kept + len(added))
+
+
+def intersect_sorted(arrays: Iterable[np.ndarray], n_rows: int) -> np.ndarray:
+    """多个升序行号数组的交集
+
+    从最短的数组开始逐个求交：另一数组远长于当前结果时在其上二分查找（不读取整个数组），
+    否则把它展开为布尔位图后直接按行号取值。
+    """
+    arrays = sorted(arrays, key=len)
+    result = arrays[0]
+    for other in arrays[1:]:
+        if not len(result):
+            break
+        if len(result) * max(int(np.log2(len(other))), 1) < len(other):
+            positions = np.searchsorted(other, result)
+            positions[positions == len(other)] = 0
+            result = result[other[positions] == result]
+        else:
+            bitmap = np.zeros(n_rows, dtype=bool)
+            bitmap[other] = True
+            result = result[bitmap[result]]
+    return result
+
+
+def _default_index(df: Any) -> bool:
+    """行标签是否为 0..n-1（apply_delta 以被移除行的标签作为行号）"""
+    if not isinstance(df, pd.DataFrame):
+        return True
+    index = df.index
+    return isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1
+
+
+def is_indexed(source: Any, column: str) -> bool:
+    """该列是否建立索引（配置的维度列，或 category 类型的列）"""
+    if column not in source.columns:
+        return False
+    if column in get_config().excel.index_columns:
+        return True
+    if isinstance(source, pd.DataFrame):
+        return isinstance(source[column].dtype, pd.CategoricalDtype)
+    return False
+
+
+def get_column_index(
+    table: Any, column: str, any_column: bool = False
+) -> Optional[ColumnIndex]:
+    """表中某列当前数据版本的索引，首次使用时建立；该列不建立索引时返回 None
+
+    Args:
+        table: ExcelLoader
+        column: 列名
+        any_column: 不限于维度列（如全文搜索需要每一列的取值 -> 行号）
+    """
+    source = table.column_source
+    if column not in source.columns or not _default_index(source):
+        return None
+    if not any_column and not is_indexed(source, column):
+        return None
+    return table.cached(
+        ("column_index", column), lambda: ColumnIndex.build(source[column])
+    )
+
+
+def update_column_index(
+    index: Optional[ColumnIndex],
+    removed: pd.DataFrame,
+    added: pd.DataFrame,
+    column: str,
+) -> Optional[ColumnIndex]:
+    """追加数据后增量更新索引（见 excel_loader._DELTA_UPDATERS）
+
+    Args:
+        index: 旧索引
+        removed: 被移除的行（行标签即原行号）
+        added: 追加的行
+        column: 列名
+    """
+    if index is None:
+        return None
+    return index.updated(removed.index.to_numpy(), added[column])
@@ -0,0 +1,192 @@
+"""后台任务 - 在线程池中执行耗时的数据导入
+
+解析大工作簿是同步的 CPU/IO 密集操作，直接在 async 接口中执行会阻塞事件循环，
+导致其他用户的 /chat/stream 连接停顿。导入接口只提交任务并立即返回任务 ID，
+客户端通过 GET /jobs/{job_id} 查询进度与结果。
+"""
+
+import contextvars
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from .config import get_config
+from .logger import get_logger
+from .session import current_session_id
+
+logger = get_logger("excel_agent.jobs")
+
+# 任务状态
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+@dataclass
+class Job:
+    """后台任务"""
+
+    id: str
+    kind: str  # 任务类型，如 upload / load
+    message: str = ""
+    session_id: str = ""  # 提交任务的会话，任务在该会话的工作区中执行
+    status: str = JOB_PENDING
+    progress: Dict[str, Any] = field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    error_type: Optional[str] = None  # 异常类名，便于客户端区分错误类型
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def update(self, **progress: Any) -> None:
+        """更新进度（如 sheets_parsed、rows_read）"""
+        self.progress = {**self.progress, **progress}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "message": self.message,
+            "session_id": self.session_id,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "error_type": self.error_type,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class JobManager:
+    """后台任务管理器"""
+
+    def __init__(self, max_workers: int = 2, max_history: int = 200):
+        """
+        Args:
+            max_workers: 工作线程数
+            max_history: 保留的已完成任务数，超出后删除最早完成的任务
+        """
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ingest"
+        )
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self.max_history = max_history
+
+    def submit(
+        self, kind: str, fn: Callable[[Job], Dict[str, Any]], message: str = ""
+    ) -> Job:
+        """提交任务
+
+        Args:
+            kind: 任务类型
+            fn: 任务函数，接收 Job（用于报告进度），返回结果字典
+            message: 任务描述
+
+        Returns:
+            已提交的任务
+        """
+        job = Job(
+            id=uuid.uuid4().hex[:12],
+            kind=kind,
+            message=message,
+            session_id=current_session_id(),
+        )
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        # 在提交时的上下文中执行（工作线程不会自动继承会话等上下文变量）
+        context = contextvars.copy_context()
+        self._executor.submit(context.run, self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn: Callable[[Job], Dict[str, Any]]) -> None:
+        job.status = JOB_RUNNING
+        job.started_at = datetime.now()
+        try:
+            job.result = fn(job)
+            job.status = JOB_SUCCEEDED
+        except Exception as e:
+            logger.error(f"后台任务失败 [{job.kind}:{job.id}]: {e}")
+            logger.debug(traceback.format_exc())
+            job.error = str(e)
+            job.error_type = type(e).__name__
+            job.status = JOB_FAILED
+        finally:
+            job.finished_at = datetime.now()
+
+    def _prune(self) -> None:
+        """删除超出保留数量的已完成任务"""
+        finished = [j for j in self._jobs.values() if j.done]
+        excess = len(finished) - self.max_history
+        if excess <= 0:
+            return
+        finished.sort(key=lambda j: j.finished_at or j.created_at)
+        for job in finished[:excess]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """获取任务"""
+        return self._jobs.get(job_id)
+
+    def list_jobs(self, session_id: Optional[str] = None) -> List[Job]:
+        """获取任务列表（按创建时间倒序）
+
+        Args:
+            session_id: 只返回该会话提交的任务，默认返回全部
+        """
+        with self._lock:
+            jobs = [
+                job
+                for job in self._jobs.values()
+                if session_id is None or job.session_id == session_id
+            ]
+        return sorted(jobs, key=lambda j: j.created_at, reverse=True)
+
+    def active_sessions(self) -> Set[str]:
+        """有未完成（等待中或执行中）任务的会话"""
+        with self._lock:
+            return {job.session_id for job in self._jobs.values() if not job.done}
+
+    def shutdown(self, wait: bool = False) -> None:
+        """关闭线程池"""
+        self._executor.shutdown(wait=wait)
+
+
+# 全局实例
+_job_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    """获取全局 JobManager 实例"""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager(max_workers=get_config().excel.ingest_workers)
+    return _job_manager
+
+
+def sessions_with_active_jobs() -> Set[str]:
+    """有未完成任务的会话（任务管理器尚未创建时为空，不会因此创建线程池）"""
+    if _job_manager is None:
+        return set()
+    return _job_manager.active_sessions()
+
+
+def reset_job_manager() -> None:
+    """重置全局 JobManager 实例（等待中的任务会继续在旧线程池中完成）"""
+    global _job_manager
+    if _job_manager is not None:
+        _job_manager.shutdown(wait=False)
+    _job_manager = None
@@ -0,0 +1,373 @@
+"""惰性连接视图 - 连接表只保存源表引用和行映射，按需物化列和行
+
+pd.merge 会立即生成完整的连接结果，并与两张源表同时驻留内存。连接视图只在
+创建时对连接字段做一次合并，得到「结果行 -> 左表行号 / 右表行号」的映射，
+之后按工具实际用到的列和行（如筛选后的子集）从源表中取数。
+
+物化结果与 pd.merge(left, right, left_on, right_on, how, suffixes) 一致：
+列顺序、重名列后缀、同名连接字段的合并取值以及缺失行的类型提升都相同。
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# 重名列后缀（与原 join_tables 保持一致）
+JOIN_SUFFIXES = ("_表1", "_表2")
+
+_LEFT_ROW = "__left_row__"
+_RIGHT_ROW = "__right_row__"
+
+# 列来源：普通 DataFrame 或另一个连接视图（均支持 columns / len / [列名]）
+ColumnSource = Union[pd.DataFrame, "JoinView"]
+
+
+def _take(col: pd.Series, positions: np.ndarray) -> Any:
+    """按行号取值，-1 表示缺失行（与 pd.merge 相同：整数提升为浮点，布尔提升为对象）"""
+    if isinstance(col.dtype, pd.api.extensions.ExtensionDtype):
+        values = col.array
+    else:
+        values = col.to_numpy()
+    allow_fill = bool((positions < 0).any())
+    return pd.api.extensions.take(values, positions, allow_fill=allow_fill)
+
+
+def _empty_frame(source: ColumnSource) -> pd.DataFrame:
+    """源表的空结构（用于校验列布局）"""
+    if isinstance(source, JoinView):
+        return source.materialize(rows=np.arange(0))
+    return source.iloc[:0]
+
+
+def _row_positions(values: pd.Series) -> np.ndarray:
+    """合并结果中的行号列转为紧凑整数数组，缺失行记为 -1"""
+    positions = values.fillna(-1).to_numpy(dtype=np.int64)
+    if len(positions) and positions.max() < np.iinfo(np.int32).max:
+        return positions.astype(np.int32)
+    return positions
+
+
+class JoinView:
+    """两张表的惰性连接视图"""
+
+    def __init__(
+        self,
+        left: ColumnSource,
+        right: ColumnSource,
+        left_on: Sequence[str],
+        right_on: Sequence[str],
+        how: str = "inner",
+        suffixes: Tuple[str, str] = JOIN_SUFFIXES,
+        cache_full: bool = False,
+    ):
+        """
+        Args:
+            left: 左表（DataFrame 或连接视图）
+            right: 右表（DataFrame 或连接视图）
+            left_on: 左表连接字段
+            right_on: 右表连接字段
+            how: 连接类型 (inner/left/right/outer)
+            suffixes: 重名列后缀
+            cache_full: 首次物化完整表后是否缓存
+        """
+        self._left = left
+        self._right = right
+        self.left_on = list(left_on)
+        self.right_on = list(right_on)
+        self.how = how
+        self.suffixes = suffixes
+        self.cache_full = cache_full
+        self._full: Optional[pd.DataFrame] = None
+
+        # 1. 只对连接字段做合并，得到行映射
+        left_keys = pd.DataFrame({k: left[k] for k in self.left_on})
+        left_keys[_LEFT_ROW] = np.arange(len(left))
+        right_keys = pd.DataFrame({k: right[k] for k in self.right_on})
+        right_keys[_RIGHT_ROW] = np.arange(len(right))
+        mapping = pd.merge(
+            left_keys,
+            right_keys,
+            left_on=self.left_on,
+            right_on=self.right_on,
+            how=how,
+            suffixes=suffixes,
+        )
+        self._left_rows = _row_positions(mapping[_LEFT_ROW])
+        self._right_rows = _row_positions(mapping[_RIGHT_ROW])
+
+        # 同名连接字段在结果中合并为一列。结果行都来自左表且两侧类型相同时直接从
+        # 左表取值；否则（有缺失左行，或两侧类型不同需要统一）保留合并结果
+        coalesced = [lk for lk, rk in zip(self.left_on, self.right_on) if lk == rk]
+        from_left = bool((self._left_rows >= 0).all()) and all(
+            left_keys[k].dtype == right_keys[k].dtype for k in coalesced
+        )
+        kept = [] if from_left else coalesced
+        self._coalesced_keys = mapping[kept].reset_index(drop=True)
+
+        # 2. 结果列布局：列名 -> (来源, 源列名)
+        self._plan = self._build_plan(coalesced)
+        self._columns = list(self._plan.keys())
+
+        # 列布局与 pd.merge 不一致时（如源表含重复列名），退化为直接合并
+        expected = pd.merge(
+            _empty_frame(left),
+            _empty_frame(right),
+            left_on=self.left_on,
+            right_on=self.right_on,
+            how=how,
+            suffixes=suffixes,
+        ).columns
+        if list(expected) != self._columns:
+            self._full = pd.merge(
+                left if isinstance(left, pd.DataFrame) else left.to_frame(),
+                right if isinstance(right, pd.DataFrame) else right.to_frame(),
+                left_on=self.left_on,
+                right_on=self.right_on,
+                how=how,
+                suffixes=suffixes,
+            )
+            self._columns = list(self._full.columns)
+
+    def _build_plan(self, coalesced: List[str]) -> Dict[Any, Tuple[str, Any]]:
+        """按 pd.merge 的规则生成结果列布局"""
+        left_columns = list(self._left.columns)
+        right_columns = [c for c in self._right.columns if c not in coalesced]
+        overlap = set(left_columns) & set(right_columns)
+
+        plan: Dict[Any, Tuple[str, Any]] = {}
+        for col in left_columns:
+            if col in coalesced and col in self._coalesced_keys.columns:
+                plan[col] = ("key", col)
+            elif col in overlap:
+                plan[f"{col}{self.suffixes[0]}"] = ("left", col)
+            else:
+                plan[col] = ("left", col)
+        for col in right_columns:
+            name = f"{col}{self.suffixes[1]}" if col in overlap else col
+            plan[name] = ("right", col)
+        return plan
+
+    # ---------- 类 DataFrame 接口 ----------
+
+    @property
+    def columns(self) -> pd.Index:
+        return pd.Index(self._columns)
+
+    def __len__(self) -> int:
+        if self._full is not None:
+            return len(self._full)
+        return len(self._left_rows)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self), len(self._columns)
+
+    def __getitem__(self, column: Any) -> pd.Series:
+        """物化单列"""
+        if column not in self._plan and self._full is None:
+            raise KeyError(column)
+        return self.materialize(columns=[column])[column]
+
+    def base_frames(self) -> List[pd.DataFrame]:
+        """视图引用的所有底层 DataFrame（含嵌套视图的源表）"""
+        frames = []
+        for source in (self._left, self._right):
+            if isinstance(source, JoinView):
+                frames.extend(source.base_frames())
+            else:
+                frames.append(source)
+        return frames
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        return self.materialize(rows=np.arange(min(n, len(self))))
+
+    @property
+    def memory_bytes(self) -> int:
+        """视图自身占用的内存（行映射 + 合并后的连接字段 + 完整表缓存）"""
+        total = self._left_rows.nbytes + self._right_rows.nbytes
+        total += int(self._coalesced_keys.memory_usage(deep=True).sum())
+        if self._full is not None:
+            total += int(self._full.memory_usage(deep=True).sum())
+        return int(total)
+
+    # ---------- 物化 ----------
+
+    def materialize(
+        self,
+        columns: Optional[Sequence[Any]] = None,
+        rows: Optional[Sequence[int]] = None,
+    ) -> pd.DataFrame:
+        """按需物化部分列和行
+
+        Args:
+            columns: 需要的列名，默认全部列
+            rows: 需要的结果行号，默认全部行；指定时结果索引即为这些行号
+
+        Returns:
+            DataFrame
+        """
+        columns = self._columns if columns is None else list(columns)
+
+        if self._full is not None:
+            df = self._full[columns]
+            return df if rows is None else df.iloc[np.asarray(rows, dtype=np.int64)]
+
+        if rows is None:
+            index = pd.RangeIndex(len(self))
+            left_rows, right_rows = self._left_rows, self._right_rows
+            key_rows = None
+        else:
+            key_rows = np.asarray(rows, dtype=np.int64)
+            index = pd.Index(key_rows)
+            left_rows = self._left_rows[key_rows]
+            right_rows = self._right_rows[key_rows]
+
+        data = {}
+        for name in columns:
+            source, src = self._plan[name]
+            if source == "key":
+                col = self._coalesced_keys[src]
+                values = col.array if key_rows is None else col.array.take(key_rows)
+            elif source == "left":
+                values = _take(self._left[src], left_rows)
+            else:
+                values = _take(self._right[src], right_rows)
+            data[name] = pd.Series(values, index=index, name=name)
+
+        return pd.DataFrame(data, index=index, columns=columns)
+
+    def to_frame(self) -> pd.DataFrame:
+        """物化完整表（cache_full 时缓存结果）"""
+        if self._full is not None:
+            return self._full
+        df = self.materialize()
+        if self.cache_full:
+            self._full = df
+        return df
+
+
+# ---------- 连接基数预估 ----------
+
+
+@dataclass
+class JoinEstimate:
+    """连接结果行数预估（由两侧连接字段的取值频次直方图计算，不执行合并）"""
+
+    how: str
+    left_rows: int
+    right_rows: int
+    estimated_rows: int
+    matched_keys: int  # 两侧都出现的连接键数量
+    # 输出行数最多的连接键：[{"key": {...}, "left_rows", "right_rows", "output_rows"}]
+    top_fanout: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def expansion(self) -> float:
+        """预估结果行数 / 两表行数之和"""
+        return self.estimated_rows / max(1, self.left_rows + self.right_rows)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "how": self.how,
+            "left_rows": self.left_rows,
+            "right_rows": self.right_rows,
+            "estimated_rows": self.estimated_rows,
+            "expansion": round(self.expansion, 2),
+            "matched_keys": self.matched_keys,
+            "top_fanout": self.top_fanout,
+        }
+
+
+class JoinTooLargeError(ValueError):
+    """预估连接结果超过允许的膨胀倍数（需确认后才能执行）"""
+
+    def __init__(self, estimate: JoinEstimate, max_expansion: float):
+        self.estimate = estimate
+        self.max_expansion = max_expansion
+        super().__init__(
+            f"预估连接结果 {estimate.estimated_rows} 行，是两表行数之和的 "
+            f"{estimate.expansion:.1f} 倍（上限 {max_expansion} 倍），"
+            f"连接字段可能存在多对多匹配，请检查连接字段或确认后再执行"
+        )
+
+
+def _plain(value: Any) -> Any:
+    """连接键取值转为可 JSON 序列化的 Python 值"""
+    if pd.isna(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def estimate_join_rows(
+    left: ColumnSource,
+    right: ColumnSource,
+    left_on: Sequence[str],
+    right_on: Sequence[str],
+    how: str = "inner",
+    top_n: int = 10,
+) -> JoinEstimate:
+    """根据两侧连接键的频次预估连接结果行数
+
+    每个连接键的输出行数为「左侧出现次数 × 右侧出现次数」；left/right/outer
+    连接再加上未匹配一侧的行数。与 pd.merge 相同，空值键也会互相匹配。
+
+    Args:
+        left: 左表
+        right: 右表
+        left_on: 左表连接字段
+        right_on: 右表连接字段
+        how: 连接类型 (inner/left/right/outer)
+        top_n: 返回输出行数最多的连接键数量
+
+    Returns:
+        JoinEstimate
+    """
+    key_names = [f"k{i}" for i in range(len(left_on))]
+    left_keys = pd.DataFrame({n: left[c] for n, c in zip(key_names, left_on)})
+    right_keys = pd.DataFrame({n: right[c] for n, c in zip(key_names, right_on)})
+
+    # 两侧键频次直方图：行为连接键，列为 0（左）/ 1（右）
+    both = pd.concat(
+        [left_keys.assign(_side=0), right_keys.assign(_side=1)], ignore_index=True
+    )
+    counts = (
+        both.groupby(key_names + ["_side"], dropna=False, observed=True)
+        .size()
+        .unstack("_side", fill_value=0)
+        .reindex(columns=[0, 1], fill_value=0)
+    )
+    left_counts = counts[0].to_numpy(dtype=np.int64)
+    right_counts = counts[1].to_numpy(dtype=np.int64)
+    output = left_counts * right_counts
+
+    estimated = int(output.sum())
+    if how in ("left", "outer"):
+        estimated += int(left_counts[right_counts == 0].sum())
+    if how in ("right", "outer"):
+        estimated += int(right_counts[left_counts == 0].sum())
+
+    top_fanout = []
+    for pos in np.argsort(-output, kind="stable")[:top_n]:
+        if output[pos] <= 1:
+            break
+        key = counts.index[pos]
+        key = key if isinstance(key, tuple) else (key,)
+        top_fanout.append(
+            {
+                "key": {col: _plain(v) for col, v in zip(left_on, key)},
+                "left_rows": int(left_counts[pos]),
+                "right_rows": int(right_counts[pos]),
+                "output_rows": int(output[pos]),
+            }
+        )
+
+    return JoinEstimate(
+        how=how,
+        left_rows=len(left),
+        right_rows=len(right),
+        estimated_rows=estimated,
+        matched_keys=int(((left_counts > 0) & (right_counts > 0)).sum()),
+        top_fanout=top_fanout,
+    )
@@ -0,0 +1,375 @@
+"""筛选条件编译 - 校验列与运算符、按列类型转换比较值、向量化组合条件，并缓存命中的行号
+
+工具的筛选条件为 {"column": ..., "operator": ..., "value": ...} 列表，各条件之间为「且」。
+编译时每个条件只转换一次比较值（如数值列把 "2025" 转为 2025.0，文本列把 2025 转为 "2025"），
+求值时维度列上的等值条件查二级索引（见 indexes.py），其余条件在同一个布尔数组上原地组合。
+contains/startswith/endswith 只对列的不同取值（category 的类别或 factorize 的结果）求值一次，
+再按编码展开到各行，不逐行转换为文本。无序 category 列（加载时压缩出的字符串维度）上的
+>、<、>=、<= 同样按类别求值，与压缩前的字符串比较结果一致。
+
+结果（命中的行号）按 (表标识, 数据版本, 规范化的条件) 缓存在进程内 LRU 中，
+总大小受 excel.filter_cache_mb 限制。Agent 重试时常以相同条件重复调用工具，
+命中缓存时不再扫描任何列；表数据变化后版本递增，旧结果自然失效并被淘汰。
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .config import get_config
+from .indexes import ColumnIndex, get_column_index, intersect_sorted
+
+# 支持的运算符
+COMPARISON_OPERATORS = ("==", "!=", ">", "<", ">=", "<=")
+RANGE_OPERATORS = (">", "<", ">=", "<=")
+STRING_OPERATORS = ("contains", "startswith", "endswith")
+OPERATORS = COMPARISON_OPERATORS + STRING_OPERATORS
+
+# 索引命中的行数超过总行数的该比例时不走索引（扫描该列更快）
+_INDEX_MAX_FRACTION = 1 / 16
+
+
+@dataclass(frozen=True)
+class Predicate:
+    """已编译的单个筛选条件（比较值已按列类型转换）"""
+
+    column: str
+    operator: str
+    # 比较值；文本列的等值比较可能有多个候选（如 "1001" 与 1001.0），以元组保存
+    value: Any
+
+    def evaluate(self, col: pd.Series) -> np.ndarray:
+        """对列求值，返回布尔数组（空值不命中，!= 除外）"""
+        op = self.operator
+        if op in STRING_OPERATORS or (
+            op in RANGE_OPERATORS and _is_unordered_category(col.dtype)
+        ):
+            # 对列的字典（不同取值）求值一次，再按编码展开到各行；
+            # 无序 category 不支持比较大小，按取值本身（如 "FY24"、"2025-11-05"）比较
+            codes, values = _dictionary(col)
+            hits = np.append(self.match_values(values), False)
+            return hits[codes]  # 空值的编码为 -1，取到末尾的 False
+        return _compare(col, op, self.value)
+
+    def match_values(self, values: pd.Index) -> np.ndarray:
+        """字符串条件或比较大小的条件对一组不同取值求值，返回布尔数组
+
+        日期列除文本形式（如 "2025-11-04"）外也匹配紧凑形式（"20251104"），
+        使 "202511" 这样的前缀能匹配到日期。
+        """
+        if self.operator in RANGE_OPERATORS:
+            return _compare(pd.Series(values), self.operator, self.value)
+
+        texts = [pd.Series(values.astype(str), dtype=object)]
+        if isinstance(values, pd.DatetimeIndex):
+            texts.append(pd.Series(values.strftime("%Y%m%d"), dtype=object))
+
+        hits = np.zeros(len(values), dtype=bool)
+        for text in texts:
+            if self.operator == "contains":
+                mask = text.str.contains(self.value, case=False, na=False)
+            elif self.operator == "startswith":
+                mask = text.str.startswith(self.value, na=False)
+            else:
+                mask = text.str.endswith(self.value, na=False)
+            hits |= mask.to_numpy(dtype=bool)
+        return hits
+
+    def positions_in(self, values: pd.Index) -> Optional[np.ndarray]:
+        """命中的取值在 values 中的位置；条件不能按取值判断（如比较大小）时返回 None"""
+        if self.operator in STRING_OPERATORS:
+            return np.flatnonzero(self.match_values(values))
+        if self.operator == "==":
+            value = self.value
+            candidates = list(value) if isinstance(value, tuple) else [value]
+            positions = values.get_indexer(candidates)
+            return positions[positions >= 0]
+        return None
+
+
+def _is_unordered_category(dtype: Any) -> bool:
+    return isinstance(dtype, pd.CategoricalDtype) and not dtype.ordered
+
+
+def _compare(col: pd.Series, op: str, value: Any) -> np.ndarray:
+    """比较运算，返回布尔数组（空值不命中，!= 除外）"""
+    if op in ("==", "!="):
+        if isinstance(value, tuple):
+            mask = col.isin(value)
+            if op == "!=":
+                mask = ~mask
+        else:
+            mask = col == value if op == "==" else col != value
+    elif op == ">":
+        mask = col > value
+    elif op == "<":
+        mask = col < value
+    elif op == ">=":
+        mask = col >= value
+    else:
+        mask = col <= value
+    return mask.to_numpy(dtype=bool, na_value=False)
+
+
+def _dictionary(col: pd.Series) -> Tuple[np.ndarray, pd.Index]:
+    """列的编码与不同取值（category 列直接使用其编码，空值编码为 -1）"""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return col.cat.codes.to_numpy(), col.cat.categories
+    codes, uniques = pd.factorize(col, use_na_sentinel=True)
+    # 保留原类型（对象列中混有的整数与浮点数不统一为浮点数）
+    return codes, pd.Index(uniques, dtype=uniques.dtype)
+
+
+def _to_number(column: str, value: Any) -> Any:
+    if isinstance(value, (bool, np.bool_)):
+        return int(value)
+    if isinstance(value, (int, float, np.number)):
+        return value
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        raise ValueError(f"列 '{column}' 为数值列，比较值 {value!r} 不是数值") from None
+
+
+def _number_text(value: float) -> str:
+    """数值的文本形式（整数值不带小数点，如 1001.0 -> "1001"）"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _coerce(col: pd.Series, column: str, operator: str, value: Any) -> Any:
+    """按列类型转换比较值"""
+    if operator in STRING_OPERATORS:
+        return str(value)
+
+    dtype = col.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+
+    if pd.api.types.is_bool_dtype(dtype):
+        if isinstance(value, str):
+            text = value.strip().lower()
+            if text in ("true", "1", "是"):
+                return True
+            if text in ("false", "0", "否"):
+                return False
+            raise ValueError(f"列 '{column}' 为布尔列，比较值 {value!r} 无法识别")
+        return bool(value)
+
+    if pd.api.types.is_numeric_dtype(dtype):
+        return _to_number(column, value)
+
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        try:
+            timestamp = pd.Timestamp(value)
+        except (ValueError, TypeError):
+            raise ValueError(
+                f"列 '{column}' 为日期列，比较值 {value!r} 不是日期"
+            ) from None
+        tz = getattr(dtype, "tz", None)
+        if tz is not None and timestamp.tzinfo is None:
+            timestamp = timestamp.tz_localize(tz)
+        return timestamp
+
+    # 文本/对象列：可能混有数值（如 CC 列部分单元格为数字），数值形式的比较值两种表示都匹配
+    try:
+        number = _to_number(column, value)
+    except ValueError:
+        return value
+    if operator in ("==", "!="):
+        text = _number_text(number) if not isinstance(value, str) else value
+        return (text, number)
+    return number
+
+
+def normalize_filters(
+    filters: Optional[List[Dict[str, Any]]],
+) -> Tuple[Tuple[str, str, str, Hashable], ...]:
+    """规范化筛选条件：忽略不完整的条件，去重并排序（条件顺序不影响结果）
+
+    Returns:
+        (列名, 运算符, 比较值类型名, 比较值) 元组，可作为缓存键
+
+    Raises:
+        ValueError: 运算符不支持，或比较值不是单个值
+    """
+    normalized = set()
+    for f in filters or []:
+        column = f.get("column")
+        operator = f.get("operator")
+        value = f.get("value")
+        if not (column and operator and value is not None):
+            continue
+        if operator not in OPERATORS:
+            raise ValueError(f"不支持的运算符: {operator}")
+        if isinstance(value, (list, tuple, set, dict)):
+            raise ValueError(f"列 '{column}' 的比较值必须是单个值，实际为 {value!r}")
+        normalized.add((column, operator, type(value).__name__, value))
+    return tuple(sorted(normalized, key=repr))
+
+
+def compile_filters(
+    source: Any, filters: Optional[List[Dict[str, Any]]]
+) -> List[Predicate]:
+    """编译筛选条件：校验列存在，并按列类型转换比较值
+
+    Args:
+        source: 按列取数的数据源（DataFrame 或连接视图）
+        filters: 筛选条件列表
+
+    Raises:
+        ValueError: 列不存在、运算符不支持或比较值无法转换为列的类型
+    """
+    predicates = []
+    for column, operator, _, value in normalize_filters(filters):
+        if column not in source.columns:
+            raise ValueError(f"列 '{column}' 不存在，可用列: {list(source.columns)}")
+        value = _coerce(source[column], column, operator, value)
+        predicates.append(Predicate(column, operator, value))
+    return predicates
+
+
+def _column_at(source: Any, column: str, rows: np.ndarray) -> pd.Series:
+    """取一列在指定行上的取值（连接视图只物化这些行）"""
+    if isinstance(source, pd.DataFrame):
+        return pd.Series(source[column].array.take(rows))
+    return source.materialize([column], rows)[column]
+
+
+def _scan(source: Any, predicates: List[Predicate]) -> np.ndarray:
+    """逐列扫描求值，在同一个布尔数组上原地组合"""
+    mask: Optional[np.ndarray] = None
+    for predicate in predicates:
+        cond = predicate.evaluate(source[predicate.column])
+        if mask is None:
+            mask = cond if cond.flags.writeable else cond.copy()
+        else:
+            np.logical_and(mask, cond, out=mask)
+        if not mask.any():
+            break
+    rows = np.flatnonzero(mask)
+    if len(source) < np.iinfo(np.int32).max:
+        rows = rows.astype(np.int32)
+    return rows
+
+
+def evaluate(
+    source: Any,
+    predicates: List[Predicate],
+    index_of: Optional[Callable[[str], Optional[ColumnIndex]]] = None,
+) -> np.ndarray:
+    """对所有条件求值，返回命中的行号（升序）
+
+    有二级索引的列上的等值与字符串条件在索引的取值上求值，直接取出行号并求交集，
+    其余条件只在候选行上求值；没有足够有选择性的索引条件时逐列扫描。
+
+    Args:
+        source: 按列取数的数据源
+        predicates: 已编译的条件
+        index_of: 列名 -> 该列的索引（没有索引时返回 None）
+    """
+    matched, remaining = [], []
+    for predicate in predicates:
+        positions = None
+        index = index_of(predicate.column) if index_of is not None else None
+        if index is not None:
+            positions = predicate.positions_in(index.values)
+        # 命中大部分行的条件（如 Scenario == Actual）在候选行上直接比较更快
+        if (
+            positions is None
+            or index.count(positions) > len(source) * _INDEX_MAX_FRACTION
+        ):
+            remaining.append(predicate)
+        else:
+            matched.append(index.rows_of(positions))
+    if not matched:
+        return _scan(source, predicates)
+
+    rows = intersect_sorted(matched, len(source))
+    for predicate in remaining:
+        if not len(rows):
+            break
+        rows = rows[predicate.evaluate(_column_at(source, predicate.column, rows))]
+    return rows
+
+
+class _RowCache:
+    """命中行号的 LRU 缓存（按总字节数淘汰）"""
+
+    def __init__(self) -> None:
+        self._entries: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        with self._lock:
+            rows = self._entries.get(key)
+            if rows is not None:
+                self._entries.move_to_end(key)
+            return rows
+
+    def put(self, key: Hashable, rows: np.ndarray, max_bytes: int) -> None:
+        if rows.nbytes > max_bytes:
+            return
+        # 缓存的行号由多个调用方共享，设为只读
+        rows.flags.writeable = False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = rows
+            self._bytes += rows.nbytes
+            while self._bytes > max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+_row_cache = _RowCache()
+
+
+def filter_rows(
+    table: Any, filters: Optional[List[Dict[str, Any]]]
+) -> Optional[np.ndarray]:
+    """按筛选条件计算表中命中的行号（只读数组）
+
+    Args:
+        table: ExcelLoader（按 uid 与 version 区分缓存）
+        filters: 筛选条件列表，每个元素为 {"column": "...", "operator": "...", "value": ...}
+
+    Returns:
+        命中的行号（升序）；没有有效条件时返回 None，表示全部行
+
+    Raises:
+        ValueError: 列不存在、运算符不支持或比较值无法转换为列的类型
+    """
+    normalized = normalize_filters(filters)
+    if not normalized:
+        return None
+
+    key = (table.uid, table.version, normalized)
+    rows = _row_cache.get(key)
+    if rows is not None:
+        return rows
+
+    source = table.column_source
+    predicates = compile_filters(source, filters)
+    rows = evaluate(source, predicates, lambda c: get_column_index(table, c))
+    max_bytes = get_config().excel.filter_cache_mb * 1024 * 1024
+    if max_bytes > 0:
+        _row_cache.put(key, rows, max_bytes)
+    return rows
+
+
+def clear_filter_cache() -> None:
+    """清空筛选结果缓存"""
+    _row_cache.clear()
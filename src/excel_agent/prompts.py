@@ -142,7 +142,7 @@ INTENT_ANALYSIS_PROMPT = """你是一个专业的数据分析师。请结合用
      - 示例: "Total HR cost", "Procurement budget vs actual", "IT费用有哪些", "26财年采购预算是多少".
      - 注意：即使涉及 "HR", "IT", "Procurement" 等功能部门，只要不是问“分摊给某BL”，都属于普通查询。
 2. **参数提取** (针对费用分摊场景):
-   - 如果是费用分摊场景，请尝试提取以下参数供后续工具使用(需要从：all_tables_field_values中验证提取的参数是否存在于对应的字段中)：
+   - 如果是费用分摊场景，请尝试提取以下参数供后续工具使用(需要从：all_tables_field_values中验证提取的参数是否存在于对应的字段中；若该字段的取值未列全（含 "..." 或在 _omitted_columns 中），未列出的取值按用户原文保留，不视为不存在)：
      - `target_bl` (目标业务线/部门，如 CT, DT)
      - `year` (财年，如 FY25)
      - `scenario` (场景，如 Actual, Budget)
@@ -208,7 +208,7 @@ SQL_GENERATION_PROMPT = """你是一个 Pandas/Python 专家。请根据用户
      }}
 5. **工具调用注意事项**
    - 分摊、A给B的费用、b分给A的费用等涉及到多部门或业务先等的费用分摊场景必须使用calculate_allocated_costs
-   - 再生成calculate_allocated_costs 函数的参数前必须通过{all_tables_field_values}确认target 于target_type 之间的字段名于字段值的存在性关系
+   - 再生成calculate_allocated_costs 函数的参数前必须通过{all_tables_field_values}确认target 于target_type 之间的字段名于字段值的存在性关系；字段取值未列全时，未列出的取值按用户原文使用，不要替换为列表中的其他取值
    - target_type 必须是CC
    - 在Table7表中BL与CC是一对多的关系，当从用户问题中分析到BL和CC都有时以CC为优先筛选字段
 ## 数据上下文
@@ -226,6 +226,7 @@ SQL_GENERATION_PROMPT = """你是一个 Pandas/Python 专家。请根据用户
 ## 错误修正（如果是重试）
 {error_context}
 ## 表-字段名-字段值 字典
+（格式：字段 -> {{distinct: 去重值数量, values: {{取值: 出现次数}}}}；"..." 表示未列出的其余取值，_omitted_columns 为超出篇幅未展开的字段。取值含 "..." 或在 _omitted_columns 中的字段未列全，不在列表中的取值仍可能存在，不能据此判定为不存在）
 {all_tables_field_values}
 
 ## 任务要求
@@ -242,11 +243,12 @@ SQL_GENERATION_PROMPT = """你是一个 Pandas/Python 专家。请根据用户
 
 3. **代码风格**:
    - 优先使用 `???.query()` 进行筛选，因为它更安全且易读。
+   - Year、Scenario、Month、Function 等维度列为 category 类型（Month 按财年 Oct..Sep 有序），`groupby` 时请传入 `observed=True`，避免输出数据中不存在的分类。
    - 如果逻辑复杂，可以写多行代码，但**最后一行必须是返回结果的表达式**。
      - 正确:
        ```python
        ???_filtered = ???.query("Year == 'FY26'")
-       ???_filtered.groupby('Function')['Amount'].sum()
+       ???_filtered.groupby('Function', observed=True)['Amount'].sum()
        ```
      - 错误 (没有返回值):
        ```python
@@ -276,7 +278,7 @@ SQL_GENERATION_PROMPT = """你是一个 Pandas/Python 专家。请根据用户
 - 简单筛选:
   `???.query("Year == 'FY26' and Function == 'IT'")`
 - 聚合:
-  `???.groupby('Function')['Amount'].sum()`
+  `???.groupby('Function', observed=True)['Amount'].sum()`
 - 计算差异:
   `(???.query("Year=='FY26' and Scenario=='Budget1'")['Amount'].sum() - ???.query("Year=='FY25' and Scenario=='Actual'")['Amount'].sum())`
 
@@ -292,6 +294,7 @@ SQL_VALIDATION_PROMPT = """你是一个代码审查员。请检查以下 Pandas
 ## 待验证代码
 {sql_query}
 ## 表-字段名-字段值 字典
+（格式：字段 -> {{distinct: 去重值数量, values: {{取值: 出现次数}}}}；"..." 表示未列出的其余取值，_omitted_columns 为超出篇幅未展开的字段。取值含 "..." 或在 _omitted_columns 中的字段未列全，不在列表中的取值仍可能存在，不能据此判定为不存在）
 {all_tables_field_values}
 ## 检查项
 1. **安全性**: 是否包含 import/eval/exec/delete 等禁止命令？
@@ -305,6 +308,7 @@ SQL_VALIDATION_PROMPT = """你是一个代码审查员。请检查以下 Pandas
    - 如果代码是一个 JSON 格式的 `tool_call`，只要参数完整且合理，视为 VALID。
 5. **数据存在性验证**
    - 涉及到字符串类型的数据必须从all_tables_field_values中获取字段值进行存在性验证以提高工具函数参数的准确性(字段名可忽略大小写)
+   - 字段取值未列全（values 中含 "..."，或字段在 _omitted_columns 中）时，未列出的取值不能判定为不存在，不得据此判为不通过或要求改写为其他取值
 ## 输出格式
 如果通过，请直接输出 "VALID"。
 如果不通过，请输出 "INVALID: <具体错误原因>"。
@@ -0,0 +1,453 @@
+"""数据读取后端 - 按配置选择 Excel 解析引擎，CSV/Parquet 直接读取
+
+- openpyxl：pandas 默认引擎（.xls 使用 xlrd），超大 Sheet 走逐行流式读取
+- calamine：Rust 实现的原生解析器（需安装 python-calamine），大文件快数倍
+- CSV：按块读取（块大小 excel.streaming_chunk_rows），按首块推断的类型提示
+  将低基数字符串列直接读为 category，可用 excel.csv_dtypes 指定列类型
+- Parquet：内存映射读取，只解码需要的列（列投影），按行组报告进度（需要 pyarrow）
+- CSV / Parquet 不经过 Excel 解析，文件名（不含扩展名）作为唯一的 Sheet 名
+
+excel.reader_backend 为 auto 时选择已安装的最快后端。各后端的加载耗时与峰值内存
+可用 src/benchmark_readers.py 对比。
+"""
+
+import importlib.util
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from .config import get_config
+from .logger import get_logger
+
+logger = get_logger("excel_agent.readers")
+
+EXCEL_SUFFIXES = [".xlsx", ".xls", ".xlsm"]
+PASSTHROUGH_SUFFIXES = [".csv", ".parquet"]
+SUPPORTED_SUFFIXES = EXCEL_SUFFIXES + PASSTHROUGH_SUFFIXES
+
+# Excel 后端 -> 运行所需的模块
+EXCEL_BACKENDS: Dict[str, Optional[str]] = {
+    "openpyxl": None,
+    "calamine": "python_calamine",
+}
+
+# auto 模式下的优先顺序（越靠前越快）
+_BACKEND_PREFERENCE = ["calamine", "openpyxl"]
+
+# 参与解析缓存键的后端标识（openpyxl 沿用原有标识，已有缓存继续有效）
+_CACHE_TAGS = {
+    "openpyxl": "pandas.read_excel",
+    "calamine": "pandas.read_excel.calamine",
+}
+
+
+def available_backends() -> List[str]:
+    """当前环境可用的 Excel 后端"""
+    return [
+        name
+        for name, module in EXCEL_BACKENDS.items()
+        if module is None or importlib.util.find_spec(module) is not None
+    ]
+
+
+def resolve_backend(backend: Optional[str] = None) -> str:
+    """确定实际使用的 Excel 后端
+
+    Args:
+        backend: 后端名称或 auto，默认使用 excel.reader_backend
+
+    Returns:
+        可用的后端名称（指定的后端未安装时回退到 openpyxl）
+    """
+    backend = backend or get_config().excel.reader_backend
+    available = available_backends()
+    if backend == "auto":
+        return next(name for name in _BACKEND_PREFERENCE if name in available)
+    if backend not in EXCEL_BACKENDS:
+        raise ValueError(
+            f"未知的读取后端: {backend}，可选: auto, {', '.join(EXCEL_BACKENDS)}"
+        )
+    if backend not in available:
+        logger.warning(f"读取后端 {backend} 未安装，回退到 openpyxl")
+        return "openpyxl"
+    return backend
+
+
+def backend_cache_tag(backend: Optional[str] = None) -> str:
+    """后端的解析缓存标识（不同后端的解析结果可能略有差异，分别缓存）"""
+    return _CACHE_TAGS[resolve_backend(backend)]
+
+
+def _make_header(header: tuple) -> List[Any]:
+    """生成列名（与 pd.read_excel 一致：空列名为 Unnamed: i，重复列名追加 .1/.2）"""
+    columns: List[Any] = []
+    seen: Dict[Any, int] = {}
+    for i, name in enumerate(header):
+        if name is None or name == "":
+            name = f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+
+def _normalize_cell(value: Any) -> Any:
+    """单元格值归一化（与 pandas openpyxl 引擎一致：整数值浮点转 int，空串视为空值）"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if value == "":
+        return None
+    return value
+
+
+def _read_sheet_streaming(
+    worksheet, chunk_rows: int, on_rows: Optional[Callable[[int], None]] = None
+) -> pd.DataFrame:
+    """以只读模式逐行迭代 Sheet，按固定行数分块构建列缓冲
+
+    每攒满 chunk_rows 行就转置为各列的类型化 Series 并丢弃原始行，
+    峰值内存约为最终 DataFrame 加上一个分块，而不是完整的单元格对象树。
+    每处理完一个分块调用 on_rows(已读取行数) 报告进度。
+    """
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+
+    columns = _make_header(header)
+    n_cols = len(columns)
+    buffers: List[List[pd.Series]] = [[] for _ in range(n_cols)]
+    rows_read = 0
+
+    def flush(chunk: List[tuple]) -> None:
+        nonlocal rows_read
+        for i in range(n_cols):
+            values = [
+                _normalize_cell(row[i]) if i < len(row) else None for row in chunk
+            ]
+            buffers[i].append(pd.Series(values))
+        rows_read += len(chunk)
+        if on_rows is not None:
+            on_rows(rows_read)
+
+    chunk: List[tuple] = []
+    for row in rows:
+        # 与 read_excel 一致：跳过整行为空的行
+        if all(v is None or v == "" for v in row):
+            continue
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    data = {}
+    for name, parts in zip(columns, buffers):
+        if not parts:
+            data[name] = pd.Series([], dtype=object)
+        elif len(parts) == 1:
+            data[name] = parts[0]
+        else:
+            data[name] = pd.concat(parts, ignore_index=True)
+        # 已合并的分块立即释放
+        parts.clear()
+        # 各分块单独推断类型，整块为空的分块是 object，合并后按整列重新推断
+        # （与 read_excel 一致：前若干行为空的数值列仍为 float64，全空的列为 float64，
+        # 文本列的空值为 NaN）
+        if data[name].dtype == object:
+            col = data[name].infer_objects()
+            if col.dtype == object:
+                notna = col.notna()
+                col = col.where(notna, float("nan"))
+                if not notna.any():
+                    col = col.astype("float64")
+            data[name] = col
+
+    return pd.DataFrame(data, columns=columns)
+
+
+class SheetReader(ABC):
+    """已打开的数据源，按 Sheet 名读取 DataFrame（各后端实现 parse）"""
+
+    backend: str = ""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.sheet_names: List[str] = []
+
+    @abstractmethod
+    def parse(
+        self,
+        sheet_name: str,
+        nrows: Optional[int] = None,
+        on_rows: Optional[Callable[[int], None]] = None,
+        columns: Optional[List[str]] = None,
+        dtypes: Optional[Dict[str, str]] = None,
+    ) -> pd.DataFrame:
+        """读取指定 Sheet
+
+        Args:
+            sheet_name: Sheet 名称
+            nrows: 最多读取的行数，默认全部
+            on_rows: 进度回调，参数为已读取的行数（分块读取时报告）
+            columns: 只读取这些列，默认全部
+            dtypes: 列名 -> 类型，读取时直接按该类型解析（不再推断）
+        """
+
+    def header(self, sheet_name: str) -> List[Any]:
+        """只读取表头（列名），用于加载前的结构校验"""
+        return list(self.parse(sheet_name, nrows=0).columns)
+
+    def close(self) -> None:
+        """释放底层文件句柄"""
+
+
+class ExcelReader(SheetReader):
+    """通过 pd.ExcelFile 读取工作簿（openpyxl / calamine 引擎）"""
+
+    def __init__(self, file_path: str, backend: str = "openpyxl"):
+        super().__init__(file_path)
+        self.backend = backend
+        engine = None if backend == "openpyxl" else backend
+        self._excel = pd.ExcelFile(file_path, engine=engine)
+        self.sheet_names = list(self._excel.sheet_names)
+
+    def parse(
+        self,
+        sheet_name: str,
+        nrows: Optional[int] = None,
+        on_rows: Optional[Callable[[int], None]] = None,
+        columns: Optional[List[str]] = None,
+        dtypes: Optional[Dict[str, str]] = None,
+    ) -> pd.DataFrame:
+        """单元格数达到 excel.streaming_threshold_cells 的 openpyxl Sheet 走流式读取"""
+        excel_config = get_config().excel
+        threshold = excel_config.streaming_threshold_cells
+        if nrows is None and threshold and self._excel.engine == "openpyxl":
+            worksheet = self._excel.book[sheet_name]
+            n_cells = (worksheet.max_row or 0) * (worksheet.max_column or 0)
+            if n_cells >= threshold:
+                df = _read_sheet_streaming(
+                    worksheet, excel_config.streaming_chunk_rows, on_rows
+                )
+                df = df[columns] if columns else df
+                return df.astype(dtypes) if dtypes else df
+
+        return self._excel.parse(
+            sheet_name, nrows=nrows, usecols=columns, dtype=dtypes or None
+        )
+
+    def close(self) -> None:
+        self._excel.close()
+
+
+def _infer_csv_dtypes(
+    sample: pd.DataFrame, max_category_ratio: float, hints: Dict[str, str]
+) -> Dict[str, str]:
+    """按样本推断 CSV 的类型提示：低基数字符串列读为 category，显式提示优先
+
+    数值列不加提示（后续块出现空值或小数时由 pandas 自动提升类型）。
+    """
+    dtypes = {}
+    for column in sample.columns:
+        col = sample[column]
+        if column in hints:
+            dtypes[column] = hints[column]
+        elif col.dtype == object and len(col):
+            if col.nunique(dropna=True) / len(col) <= max_category_ratio:
+                dtypes[column] = "category"
+    return dtypes
+
+
+def _concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """合并分块读取的结果（category 列合并分类，而不是退化为 object）"""
+    if len(chunks) == 1:
+        return chunks[0]
+
+    data = {}
+    for i, name in enumerate(chunks[0].columns):
+        parts = [chunk.iloc[:, i] for chunk in chunks]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            data[i] = pd.Series(union_categoricals(parts, ignore_order=True))
+        else:
+            data[i] = pd.concat(parts, ignore_index=True)
+        parts.clear()
+    df = pd.DataFrame(data)
+    df.columns = chunks[0].columns
+    return df
+
+
+class CsvReader(SheetReader):
+    """CSV 文件（单表），按块读取"""
+
+    backend = "csv"
+
+    def __init__(self, file_path: str):
+        super().__init__(file_path)
+        self.sheet_names = [Path(file_path).stem]
+        self._encoding: Optional[str] = None
+
+    def _read_csv(self, read: Callable[[str], Any]) -> Any:
+        """按 excel.csv_encodings 依次尝试编码（ERP 导出常见 UTF-8 BOM 或 GB18030）
+
+        read(encoding) 完成整个读取（含分块读取的全部块）；任一位置出现解码错误
+        （如前几千行是 ASCII、后面才出现中文）都换下一个编码从头重读。
+        已确定的编码优先尝试。
+        """
+        encodings = list(get_config().excel.csv_encodings)
+        if self._encoding in encodings:
+            encodings.remove(self._encoding)
+        if self._encoding:
+            encodings.insert(0, self._encoding)
+        for i, encoding in enumerate(encodings):
+            try:
+                result = read(encoding)
+            except UnicodeDecodeError as e:
+                if i == len(encodings) - 1:
+                    raise
+                logger.info(f"CSV 不是 {encoding} 编码，改用下一个编码重读: {e}")
+                continue
+            self._encoding = encoding
+            return result
+
+    def parse(
+        self,
+        sheet_name: str,
+        nrows: Optional[int] = None,
+        on_rows: Optional[Callable[[int], None]] = None,
+        columns: Optional[List[str]] = None,
+        dtypes: Optional[Dict[str, str]] = None,
+    ) -> pd.DataFrame:
+        excel_config = get_config().excel
+        chunk_rows = excel_config.streaming_chunk_rows
+        hints = {**excel_config.csv_dtypes, **(dtypes or {})}
+
+        def read_rows(encoding: str, n: int) -> pd.DataFrame:
+            return pd.read_csv(
+                self.file_path,
+                encoding=encoding,
+                nrows=n,
+                usecols=columns,
+                dtype=hints or None,
+            )
+
+        if nrows is not None:
+            # nrows=0 只读表头（见 header）
+            return self._read_csv(lambda encoding: read_rows(encoding, nrows))
+        sample = self._read_csv(lambda encoding: read_rows(encoding, chunk_rows))
+        if len(sample) < chunk_rows:
+            return sample
+
+        # 不足一块的小文件直接返回样本；否则按样本推断类型提示后分块读取全文件
+        dtypes = _infer_csv_dtypes(sample, excel_config.category_max_ratio, hints)
+
+        def read_chunks(encoding: str) -> pd.DataFrame:
+            chunks: List[pd.DataFrame] = []
+            rows_read = 0
+            with pd.read_csv(
+                self.file_path,
+                encoding=encoding,
+                chunksize=chunk_rows,
+                usecols=columns,
+                dtype=dtypes or None,
+            ) as reader:
+                for chunk in reader:
+                    chunks.append(chunk)
+                    rows_read += len(chunk)
+                    if on_rows is not None:
+                        on_rows(rows_read)
+            return _concat_chunks(chunks)
+
+        return self._read_csv(read_chunks)
+
+
+class ParquetReader(SheetReader):
+    """Parquet 文件（单表，需要 pyarrow），内存映射读取"""
+
+    backend = "parquet"
+
+    def __init__(self, file_path: str):
+        super().__init__(file_path)
+        self.sheet_names = [Path(file_path).stem]
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError(
+                '读取 Parquet 需要安装 pyarrow: pip install -e ".[columnar]"'
+            ) from e
+        self._file = pq.ParquetFile(file_path, memory_map=True)
+
+    def parse(
+        self,
+        sheet_name: str,
+        nrows: Optional[int] = None,
+        on_rows: Optional[Callable[[int], None]] = None,
+        columns: Optional[List[str]] = None,
+        dtypes: Optional[Dict[str, str]] = None,
+    ) -> pd.DataFrame:
+        import pyarrow as pa
+
+        parquet = self._file
+        if nrows is not None:
+            batches = parquet.iter_batches(batch_size=max(nrows, 1), columns=columns)
+            batch = next(batches, None)
+            if batch is None:
+                df = parquet.schema_arrow.empty_table().to_pandas()
+            else:
+                df = batch.to_pandas().head(nrows)
+            return df.astype(dtypes) if dtypes else df
+
+        # 按行组读取并报告进度，只解码投影的列
+        tables = []
+        rows_read = 0
+        for i in range(parquet.num_row_groups):
+            table = parquet.read_row_group(i, columns=columns, use_pandas_metadata=True)
+            tables.append(table)
+            rows_read += table.num_rows
+            if on_rows is not None:
+                on_rows(rows_read)
+        if not tables:
+            return parquet.schema_arrow.empty_table().to_pandas()
+        table = pa.concat_tables(tables)
+        tables.clear()
+        # 转换时逐列释放 Arrow 缓冲，峰值内存约为一份数据
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        return df.astype(dtypes) if dtypes else df
+
+    def header(self, sheet_name: str) -> List[Any]:
+        """从文件元数据读取列名，不解码数据"""
+        return [
+            name
+            for name in self._file.schema_arrow.names
+            if not name.startswith("__index_level_")
+        ]
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def open_reader(file_path: str, backend: Optional[str] = None) -> SheetReader:
+    """按文件类型打开数据源
+
+    Args:
+        file_path: 文件路径
+        backend: Excel 后端（CSV/Parquet 忽略），默认使用 excel.reader_backend
+
+    Returns:
+        SheetReader 实例
+    """
+    suffix = Path(file_path).suffix.lower()
+    if suffix == ".csv":
+        return CsvReader(file_path)
+    if suffix == ".parquet":
+        return ParquetReader(file_path)
+    if suffix in EXCEL_SUFFIXES:
+        return ExcelReader(file_path, resolve_backend(backend))
+    raise ValueError(f"不支持的文件格式: {suffix}")
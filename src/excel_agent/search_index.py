@@ -0,0 +1,196 @@
+"""全文搜索索引 - 单元格文本的字符 n-gram 倒排索引，search_data 只校验候选值
+
+每列的不同取值只渲染一次（与 astype(str) 相同的文本，转为小写），按字符二元组（bigram）
+建立倒排表：n-gram -> 包含它的取值编号。按字符切分不依赖分词，中文同样适用。
+
+搜索关键词时取其所有 bigram 的倒排表求交集得到候选取值，只对候选做子串校验，
+再通过列索引（取值 -> 行号，见 indexes.py）得到命中的行。关键词只有一个字符时没有 bigram，
+退化为校验所有不同取值（仍不逐行渲染）。
+
+不同取值占比高的列（如逐行不同的摘要、金额）建立索引的开销超过收益，不进入索引，
+搜索时直接逐行扫描。索引在首次搜索时建立，保存在加载器按数据版本缓存的派生结果中，
+表数据变化后重新建立（列索引在追加数据时增量更新，重建只需重新处理各列的不同取值）；
+索引占用的内存计入表的内存预算。空值不参与搜索。
+"""
+
+import sys
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .indexes import ColumnIndex, get_column_index, intersect_sorted
+
+# n-gram 长度
+NGRAM = 2
+
+# 抽样中不同取值的占比超过该值的列不建立索引，搜索时逐行扫描
+_MAX_DISTINCT_RATIO = 0.5
+_SAMPLE_ROWS = 10_000
+
+
+def _grams(text: str) -> set:
+    return {text[i : i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+def _worth_indexing(col: pd.Series) -> bool:
+    """按抽样估计列的不同取值占比，占比低的列才建立索引"""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return len(col.cat.categories) <= len(col) * _MAX_DISTINCT_RATIO
+    n = len(col)
+    if n <= _SAMPLE_ROWS:
+        sample = col
+    else:
+        sample = col.iloc[np.linspace(0, n - 1, _SAMPLE_ROWS).astype(np.int64)]
+    return sample.nunique(dropna=True) <= len(sample) * _MAX_DISTINCT_RATIO
+
+
+# 数值渲染为文本时可能出现的字符（如 -1.5e+06、inf）
+_NUMBER_CHARS = frozenset("0123456789.-+einf")
+
+
+def _scan_text(col: pd.Series, keyword: str) -> np.ndarray:
+    """逐行渲染并匹配（不区分大小写，按字面匹配，空值不命中）"""
+    text = col.astype(str).str.lower()
+    mask = text.str.contains(keyword, regex=False).to_numpy(dtype=bool)
+    return mask & col.notna().to_numpy()
+
+
+class SearchIndex:
+    """一张表（一个数据版本）的全文搜索索引"""
+
+    def __init__(
+        self,
+        columns: List[Any],
+        indexes: List[Optional[ColumnIndex]],
+        n_rows: int,
+        owned_bytes: int = 0,
+    ):
+        """
+        Args:
+            columns: 列名
+            indexes: 各列的取值 -> 行号索引；为 None 的列不进入索引，搜索时逐行扫描
+            n_rows: 表的行数
+            owned_bytes: 只被本索引引用的列索引的字节数（计入 nbytes）
+        """
+        self.columns = columns
+        self.n_rows = n_rows
+        self.scan_columns = [c for c, index in zip(columns, indexes) if index is None]
+        self._indexed = [
+            (c, index) for c, index in zip(columns, indexes) if index is not None
+        ]
+
+        # 所有索引列的取值统一编号：第 j 个索引列的取值编号为 starts[j] .. starts[j + 1] - 1
+        sizes = [len(index.values) for _, index in self._indexed]
+        self.starts = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=self.starts[1:])
+        texts: List[str] = []
+        for _, index in self._indexed:
+            texts.extend(index.values.astype(str).str.lower())
+        self.texts = np.array(texts, dtype=object)
+
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for value_id, text in enumerate(texts):
+            for gram in _grams(text):
+                postings[gram].append(value_id)
+        self.postings = {
+            gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()
+        }
+
+        # 倒排表与取值文本占用的字节数（缓存在表中的列索引单独计算，见 ExcelLoader.index_bytes）
+        self.nbytes = int(
+            sum(ids.nbytes + sys.getsizeof(g) for g, ids in self.postings.items())
+            + self.texts.nbytes
+            + sum(sys.getsizeof(t) for t in texts)
+            + self.starts.nbytes
+            + owned_bytes
+        )
+
+    @classmethod
+    def build(cls, table: Any) -> "SearchIndex":
+        """为表的当前数据建立索引（复用并缓存各列的列索引）"""
+        source = table.column_source
+        columns = list(source.columns)
+        indexes: List[Optional[ColumnIndex]] = []
+        owned_bytes = 0
+        for c in columns:
+            index = get_column_index(table, c)
+            if index is None and _worth_indexing(source[c]):
+                index = get_column_index(table, c, any_column=True)
+                if index is None:
+                    # 行标签不是 0..n-1 等无法缓存列索引的情况，索引归本对象所有
+                    index = ColumnIndex.build(source[c])
+                    owned_bytes += index.nbytes
+            indexes.append(index)
+        return cls(columns, indexes, len(source), owned_bytes)
+
+    def _candidates(self, keyword: str) -> np.ndarray:
+        """可能包含关键词的取值编号（升序）"""
+        grams = _grams(keyword)
+        if not grams:
+            return np.arange(len(self.texts))
+        lists = [self.postings.get(gram) for gram in grams]
+        if any(ids is None for ids in lists):
+            return np.arange(0)
+        return intersect_sorted(lists, len(self.texts))
+
+    def search(
+        self, source: Any, keyword: str, columns: Optional[Sequence[Any]] = None
+    ) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """搜索包含关键词的行（不区分大小写，按字面匹配）
+
+        Args:
+            source: 建立索引时的数据源（未进入索引的列从中逐行扫描）
+            keyword: 关键词
+            columns: 搜索的列，默认全部列
+
+        Returns:
+            (命中的行号（升序）, 搜索统计)
+        """
+        keyword = str(keyword).lower()
+        wanted = set(self.columns) if columns is None else set(columns)
+        positions = [j for j, (c, _) in enumerate(self._indexed) if c in wanted]
+        scan_columns = [c for c in self.scan_columns if c in wanted]
+
+        candidates = self._candidates(keyword)
+        # 只保留要搜索的列的取值
+        column_of = np.searchsorted(self.starts, candidates, side="right") - 1
+        candidates = candidates[np.isin(column_of, positions)]
+        matched = np.array(
+            [value_id for value_id in candidates if keyword in self.texts[value_id]],
+            dtype=np.int64,
+        )
+
+        column_of = np.searchsorted(self.starts, matched, side="right") - 1
+        groups = [
+            self._indexed[j][1].rows_of(matched[column_of == j] - self.starts[j])
+            for j in np.unique(column_of)
+        ]
+        for c in scan_columns:
+            col = source[c]
+            is_number = isinstance(col.dtype, np.dtype) and col.dtype.kind in "iuf"
+            if is_number and not set(keyword) <= _NUMBER_CHARS:
+                continue  # 关键词不可能出现在数值的文本中
+            groups.append(np.flatnonzero(_scan_text(col, keyword)))
+        rows = np.unique(np.concatenate(groups)) if groups else np.arange(0)
+
+        indexed_cells = self.n_rows * len(positions)
+        scanned_cells = self.n_rows * len(scan_columns)
+        cells = indexed_cells + scanned_cells
+        checked = len(candidates) + scanned_cells
+        distinct = int(sum(len(self._indexed[j][1].values) for j in positions))
+        stats = {
+            "cells": cells,  # 逐行扫描需要渲染并匹配的单元格数
+            "distinct_values": distinct,  # 所搜索的索引列的不同取值数
+            "candidates": len(candidates),  # 实际校验的取值数
+            "matched_values": len(matched),
+            "scanned_columns": scan_columns,  # 未进入索引、逐行扫描的列
+            "scan_avoided": round(1 - checked / cells, 4) if cells else 0.0,
+        }
+        return rows, stats
+
+
+def get_search_index(table: Any) -> SearchIndex:
+    """表当前数据版本的全文搜索索引，首次使用时建立"""
+    return table.cached("search_index", lambda: SearchIndex.build(table))
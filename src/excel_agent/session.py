@@ -0,0 +1,57 @@
+"""会话上下文 - 按会话隔离工作区（已加载的表、活跃表、连接表）
+
+请求通过 X-Session-Id 请求头或 Cookie 指定会话，中间件将会话 ID 绑定到当前上下文，
+get_loader() 据此返回该会话的工作区。未指定会话的请求（如脚本、命令行）使用默认工作区，
+与原先的进程级单一工作区行为一致。
+"""
+
+import re
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+# 默认会话（未携带会话 ID 的请求）
+DEFAULT_SESSION = "default"
+
+# 会话 ID 的请求头与 Cookie 名称
+SESSION_HEADER = "X-Session-Id"
+SESSION_COOKIE = "excel_agent_session"
+
+_SESSION_ID_PATTERN = re.compile(r"^[0-9A-Za-z_-]{1,64}$")
+
+_current_session: ContextVar[str] = ContextVar(
+    "excel_agent_session", default=DEFAULT_SESSION
+)
+
+
+def new_session_id() -> str:
+    """生成新的会话 ID"""
+    return uuid.uuid4().hex
+
+
+def is_valid_session_id(session_id: str) -> bool:
+    """会话 ID 是否合法（字母、数字、下划线和连字符，最长 64 位）"""
+    return bool(_SESSION_ID_PATTERN.match(session_id))
+
+
+def current_session_id() -> str:
+    """当前上下文的会话 ID"""
+    return _current_session.get()
+
+
+@contextmanager
+def use_session(session_id: str) -> Iterator[str]:
+    """在上下文中切换到指定会话
+
+    Args:
+        session_id: 会话 ID
+
+    Yields:
+        会话 ID
+    """
+    token = _current_session.set(session_id)
+    try:
+        yield session_id
+    finally:
+        _current_session.reset(token)
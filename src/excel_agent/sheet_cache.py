@@ -0,0 +1,268 @@
+"""工作簿解析结果的本地列式缓存 - 按文件内容哈希寻址
+
+同一个工作簿（内容完全相同）再次上传或加载时，直接从本地 Feather 文件
+读取已解析的 Sheet，跳过 pd.read_excel。缓存键由「文件内容哈希 + Sheet 名 +
+加载选项」组成，总大小超过上限时按最近最少使用（LRU）淘汰。
+
+依赖 pyarrow；未安装时缓存自动禁用，不影响正常加载。
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from .config import get_config
+from .logger import get_logger
+
+logger = get_logger("excel_agent.sheet_cache")
+
+# 缓存格式版本：解析逻辑变化时递增，使旧缓存自动失效
+CACHE_FORMAT_VERSION = 1
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def new_content_hasher() -> "hashlib._Hash":
+    """创建内容哈希对象（边写边算时使用，结果与 file_content_hash 一致）"""
+    return hashlib.sha256()
+
+
+def file_content_hash(file_path: str) -> str:
+    """分块计算文件内容的 SHA-256（不会一次性读入整个文件）"""
+    digest = new_content_hasher()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_feather_mapped(path: Path) -> pd.DataFrame:
+    """以内存映射方式读取 Feather 文件（无压缩文件的数值列直接引用映射的页面，按需读入）"""
+    from pyarrow import feather
+
+    table = feather.read_table(str(path), memory_map=True)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+@dataclass
+class WorkbookManifest:
+    """工作簿级缓存信息（Sheet 列表与上下文 Sheet 文本）"""
+
+    sheet_names: List[str]
+    business_logic_context: str = ""
+    common_questions_context: str = ""
+
+
+@dataclass
+class CachedSheet:
+    """命中缓存的 Sheet"""
+
+    dataframe: pd.DataFrame
+    manifest: WorkbookManifest
+    options: Dict[str, Any] = field(default_factory=dict)
+
+
+def _unique_tmp_path(path: Path) -> Path:
+    """与 path 同目录的唯一临时文件
+
+    同一工作簿可能被多个导入任务同时解析并写入同一缓存项，各自写入独立的临时文件，
+    写完后以 os.replace 原子替换到位，不会写入或改名对方未写完的文件。
+    """
+    fd, name = tempfile.mkstemp(dir=path.parent, prefix=f"{path.stem}.", suffix=".tmp")
+    os.close(fd)
+    return Path(name)
+
+
+class SheetCache:
+    """按内容寻址的 Sheet 列式缓存"""
+
+    def __init__(self, cache_dir: str, max_bytes: int, enabled: bool = True):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.enabled = enabled and importlib.util.find_spec("pyarrow") is not None
+
+        if enabled and not self.enabled:
+            logger.warning("未安装 pyarrow，工作簿解析缓存已禁用")
+
+    # ---------- 键与路径 ----------
+
+    @staticmethod
+    def _sheet_key(content_hash: str, sheet_name: str, options: Dict[str, Any]) -> str:
+        """Sheet 缓存键：内容哈希 + Sheet 名 + 加载选项"""
+        payload = json.dumps(
+            {
+                "version": CACHE_FORMAT_VERSION,
+                "sheet": sheet_name,
+                "options": options,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        suffix = hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+        return f"{content_hash}_{suffix}"
+
+    def _manifest_path(self, content_hash: str) -> Path:
+        return self.cache_dir / f"{content_hash}.json"
+
+    def _sheet_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.feather"
+
+    @staticmethod
+    def _touch(path: Path) -> None:
+        """更新访问时间（LRU 依据为文件 mtime）"""
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    # ---------- 读取 ----------
+
+    def get_manifest(self, content_hash: str) -> Optional[WorkbookManifest]:
+        """读取工作簿级缓存信息"""
+        if not self.enabled:
+            return None
+
+        path = self._manifest_path(content_hash)
+        if not path.exists():
+            return None
+
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            return WorkbookManifest(**data)
+        except Exception as e:
+            logger.warning(f"工作簿缓存信息损坏，已忽略: {path.name} ({e})")
+            return None
+
+    def get(
+        self,
+        content_hash: str,
+        sheet_name: str,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Optional[CachedSheet]:
+        """读取缓存的 Sheet，未命中返回 None"""
+        if not self.enabled:
+            return None
+
+        options = options or {}
+        manifest = self.get_manifest(content_hash)
+        if manifest is None or sheet_name not in manifest.sheet_names:
+            return None
+
+        path = self._sheet_path(self._sheet_key(content_hash, sheet_name, options))
+        if not path.exists():
+            return None
+
+        try:
+            df = pd.read_feather(path)
+        except Exception as e:
+            logger.warning(f"Sheet 缓存读取失败，已忽略: {path.name} ({e})")
+            return None
+
+        self._touch(path)
+        self._touch(self._manifest_path(content_hash))
+        logger.info(f"命中工作簿缓存: {sheet_name} ({content_hash[:12]})")
+        return CachedSheet(dataframe=df, manifest=manifest, options=options)
+
+    # ---------- 写入 ----------
+
+    def put(
+        self,
+        content_hash: str,
+        sheet_name: str,
+        df: pd.DataFrame,
+        manifest: WorkbookManifest,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """写入 Sheet 缓存，返回是否成功
+
+        无法以列式格式保存的表（如非字符串列名、混合类型的对象列）会被跳过。
+        """
+        if not self.enabled:
+            return False
+
+        options = options or {}
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        path = self._sheet_path(self._sheet_key(content_hash, sheet_name, options))
+        manifest_path = self._manifest_path(content_hash)
+        tmp_paths: List[Path] = []
+        try:
+            tmp_paths.append(_unique_tmp_path(path))
+            df.reset_index(drop=True).to_feather(tmp_paths[-1])
+            os.replace(tmp_paths[-1], path)
+            tmp_paths.append(_unique_tmp_path(manifest_path))
+            tmp_paths[-1].write_text(
+                json.dumps(manifest.__dict__, ensure_ascii=False), encoding="utf-8"
+            )
+            os.replace(tmp_paths[-1], manifest_path)
+        except Exception as e:
+            logger.warning(f"Sheet 无法写入列式缓存，已跳过: {sheet_name} ({e})")
+            for tmp_path in tmp_paths:
+                tmp_path.unlink(missing_ok=True)
+            return False
+
+        self._evict()
+        return True
+
+    def _evict(self) -> None:
+        """总大小超过上限时，按最近访问时间淘汰最旧的缓存文件"""
+        if self.max_bytes <= 0:
+            return
+
+        files = [p for p in self.cache_dir.glob("*.feather") if p.is_file()]
+        stats = {p: p.stat() for p in files}
+        total = sum(st.st_size for st in stats.values())
+        if total <= self.max_bytes:
+            return
+
+        for path in sorted(files, key=lambda p: stats[p].st_mtime):
+            if total <= self.max_bytes:
+                break
+            total -= stats[path].st_size
+            path.unlink(missing_ok=True)
+            logger.info(f"淘汰工作簿缓存: {path.name}")
+
+        # 清理已无任何 Sheet 的工作簿信息
+        remaining = {p.name.split("_", 1)[0] for p in self.cache_dir.glob("*.feather")}
+        for manifest_path in self.cache_dir.glob("*.json"):
+            if manifest_path.stem not in remaining:
+                manifest_path.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        """清空缓存目录"""
+        if not self.cache_dir.exists():
+            return
+        for path in self.cache_dir.iterdir():
+            if path.suffix in (".feather", ".json", ".tmp"):
+                path.unlink(missing_ok=True)
+
+
+# 全局实例
+_sheet_cache: Optional[SheetCache] = None
+
+
+def get_sheet_cache() -> SheetCache:
+    """获取全局 SheetCache 实例"""
+    global _sheet_cache
+    if _sheet_cache is None:
+        excel_config = get_config().excel
+        _sheet_cache = SheetCache(
+            cache_dir=excel_config.cache_dir,
+            max_bytes=excel_config.cache_max_mb * 1024 * 1024,
+            enabled=excel_config.cache_enabled,
+        )
+    return _sheet_cache
+
+
+def reset_sheet_cache() -> None:
+    """重置全局 SheetCache 实例（配置变更后调用）"""
+    global _sheet_cache
+    _sheet_cache = None
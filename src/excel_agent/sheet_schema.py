@@ -0,0 +1,207 @@
+"""声明式 Sheet 结构 - 按配置投影列、指定列类型，结构漂移时快速失败
+
+结构在配置 excel.sheet_schemas 中按 Sheet 名声明（见 config.SheetSchema），例如:
+
+    excel:
+      sheet_schemas:
+        CostDataBase:
+          columns: [Year, Scenario, Function, CC, Key, Month, Amount]
+          dtypes: {Amount: float64, CC: str}
+          categorical: [Year, Scenario, Function, Key]
+          ordered: {Month: [Oct, Nov, Dec, Jan, Feb, Mar, Apr, May, Jun, Jul, Aug, Sep]}
+
+加载时只读取声明的列（usecols），声明类型的列由读取后端直接按该类型解析，
+不再逐列推断；源文件缺少声明的列、或取值无法转换为声明类型时抛出 SchemaDriftError，
+而不是加载出结构不符的表。追加到表中的增量数据同样按声明结构校验（见 conform_delta）。
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .compaction import CompactionReport, compact_dataframe
+from .config import SheetSchema, get_config
+
+
+class SchemaDriftError(ValueError):
+    """源数据与声明的 Sheet 结构不一致"""
+
+    def __init__(self, sheet_name: str, message: str):
+        self.sheet_name = sheet_name
+        super().__init__(f"Sheet '{sheet_name}' 与声明的结构不一致: {message}")
+
+
+def get_sheet_schema(sheet_name: Optional[str]) -> Optional[SheetSchema]:
+    """Sheet 的声明结构，未声明时返回 None"""
+    if sheet_name is None:
+        return None
+    return get_config().excel.sheet_schemas.get(sheet_name)
+
+
+def projected_columns(
+    schema: Optional[SheetSchema], columns: Optional[List[str]] = None
+) -> Optional[List[str]]:
+    """实际加载的列：显式指定的列优先，其次为声明的列，None 表示全部"""
+    if columns:
+        return list(columns)
+    if schema is not None and schema.columns:
+        return list(schema.columns)
+    return None
+
+
+def _typed_columns(schema: SheetSchema) -> List[str]:
+    """声明了类型的列"""
+    typed = list(schema.dtypes) + list(schema.categorical) + list(schema.ordered)
+    return list(dict.fromkeys(typed))
+
+
+def check_columns(
+    sheet_name: str,
+    header: List[Any],
+    schema: SheetSchema,
+    columns: Optional[List[str]] = None,
+) -> None:
+    """在读取数据前按表头校验：要加载的列与声明了类型的列都必须存在
+
+    Raises:
+        SchemaDriftError: 缺少列（如上游改名或删列）
+    """
+    required = projected_columns(schema, columns) or _typed_columns(schema)
+    present = set(header)
+    missing = [c for c in required if c not in present]
+    if missing:
+        raise SchemaDriftError(sheet_name, f"缺少列 {missing}，实际列: {list(header)}")
+
+
+def reader_dtypes(
+    schema: Optional[SheetSchema], columns: Optional[List[str]] = None
+) -> Dict[str, str]:
+    """传给读取后端的列类型（只包含实际加载的列；有序维度在读取后按取值顺序转换）"""
+    if schema is None:
+        return {}
+    dtypes = {**schema.dtypes, **{c: "category" for c in schema.categorical}}
+    usecols = projected_columns(schema, columns)
+    if usecols is not None:
+        dtypes = {c: t for c, t in dtypes.items() if c in usecols}
+    return dtypes
+
+
+def _cast(col: pd.Series, dtype: str) -> pd.Series:
+    """按声明类型转换（str/object 保留空值，而不是转为字符串 "nan"）"""
+    if dtype in ("str", "object"):
+        if col.dtype == object and bool(col.dropna().map(type).eq(str).all()):
+            return col
+        return col.where(col.isna(), col.astype(str)).astype(object)
+    return col.astype(dtype)
+
+
+def apply_schema(
+    df: pd.DataFrame,
+    schema: SheetSchema,
+    sheet_name: str,
+    compact: bool = True,
+    max_category_ratio: float = 0.5,
+) -> Tuple[pd.DataFrame, CompactionReport]:
+    """按声明结构确定列类型
+
+    - 声明的类型、分类维度、有序维度直接转换，不做推断
+    - 其余列在 compact 且 schema.infer_types 时按启发式压缩（见 compact_dataframe）
+
+    Args:
+        df: 读取的 DataFrame（不会被修改）
+        schema: 声明结构
+        sheet_name: Sheet 名称（用于报错）
+        compact: 是否压缩未声明类型的列
+        max_category_ratio: 转为 category 的最大去重比例
+
+    Returns:
+        (转换后的 DataFrame, 压缩报告)
+
+    Raises:
+        SchemaDriftError: 取值无法转换为声明类型，或出现有序维度之外的取值
+    """
+    typed = set(_typed_columns(schema))
+    if compact and schema.infer_types:
+        result, report = compact_dataframe(df, max_category_ratio, exclude=typed)
+    else:
+        result = df.copy(deep=False)
+        report = CompactionReport(bytes_before=int(df.memory_usage(deep=True).sum()))
+
+    for i, name in enumerate(result.columns):
+        if name not in typed:
+            continue
+        original = result.iloc[:, i]
+        try:
+            if name in schema.ordered:
+                order = schema.ordered[name]
+                unknown = [v for v in original.dropna().unique() if v not in order]
+                if unknown:
+                    raise SchemaDriftError(
+                        sheet_name, f"列 '{name}' 出现未声明的取值 {unknown[:10]}"
+                    )
+                dtype: Any = pd.CategoricalDtype(categories=order, ordered=True)
+                converted = original.astype(dtype)
+            elif name in schema.categorical:
+                converted = original.astype("category")
+            else:
+                converted = _cast(original, schema.dtypes[name])
+        except SchemaDriftError:
+            raise
+        except (ValueError, TypeError) as e:
+            raise SchemaDriftError(
+                sheet_name, f"列 '{name}' 无法转换为声明的类型: {e}"
+            ) from e
+
+        if converted.dtype != original.dtype:
+            report.converted_columns[str(name)] = (
+                f"{original.dtype} -> {converted.dtype}"
+            )
+            result.isetitem(i, converted)
+
+    report.bytes_after = int(result.memory_usage(deep=True).sum())
+    return result, report
+
+
+def conform_delta(
+    base: pd.DataFrame, delta: pd.DataFrame, schema: SheetSchema, sheet_name: str
+) -> pd.DataFrame:
+    """按声明结构转换要追加的增量数据，与声明不一致时在合并前报错
+
+    - 表中声明了类型的列在增量中必须存在，取值按声明类型转换
+    - 有序维度不得出现声明之外的取值
+    - 分类维度的取值类型须与表中已有的分类一致（如文本维度中不得混入数值）
+
+    Args:
+        base: 当前表数据
+        delta: 增量数据（不会被修改）
+        schema: 声明结构
+        sheet_name: Sheet 名称（用于报错）
+
+    Returns:
+        转换后的增量数据
+
+    Raises:
+        SchemaDriftError: 增量数据与声明结构不一致
+    """
+    typed = [c for c in _typed_columns(schema) if c in base.columns]
+    missing = [c for c in typed if c not in delta.columns]
+    if missing:
+        raise SchemaDriftError(sheet_name, f"增量数据缺少列 {missing}")
+
+    result, _ = apply_schema(delta, schema, sheet_name, compact=False)
+    for name in schema.categorical:
+        if name not in base.columns or not isinstance(
+            base[name].dtype, pd.CategoricalDtype
+        ):
+            continue
+        categories = result[name].cat.categories
+        if not len(categories):
+            continue
+        expected = pd.api.types.infer_dtype(base[name].cat.categories, skipna=True)
+        actual = pd.api.types.infer_dtype(categories, skipna=True)
+        if actual != expected:
+            raise SchemaDriftError(
+                sheet_name,
+                f"增量数据的列 '{name}' 取值类型为 {actual}，与表中的 {expected} 不一致",
+            )
+    return result
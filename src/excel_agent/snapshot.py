@@ -0,0 +1,288 @@
+"""工作区快照 - 将各会话工作区保存到本地目录，服务重启后恢复
+
+目录结构:
+    <snapshot_dir>/workspaces/<会话ID>.json   表信息、加载器状态、连接关系与活跃表
+    <snapshot_dir>/data/<文件>.feather         表数据（无压缩 Feather）
+
+恢复时不读取数据：表以已溢出状态登记，数据仍在快照文件中，首次访问时以内存映射读取，
+启动耗时与表的大小无关。源表未被修改的连接表只保存连接关系，恢复时重建惰性视图；
+源表已被修改或删除的连接表保存物化后的数据。内容相同的表（share_key 相同）只保存一份，
+数据未变化的表在后续快照中直接复用已写入的文件。
+"""
+
+import json
+import os
+import threading
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Optional
+
+from .config import get_config
+from .excel_loader import (
+    ExcelLoader,
+    MultiExcelLoader,
+    TableInfo,
+    install_workspace,
+    list_workspaces,
+)
+from .logger import get_logger
+from .session import is_valid_session_id
+
+logger = get_logger("excel_agent.snapshot")
+
+# 快照格式版本：结构变化时递增，旧快照不再恢复
+SNAPSHOT_FORMAT_VERSION = 1
+
+# 同一时间只执行一次快照
+_snapshot_lock = threading.Lock()
+
+
+def _snapshot_dirs(snapshot_dir: Optional[str]) -> tuple[Path, Path]:
+    """(工作区清单目录, 数据目录)"""
+    root = Path(snapshot_dir or get_config().excel.snapshot_dir)
+    return root / "workspaces", root / "data"
+
+
+def _info_to_dict(info: TableInfo) -> Dict[str, Any]:
+    data = asdict(info)
+    data["loaded_at"] = info.loaded_at.isoformat()
+    return data
+
+
+def _info_from_dict(data: Dict[str, Any]) -> TableInfo:
+    return TableInfo(**{**data, "loaded_at": datetime.fromisoformat(data["loaded_at"])})
+
+
+def _lineage_intact(lineage: Dict[str, Any], loaders: Dict[str, ExcelLoader]) -> bool:
+    """连接表的源表是否仍在且数据未被修改（可按连接关系重建）"""
+    table_ids = [lineage["table1_id"], lineage["table2_id"]]
+    for table_id, uid, version in zip(
+        table_ids, lineage["source_uids"], lineage["source_versions"]
+    ):
+        source = loaders.get(table_id)
+        if source is None or source.uid != uid or source.version != version:
+            return False
+    return True
+
+
+def _write_data(
+    loader: ExcelLoader, data_dir: Path, written: Dict[Hashable, str]
+) -> str:
+    """保存表数据，返回数据文件名
+
+    文件名包含加载器标识与数据版本，数据未变化时复用已有文件；
+    share_key 相同的表（含其他会话中的表）共用同一个文件。
+    """
+    key = loader.share_key or loader.uid
+    if key in written:
+        return written[key]
+
+    snapshot_file = loader.snapshot_file
+    if (
+        snapshot_file is not None
+        and snapshot_file.parent == data_dir
+        and snapshot_file.exists()
+    ):
+        name = snapshot_file.name
+    else:
+        name = f"{loader.uid}_{loader.version}.feather"
+        path = data_dir / name
+        if not path.exists():
+            loader.export_feather(path)
+
+    written[key] = name
+    return name
+
+
+def save_workspace(
+    workspace: MultiExcelLoader,
+    data_dir: Path,
+    written: Optional[Dict[Hashable, str]] = None,
+) -> Dict[str, Any]:
+    """保存一个工作区的数据文件，返回其清单
+
+    Args:
+        workspace: 会话工作区
+        data_dir: 数据目录
+        written: 本次快照已写入的数据文件（共享键 -> 文件名），跨工作区去重
+
+    Returns:
+        工作区清单（可 JSON 序列化）
+    """
+    written = {} if written is None else written
+    entries = workspace.table_entries()
+    loaders = {info.id: loader for info, loader in entries}
+
+    tables: List[Dict[str, Any]] = []
+    for info, loader in entries:
+        entry: Dict[str, Any] = {"info": _info_to_dict(info)}
+        try:
+            lineage = loader.join_lineage
+            if lineage is not None and _lineage_intact(lineage, loaders):
+                entry["join"] = lineage
+            else:
+                entry["loader"] = loader.snapshot_state()
+                entry["data"] = _write_data(loader, data_dir, written)
+        except Exception as e:
+            # 如混合类型的对象列无法以列式格式保存
+            logger.warning(f"表无法写入快照，已跳过: {info.filename} ({e})")
+            continue
+        tables.append(entry)
+
+    return {
+        "format": SNAPSHOT_FORMAT_VERSION,
+        "saved_at": datetime.now().isoformat(),
+        "active_table_id": workspace.active_table_id,
+        "tables": tables,
+    }
+
+
+def _write_json(path: Path, data: Dict[str, Any]) -> None:
+    """原子写入 JSON 文件（写临时文件后替换，崩溃时不会留下半个清单）"""
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(
+        json.dumps(data, ensure_ascii=False, default=str), encoding="utf-8"
+    )
+    os.replace(tmp_path, path)
+
+
+def save_snapshot(snapshot_dir: Optional[str] = None) -> Dict[str, int]:
+    """保存所有会话工作区的快照，并删除不再被引用的数据文件
+
+    Args:
+        snapshot_dir: 快照目录，默认使用 excel.snapshot_dir
+
+    Returns:
+        {"workspaces": 工作区数, "tables": 表数, "files": 数据文件数}
+    """
+    workspaces_dir, data_dir = _snapshot_dirs(snapshot_dir)
+    with _snapshot_lock:
+        workspaces_dir.mkdir(parents=True, exist_ok=True)
+        data_dir.mkdir(parents=True, exist_ok=True)
+
+        written: Dict[Hashable, str] = {}
+        saved = set()
+        n_tables = 0
+        for session_id, workspace in list_workspaces().items():
+            if workspace.closed or not workspace.is_loaded:
+                continue
+            manifest = save_workspace(workspace, data_dir, written)
+            _write_json(workspaces_dir / f"{session_id}.json", manifest)
+            saved.add(f"{session_id}.json")
+            n_tables += len(manifest["tables"])
+
+        # 清理已关闭或已清空的工作区与不再引用的数据文件
+        for path in workspaces_dir.glob("*.json"):
+            if path.name not in saved:
+                path.unlink(missing_ok=True)
+        referenced = set(written.values())
+        for path in data_dir.glob("*.feather"):
+            if path.name not in referenced:
+                try:
+                    path.unlink()
+                except OSError as e:
+                    # 仍被内存映射的文件（部分平台不允许删除），下次快照再清理
+                    logger.debug(f"快照数据文件暂时无法删除: {path.name} ({e})")
+
+    logger.info(f"工作区快照已保存: {len(saved)} 个工作区，{n_tables} 张表")
+    return {"workspaces": len(saved), "tables": n_tables, "files": len(referenced)}
+
+
+def restore_workspace(manifest: Dict[str, Any], data_dir: Path) -> MultiExcelLoader:
+    """按清单恢复一个工作区（表数据在首次访问时读取）"""
+    workspace = MultiExcelLoader()
+    for entry in manifest["tables"]:
+        info = _info_from_dict(entry["info"])
+        try:
+            if "join" in entry:
+                workspace.restore_join(info, entry["join"])
+                continue
+            path = data_dir / entry["data"]
+            if not path.exists():
+                raise FileNotFoundError(f"快照数据文件不存在: {path.name}")
+            loader = ExcelLoader()
+            loader.restore_snapshot(entry["loader"], path)
+            workspace.restore_table(info, loader)
+        except Exception as e:
+            logger.warning(f"表无法从快照恢复，已跳过: {info.filename} ({e})")
+
+    active_table_id = manifest.get("active_table_id")
+    if active_table_id and not workspace.set_active_table(active_table_id):
+        # 活跃表未能恢复时使用最后一张表
+        entries = workspace.table_entries()
+        if entries:
+            workspace.set_active_table(entries[-1][0].id)
+    return workspace
+
+
+def restore_snapshot(snapshot_dir: Optional[str] = None) -> Dict[str, int]:
+    """从快照恢复所有会话工作区（服务启动时调用）
+
+    Args:
+        snapshot_dir: 快照目录，默认使用 excel.snapshot_dir
+
+    Returns:
+        {"workspaces": 恢复的工作区数, "tables": 恢复的表数}
+    """
+    workspaces_dir, data_dir = _snapshot_dirs(snapshot_dir)
+    n_workspaces = n_tables = 0
+    for path in sorted(workspaces_dir.glob("*.json")):
+        session_id = path.stem
+        if not is_valid_session_id(session_id):
+            continue
+        try:
+            manifest = json.loads(path.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.warning(f"工作区快照清单损坏，已忽略: {path.name} ({e})")
+            continue
+        if manifest.get("format") != SNAPSHOT_FORMAT_VERSION:
+            logger.warning(f"工作区快照格式不兼容，已忽略: {path.name}")
+            continue
+
+        workspace = restore_workspace(manifest, data_dir)
+        if not workspace.is_loaded:
+            continue
+        install_workspace(session_id, workspace)
+        n_workspaces += 1
+        n_tables += len(workspace.table_entries())
+
+    if n_workspaces:
+        logger.info(f"已从快照恢复 {n_workspaces} 个工作区，{n_tables} 张表")
+    return {"workspaces": n_workspaces, "tables": n_tables}
+
+
+class SnapshotScheduler:
+    """定期保存工作区快照的后台线程（崩溃后最多丢失一个间隔内的变更）"""
+
+    def __init__(self, interval_seconds: float):
+        """
+        Args:
+            interval_seconds: 快照间隔（秒）
+        """
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="workspace-snapshot", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                save_snapshot()
+            except Exception as e:
+                logger.error(f"保存工作区快照失败: {e}")
+
+    def stop(self) -> None:
+        """停止后台线程（不会中断正在进行的快照）"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
@@ -1,25 +1,33 @@
 """Excel 操作工具集"""
 
+import ast
 from math import cos
 from typing import Any, Dict, List, Optional
 
+import numpy as np
 import pandas as pd
 from langchain_core.tools import tool
 
-from .excel_loader import get_loader
+from .excel_loader import ExcelLoader, get_loader
 from .config import get_config
 from .logger import get_logger
+from .predicates import filter_rows
+from .search_index import get_search_index
 
 logger = get_logger("excel_agent.tools")
 
 
-def _limit_result(df: pd.DataFrame, limit: Optional[int] = None) -> pd.DataFrame:
-    """限制返回结果行数"""
+def _result_limit(limit: Optional[int] = None) -> int:
+    """实际返回的行数上限"""
     config = get_config()
     if limit is None:
         limit = config.excel.default_result_limit
-    limit = min(limit, config.excel.max_result_limit)
-    return df.head(limit)
+    return min(limit, config.excel.max_result_limit)
+
+
+def _limit_result(df: pd.DataFrame, limit: Optional[int] = None) -> pd.DataFrame:
+    """限制返回结果行数"""
+    return df.head(_result_limit(limit))
 
 
 def _df_to_result(
@@ -43,43 +51,81 @@ def _df_to_result(
     }
 
 
-def _get_filter_mask(
-    df: pd.DataFrame, column: str, operator: str, value: Any
+# 工具只读访问共享的表：按筛选条件计算行号、只取用到的列，结果大小决定复制量；
+# 需要修改数据时（如新增列）只在取出的子表上进行，不得修改 table.dataframe
+
+
+def _active_table() -> ExcelLoader:
+    """当前活跃表"""
+    table = get_loader().get_active_loader()
+    if table is None:
+        raise ValueError("未加载 Excel 文件")
+    return table
+
+
+def _take_column(
+    table: ExcelLoader, column: str, rows: Optional[np.ndarray]
 ) -> pd.Series:
-    """内部辅助函数：生成单个筛选条件的布尔掩码"""
-    if column not in df.columns:
-        raise ValueError(f"列 '{column}' 不存在，可用列: {list(df.columns)}")
+    """取单列：未筛选的普通表直接返回共享的列（只读），否则只复制命中的行（不保留行标签）"""
+    source = table.column_source
+    if not isinstance(source, pd.DataFrame):
+        return table.take(rows=rows, columns=[column])[column]
+    if rows is None:
+        return source[column]
+    return pd.Series(source[column].array.take(rows), name=column)
 
-    col = df[column]
 
-    # 尝试将 value 转换为数值进行比较
-    try:
-        numeric_value = float(value)
-    except (ValueError, TypeError):
-        numeric_value = None
-
-    compare_value = numeric_value if numeric_value is not None else value
-
-    if operator == "==":
-        return col == compare_value
-    elif operator == "!=":
-        return col != compare_value
-    elif operator == ">":
-        return col > compare_value
-    elif operator == "<":
-        return col < compare_value
-    elif operator == ">=":
-        return col >= compare_value
-    elif operator == "<=":
-        return col <= compare_value
-    elif operator == "contains":
-        return col.astype(str).str.contains(str(value), case=False, na=False)
-    elif operator == "startswith":
-        return col.astype(str).str.startswith(str(value), na=False)
-    elif operator == "endswith":
-        return col.astype(str).str.endswith(str(value), na=False)
+def _take_frame(
+    table: ExcelLoader, columns: List[Optional[str]], rows: Optional[np.ndarray]
+) -> pd.DataFrame:
+    """取多列：未筛选的普通表直接返回共享的 DataFrame（只读），否则只取用到的列与命中的行"""
+    source = table.column_source
+    if rows is None and isinstance(source, pd.DataFrame):
+        return source
+    needed = [
+        c for c in dict.fromkeys(columns) if c is not None and c in source.columns
+    ]
+    return table.take(rows=rows, columns=needed or None)
+
+
+def _value_counts(col: pd.Series) -> pd.Series:
+    """按频次降序的取值计数（category 列不包含未出现的分类）"""
+    counts = col.value_counts()
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        counts = counts[counts > 0]
+    return counts
+
+
+def _select(
+    table: ExcelLoader, conditions: Dict[str, Any], columns: List[str]
+) -> pd.DataFrame:
+    """按等值条件取子表（维度列查二级索引），只取需要的列；值为 None 的条件忽略"""
+    filters = [
+        {"column": column, "operator": "==", "value": value}
+        for column, value in conditions.items()
+    ]
+    return table.take(rows=filter_rows(table, filters), columns=columns)
+
+
+def _top_rows(
+    table: ExcelLoader,
+    column: str,
+    rows: Optional[np.ndarray],
+    ascending: bool,
+    n: int,
+) -> np.ndarray:
+    """按列排序后前 n 行的行号（只对排序列排序，不排序整表）"""
+    col = _take_column(table, column, rows)
+    if 0 < n < len(col) and isinstance(col.dtype, np.dtype) and col.dtype.kind in "if":
+        # 数值列：部分排序选出前 n 行，再只对这 n 行排序（空值排在最后，同 sort_values）
+        values = col.to_numpy()
+        keys = values if ascending else -values
+        order = np.argpartition(keys, n - 1)[:n]
+        order = order[np.argsort(keys[order], kind="stable")]
     else:
-        raise ValueError(f"不支持的运算符: {operator}")
+        order = pd.Series(col.array).sort_values(ascending=ascending).index[:n]
+        order = order.to_numpy()
+    return order if rows is None else rows[order]
 
 
 @tool
@@ -110,39 +156,38 @@ def filter_data(
     Returns:
         筛选后的数据（可选排序）
     """
-    loader = get_loader()
-    df = loader.dataframe.copy()
+    table = _active_table()
+    # 按列取数：连接表只物化筛选用到的列，结果只物化返回的行
+    df = table.column_source
 
     try:
-        # 初始掩码为全 True
-        final_mask = pd.Series([True] * len(df))
-
-        # 1. 处理单条件参数 (兼容旧调用)
+        # 1. 单条件参数 (兼容旧调用) 与多条件列表
+        conditions = list(filters or [])
         if column and operator and value is not None:
-            mask = _get_filter_mask(df, column, operator, value)
-            final_mask &= mask
-
-        # 2. 处理多条件列表
-        if filters:
-            for f in filters:
-                f_col = f.get("column")
-                f_op = f.get("operator")
-                f_val = f.get("value")
-                if f_col and f_op and f_val is not None:
-                    mask = _get_filter_mask(df, f_col, f_op, f_val)
-                    final_mask &= mask
-
-        result_df = df[final_mask]
-
-        # 3. 排序（如果指定了 sort_by）
+            conditions.insert(
+                0, {"column": column, "operator": operator, "value": value}
+            )
+        rows = filter_rows(table, conditions)
+        total_rows = len(df) if rows is None else len(rows)
+
+        # 2. 排序（如果指定了 sort_by）：只排序该列，再取前 limit 行
+        if sort_by and sort_by not in df.columns:
+            return {"error": f"排序列 '{sort_by}' 不存在，可用列: {list(df.columns)}"}
+        n = _result_limit(limit)
         if sort_by:
-            if sort_by not in result_df.columns:
-                return {
-                    "error": f"排序列 '{sort_by}' 不存在，可用列: {list(result_df.columns)}"
-                }
-            result_df = result_df.sort_values(by=sort_by, ascending=ascending)
+            positions = _top_rows(table, sort_by, rows, ascending, n)
+        elif rows is None:
+            positions = np.arange(min(n, len(df)))
+        else:
+            positions = rows[:n]
+
+        # 只取需要返回的列
+        needed = [c for c in (select_columns or []) if c in df.columns]
+        result_df = table.take(rows=positions, columns=needed or None)
 
-        return _df_to_result(result_df, limit, select_columns)
+        result = _df_to_result(result_df, limit, select_columns)
+        result["total_rows"] = total_rows
+        return result
     except Exception as e:
         return {"error": f"筛选出错: {str(e)}"}
 
@@ -163,28 +208,19 @@ def aggregate_data(
     Returns:
         统计结果
     """
-    loader = get_loader()
-    df = loader.dataframe.copy()
+    table = _active_table()
+    source = table.column_source
 
-    # 如果有筛选条件，先进行筛选
-    if filters:
-        try:
-            final_mask = pd.Series([True] * len(df))
-            for f in filters:
-                f_col = f.get("column")
-                f_op = f.get("operator")
-                f_val = f.get("value")
-                if f_col and f_op and f_val is not None:
-                    mask = _get_filter_mask(df, f_col, f_op, f_val)
-                    final_mask &= mask
-            df = df[final_mask]
-        except Exception as e:
-            return {"error": f"筛选条件错误: {str(e)}"}
+    # 如果有筛选条件，先计算命中的行（只生成行号，不复制表）
+    try:
+        rows = filter_rows(table, filters)
+    except Exception as e:
+        return {"error": f"筛选条件错误: {str(e)}"}
 
-    if column not in df.columns:
-        return {"error": f"列 '{column}' 不存在，可用列: {list(df.columns)}"}
+    if column not in source.columns:
+        return {"error": f"列 '{column}' 不存在，可用列: {list(source.columns)}"}
 
-    col = df[column]
+    col = _take_column(table, column, rows)
 
     try:
         if agg_func == "sum":
@@ -211,7 +247,7 @@ def aggregate_data(
         return {
             "column": column,
             "function": agg_func,
-            "filtered_rows": len(df),
+            "filtered_rows": len(col),
             "result": result,
         }
     except Exception as e:
@@ -238,31 +274,27 @@ def group_and_aggregate(
     Returns:
         分组聚合结果
     """
-    loader = get_loader()
-    df = loader.dataframe.copy()
+    table = _active_table()
+    source = table.column_source
 
-    # 如果有筛选条件，先进行筛选
-    if filters:
-        try:
-            final_mask = pd.Series([True] * len(df))
-            for f in filters:
-                f_col = f.get("column")
-                f_op = f.get("operator")
-                f_val = f.get("value")
-                if f_col and f_op and f_val is not None:
-                    mask = _get_filter_mask(df, f_col, f_op, f_val)
-                    final_mask &= mask
-            df = df[final_mask]
-        except Exception as e:
-            return {"error": f"筛选条件错误: {str(e)}"}
+    # 如果有筛选条件，先计算命中的行（只生成行号，不复制表）
+    try:
+        rows = filter_rows(table, filters)
+    except Exception as e:
+        return {"error": f"筛选条件错误: {str(e)}"}
 
-    if group_by not in df.columns:
-        return {"error": f"分组列 '{group_by}' 不存在，可用列: {list(df.columns)}"}
-    if agg_column not in df.columns:
-        return {"error": f"聚合列 '{agg_column}' 不存在，可用列: {list(df.columns)}"}
+    if group_by not in source.columns:
+        return {"error": f"分组列 '{group_by}' 不存在，可用列: {list(source.columns)}"}
+    if agg_column not in source.columns:
+        return {
+            "error": f"聚合列 '{agg_column}' 不存在，可用列: {list(source.columns)}"
+        }
 
     try:
-        grouped = df.groupby(group_by)[agg_column].agg(agg_func).reset_index()
+        df = _take_frame(table, [group_by, agg_column], rows)
+        grouped = (
+            df.groupby(group_by, observed=True)[agg_column].agg(agg_func).reset_index()
+        )
         grouped.columns = [group_by, f"{agg_column}_{agg_func}"]
 
         # 按聚合结果降序排序
@@ -295,30 +327,26 @@ def sort_data(
     Returns:
         排序后的数据
     """
-    loader = get_loader()
-    df = loader.dataframe.copy()
+    table = _active_table()
+    source = table.column_source
 
-    # 如果有筛选条件，先进行筛选
-    if filters:
-        try:
-            final_mask = pd.Series([True] * len(df))
-            for f in filters:
-                f_col = f.get("column")
-                f_op = f.get("operator")
-                f_val = f.get("value")
-                if f_col and f_op and f_val is not None:
-                    mask = _get_filter_mask(df, f_col, f_op, f_val)
-                    final_mask &= mask
-            df = df[final_mask]
-        except Exception as e:
-            return {"error": f"筛选条件错误: {str(e)}"}
+    # 如果有筛选条件，先计算命中的行（只生成行号，不复制表）
+    try:
+        rows = filter_rows(table, filters)
+    except Exception as e:
+        return {"error": f"筛选条件错误: {str(e)}"}
 
-    if column not in df.columns:
-        return {"error": f"列 '{column}' 不存在，可用列: {list(df.columns)}"}
+    if column not in source.columns:
+        return {"error": f"列 '{column}' 不存在，可用列: {list(source.columns)}"}
 
     try:
-        sorted_df = df.sort_values(by=column, ascending=ascending)
-        return _df_to_result(sorted_df, limit, select_columns)
+        # 只对排序列排序，再按前 limit 行的行号取返回的列
+        positions = _top_rows(table, column, rows, ascending, _result_limit(limit))
+        needed = [c for c in (select_columns or []) if c in source.columns]
+        sorted_df = table.take(rows=positions, columns=needed or None)
+        result = _df_to_result(sorted_df, limit, select_columns)
+        result["total_rows"] = len(source) if rows is None else len(rows)
+        return result
     except Exception as e:
         return {"error": f"排序出错: {str(e)}"}
 
@@ -341,21 +369,24 @@ def search_data(
     Returns:
         包含关键词的数据行
     """
-    loader = get_loader()
-    df = loader.dataframe
+    table = _active_table()
+    df = table.column_source
 
     try:
         # 确定搜索范围
-        search_cols = columns if columns else df.columns
+        search_cols = columns if columns else list(df.columns)
 
-        # 在指定列中搜索
-        mask = pd.Series([False] * len(df))
-        for col in search_cols:
-            if col in df.columns:
-                mask |= df[col].astype(str).str.contains(keyword, case=False, na=False)
+        # 查全文索引（按表的数据版本建立一次），只校验候选取值，不逐行渲染单元格
+        rows, stats = get_search_index(table).search(df, keyword, search_cols)
 
-        result_df = df[mask]
-        return _df_to_result(result_df, limit, select_columns)
+        needed = [c for c in (select_columns or []) if c in df.columns]
+        result_df = table.take(
+            rows=rows[: _result_limit(limit)], columns=needed or None
+        )
+        result = _df_to_result(result_df, limit, select_columns)
+        result["total_rows"] = len(rows)
+        result["search_stats"] = stats
+        return result
     except Exception as e:
         return {"error": f"搜索出错: {str(e)}"}
 
@@ -373,33 +404,24 @@ def get_column_stats(
     Returns:
         列的统计信息
     """
-    loader = get_loader()
-    df = loader.dataframe.copy()
+    table = _active_table()
+    source = table.column_source
 
-    # 如果有筛选条件，先进行筛选
-    if filters:
-        try:
-            final_mask = pd.Series([True] * len(df))
-            for f in filters:
-                f_col = f.get("column")
-                f_op = f.get("operator")
-                f_val = f.get("value")
-                if f_col and f_op and f_val is not None:
-                    mask = _get_filter_mask(df, f_col, f_op, f_val)
-                    final_mask &= mask
-            df = df[final_mask]
-        except Exception as e:
-            return {"error": f"筛选条件错误: {str(e)}"}
+    # 如果有筛选条件，先计算命中的行（只生成行号，不复制表）
+    try:
+        rows = filter_rows(table, filters)
+    except Exception as e:
+        return {"error": f"筛选条件错误: {str(e)}"}
 
-    if column not in df.columns:
-        return {"error": f"列 '{column}' 不存在，可用列: {list(df.columns)}"}
+    if column not in source.columns:
+        return {"error": f"列 '{column}' 不存在，可用列: {list(source.columns)}"}
 
-    col = df[column]
+    col = _take_column(table, column, rows)
 
     try:
         stats = {
             "column": column,
-            "filtered_rows": len(df),
+            "filtered_rows": len(col),
             "dtype": str(col.dtype),
             "count": int(col.count()),
             "null_count": int(col.isna().sum()),
@@ -436,29 +458,21 @@ def get_unique_values(
     Returns:
         唯一值列表及其计数
     """
-    loader = get_loader()
-    df = loader.dataframe.copy()
+    table = _active_table()
+    source = table.column_source
 
-    # 如果有筛选条件，先进行筛选
-    if filters:
-        try:
-            final_mask = pd.Series([True] * len(df))
-            for f in filters:
-                f_col = f.get("column")
-                f_op = f.get("operator")
-                f_val = f.get("value")
-                if f_col and f_op and f_val is not None:
-                    mask = _get_filter_mask(df, f_col, f_op, f_val)
-                    final_mask &= mask
-            df = df[final_mask]
-        except Exception as e:
-            return {"error": f"筛选条件错误: {str(e)}"}
+    # 如果有筛选条件，先计算命中的行（只生成行号，不复制表）
+    try:
+        rows = filter_rows(table, filters)
+    except Exception as e:
+        return {"error": f"筛选条件错误: {str(e)}"}
 
-    if column not in df.columns:
-        return {"error": f"列 '{column}' 不存在，可用列: {list(df.columns)}"}
+    if column not in source.columns:
+        return {"error": f"列 '{column}' 不存在，可用列: {list(source.columns)}"}
 
     try:
-        value_counts = df[column].value_counts()
+        col = _take_column(table, column, rows)
+        value_counts = _value_counts(col)
         total_unique = len(value_counts)
 
         if limit:
@@ -471,7 +485,7 @@ def get_unique_values(
 
         return {
             "column": column,
-            "filtered_rows": len(df),
+            "filtered_rows": len(col),
             "total_unique": total_unique,
             "returned_unique": len(values),
             "values": values,
@@ -592,23 +606,16 @@ def generate_chart(
     if agg_column and not y_column:
         y_column = agg_column
 
-    loader = get_loader()
-    df = loader.dataframe.copy()
+    table = _active_table()
 
-    # 应用筛选条件
-    if filters:
-        try:
-            final_mask = pd.Series([True] * len(df))
-            for f in filters:
-                f_col = f.get("column")
-                f_op = f.get("operator")
-                f_val = f.get("value")
-                if f_col and f_op and f_val is not None:
-                    mask = _get_filter_mask(df, f_col, f_op, f_val)
-                    final_mask &= mask
-            df = df[final_mask]
-        except Exception as e:
-            return {"error": f"筛选条件错误: {str(e)}"}
+    # 应用筛选条件，只取图表用到的列
+    try:
+        rows = filter_rows(table, filters)
+    except Exception as e:
+        return {"error": f"筛选条件错误: {str(e)}"}
+    df = _take_frame(
+        table, [x_column, y_column, group_by, *(series_columns or [])], rows
+    )
 
     if len(df) == 0:
         return {"error": "筛选后无数据，无法生成图表"}
@@ -705,10 +712,14 @@ def _prepare_chart_data(
         # 饼图：按分组列聚合
         if group_by and group_by in df.columns:
             if y_column and y_column in df.columns:
-                grouped = df.groupby(group_by)[y_column].agg(agg_func).reset_index()
+                grouped = (
+                    df.groupby(group_by, observed=True)[y_column]
+                    .agg(agg_func)
+                    .reset_index()
+                )
                 grouped.columns = ["name", "value"]
             else:
-                grouped = df[group_by].value_counts().reset_index()
+                grouped = _value_counts(df[group_by]).reset_index()
                 grouped.columns = ["name", "value"]
 
             grouped = grouped.head(limit)
@@ -754,7 +765,11 @@ def _prepare_chart_data(
         # 计算每个指标的聚合值
         if group_by and group_by in df.columns:
             # 按分组生成多个雷达系列
-            grouped = df.groupby(group_by)[valid_cols].agg(agg_func).head(limit)
+            grouped = (
+                df.groupby(group_by, observed=True)[valid_cols]
+                .agg(agg_func)
+                .head(limit)
+            )
             indicators = [
                 {"name": col, "max": float(df[col].max() * 1.2)} for col in valid_cols
             ]
@@ -787,10 +802,14 @@ def _prepare_chart_data(
         # 漏斗图：类似饼图，按值降序排列
         if group_by and group_by in df.columns:
             if y_column and y_column in df.columns:
-                grouped = df.groupby(group_by)[y_column].agg(agg_func).reset_index()
+                grouped = (
+                    df.groupby(group_by, observed=True)[y_column]
+                    .agg(agg_func)
+                    .reset_index()
+                )
                 grouped.columns = ["name", "value"]
             else:
-                grouped = df[group_by].value_counts().reset_index()
+                grouped = _value_counts(df[group_by]).reset_index()
                 grouped.columns = ["name", "value"]
 
             grouped = grouped.sort_values("value", ascending=False).head(limit)
@@ -816,7 +835,11 @@ def _prepare_chart_data(
                 return {"error": "series_columns 中没有有效的列"}
 
             # 按 x_column 分组，计算每个系列的聚合值
-            grouped = df.groupby(x_column)[valid_series].agg(agg_func).head(limit)
+            grouped = (
+                df.groupby(x_column, observed=True)[valid_series]
+                .agg(agg_func)
+                .head(limit)
+            )
             categories = [str(idx) for idx in grouped.index]
             series = [
                 {"name": col, "data": grouped[col].tolist()} for col in valid_series
@@ -829,14 +852,18 @@ def _prepare_chart_data(
 
         # 单系列处理
         if y_column and y_column in df.columns:
-            grouped = df.groupby(x_column)[y_column].agg(agg_func).reset_index()
+            grouped = (
+                df.groupby(x_column, observed=True)[y_column]
+                .agg(agg_func)
+                .reset_index()
+            )
             grouped.columns = ["category", "value"]
             grouped = grouped.sort_values("value", ascending=False).head(limit)
             categories = [str(c) for c in grouped["category"]]
             values = grouped["value"].tolist()
         else:
             # 仅计数
-            grouped = df[x_column].value_counts().head(limit)
+            grouped = _value_counts(df[x_column]).head(limit)
             categories = [str(idx) for idx in grouped.index]
             values = grouped.values.tolist()
 
@@ -1025,7 +1052,7 @@ def _calculate_allocated_costs_impl(
     if "Allocation" not in function:
         return {"error": f"function 中必须含有 Allocation"}
     loader = get_loader()
-    tables = loader.get_loaded_dataframes()
+    tables = loader.get_loaded_tables()
     cdb = tables.get("CostDataBase")
     t7 = tables.get("Table7")
 
@@ -1033,33 +1060,26 @@ def _calculate_allocated_costs_impl(
         raise ValueError("未找到 CostDataBase 或 Table7 表")
 
     # 1. 筛选 CDB
-    cdb_query = f"Year == '{year}' and Scenario == '{scenario}'"
-    if function:
-        cdb_query += f" and Function == '{function}'"
-    cdb_filtered = cdb.query(cdb_query).copy()
+    cdb_filtered = _select(
+        cdb,
+        {"Year": year, "Scenario": scenario, "Function": function or None},
+        ["Month", "Key", "Amount"],
+    )
 
     # 2. 筛选 T7
-    # 根据 target_type (BL 或 CC) 动态构建查询
-    if target_type.upper() == "BL":
-        t7_query = f"Year == '{year}' and Scenario == '{scenario}' and BL == '{target}'"
-    elif target_type.upper() == "CC":
-        # CC 可能是数字，尝试转换
-        try:
-            target_cc = int(target)
-            t7_query = (
-                f"Year == '{year}' and Scenario == '{scenario}' and CC == {target_cc}"
-            )
-        except ValueError:
-            t7_query = (
-                f"Year == '{year}' and Scenario == '{scenario}' and CC == '{target}'"
-            )
-    else:
+    # 根据 target_type (BL 或 CC) 确定目标列（CC 可能是数字，比较值按列类型转换）
+    if target_type.upper() not in ("BL", "CC"):
         raise ValueError(f"不支持的目标类型: {target_type}，仅支持 BL 或 CC")
+    rate_col = "RateNo" if "RateNo" in t7.columns else "Value"
 
     # logger.info(cdb_filtered)
     # 仅保留 CDB 中存在的 Key
     valid_keys = cdb_filtered["Key"].unique()
-    t7_filtered = t7.query(t7_query).copy()
+    t7_filtered = _select(
+        t7,
+        {"Year": year, "Scenario": scenario, target_type.upper(): target},
+        ["Month", "Key", rate_col],
+    )
     t7_filtered = t7_filtered[t7_filtered["Key"].isin(valid_keys)]
 
     if len(t7_filtered) == 0:
@@ -1067,8 +1087,11 @@ def _calculate_allocated_costs_impl(
         return pd.DataFrame(columns=["Month", "Allocated_Amount"])
 
     # 3. 聚合 Rate
-    rate_col = "RateNo" if "RateNo" in t7_filtered.columns else "Value"
-    t7_agg = t7_filtered.groupby(["Month", "Key"])[rate_col].sum().reset_index()
+    t7_agg = (
+        t7_filtered.groupby(["Month", "Key"], observed=True)[rate_col]
+        .sum()
+        .reset_index()
+    )
     t7_agg = t7_agg.rename(columns={rate_col: "Agg_Rate"})
 
     # 4. Merge
@@ -1081,7 +1104,9 @@ def _calculate_allocated_costs_impl(
     merged["Allocated_Amount"] = merged["Amount"] * merged["Agg_Rate"]
 
     # 6. Aggregate
-    result = merged.groupby("Month")["Allocated_Amount"].sum().reset_index()
+    result = (
+        merged.groupby("Month", observed=True)["Allocated_Amount"].sum().reset_index()
+    )
 
     # 排序
     month_order = {
@@ -1203,20 +1228,20 @@ def _calculate_trend_impl(
 ) -> pd.DataFrame:
     """内部实现：计算成本趋势"""
     loader = get_loader()
-    tables = loader.get_loaded_dataframes()
+    tables = loader.get_loaded_tables()
     cdb = tables.get("CostDataBase")
 
     if cdb is None:
         raise ValueError("未找到 CostDataBase 表")
 
-    query = f"Year == '{year}' and Scenario == '{scenario}'"
-    if function:
-        query += f" and Function == '{function}'"
-
-    df = cdb.query(query).copy()
+    df = _select(
+        cdb,
+        {"Year": year, "Scenario": scenario, "Function": function or None},
+        ["Month", "Amount"],
+    )
 
     # 按月汇总
-    result = df.groupby("Month")["Amount"].sum().reset_index()
+    result = df.groupby("Month", observed=True)["Amount"].sum().reset_index()
 
     # 排序月份
     month_order = {
@@ -1268,7 +1293,7 @@ def _analyze_cost_composition_impl(
 ) -> pd.DataFrame:
     """内部实现：分析成本构成"""
     loader = get_loader()
-    tables = loader.get_loaded_dataframes()
+    tables = loader.get_loaded_tables()
     cdb = tables.get("CostDataBase")
 
     if cdb is None:
@@ -1277,10 +1302,10 @@ def _analyze_cost_composition_impl(
     if dimension not in cdb.columns:
         raise ValueError(f"维度 '{dimension}' 不存在")
 
-    df = cdb.query(f"Year == '{year}' and Scenario == '{scenario}'").copy()
+    df = _select(cdb, {"Year": year, "Scenario": scenario}, [dimension, "Amount"])
 
     # 按维度汇总
-    result = df.groupby(dimension)["Amount"].sum().reset_index()
+    result = df.groupby(dimension, observed=True)["Amount"].sum().reset_index()
 
     # 计算占比
     total = result["Amount"].sum()
@@ -1322,7 +1347,7 @@ def _compare_scenarios_impl(
 ) -> pd.DataFrame:
     """内部实现：对比两个场景"""
     loader = get_loader()
-    tables = loader.get_loaded_dataframes()
+    tables = loader.get_loaded_tables()
     cdb = tables.get("CostDataBase")
 
     if cdb is None:
@@ -1330,10 +1355,8 @@ def _compare_scenarios_impl(
 
     # 获取两个场景的数据
     def get_amount(y, s, f):
-        query = f"Year == '{y}' and Scenario == '{s}'"
-        if f:
-            query += f" and Function == '{f}'"
-        return cdb.query(query)["Amount"].sum()
+        conditions = {"Year": y, "Scenario": s, "Function": f or None}
+        return _select(cdb, conditions, ["Amount"])["Amount"].sum()
 
     amount1 = get_amount(year1, scenario1, function)
     amount2 = get_amount(year2, scenario2, function)
@@ -1380,6 +1403,28 @@ def compare_scenarios(
         return {"error": f"场景对比出错: {str(e)}"}
 
 
+def _referenced_names(query: str) -> set:
+    """查询代码中引用的变量名（无法解析时为空）"""
+    try:
+        tree = ast.parse(query)
+    except SyntaxError:
+        return set()
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+
+
+def _query_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """查询代码使用的表副本（深拷贝）
+
+    无序 category 列（加载时压缩的字符串列）还原为原类型：查询代码按字符串比较大小
+    （如 df['Year'] > 'FY24'）时，无序 category 会报错。
+    """
+    data = df.copy(deep=True)
+    for i, dtype in enumerate(data.dtypes):
+        if isinstance(dtype, pd.CategoricalDtype) and not dtype.ordered:
+            data.isetitem(i, data.iloc[:, i].astype(dtype.categories.dtype))
+    return data
+
+
 @tool
 def execute_pandas_query(query: str, limit: int = 100) -> Dict[str, Any]:
     """执行 Pandas 查询。
@@ -1392,7 +1437,7 @@ def execute_pandas_query(query: str, limit: int = 100) -> Dict[str, Any]:
                e.g:
                - df.query("Year == 'FY26'")
                - df[df['Year'] == 'FY26'][['cost text', 'Allocation Key']]
-               - df.groupby('Function')['Amount'].sum()
+               - df.groupby('Function', observed=True)['Amount'].sum()
         limit: 返回结果数量限制，默认100
 
     Returns:
@@ -1427,14 +1472,19 @@ def execute_pandas_query(query: str, limit: int = 100) -> Dict[str, Any]:
     try:
         # 获取所有表的数据框，支持多表查询
         # 变量名通常是文件名（无后缀）
-        all_dfs = loader.get_loaded_dataframes()
+        all_tables = loader.get_loaded_tables()
 
-        # 准备执行环境
+        # 准备执行环境：查询代码可能经由 .values/.array 等原地修改数据，
+        # 只传入它引用到的表（其余表不读取），且一律深拷贝，共享的表不会被修改
+        referenced = _referenced_names(query)
         local_env = {"pd": pd}
-        if all_dfs:
-            for name, data in all_dfs.items():
+        if all_tables:
+            for name, table in all_tables.items():
                 # 简单的变量名清理，确保可用
                 safe_name = name.replace(" ", "_").replace("-", "_")
+                if name not in referenced and safe_name not in referenced:
+                    continue
+                data = _query_frame(table.dataframe)
                 local_env[safe_name] = data
                 # 也尝试保留原名（如果也是合法的）
                 local_env[name] = data
@@ -1449,7 +1499,6 @@ def execute_pandas_query(query: str, limit: int = 100) -> Dict[str, Any]:
 
             # 简单处理：执行代码，如果代码中定义了 'result' 变量，则返回它
             # 或者，我们可以尝试解析代码，找到最后一个表达式节点
-            import ast
 
             tree = ast.parse(query)
             if not tree.body:
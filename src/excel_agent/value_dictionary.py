@@ -0,0 +1,271 @@
+"""按 Token 预算裁剪的字段值字典 - 用于注入 Prompt
+
+完整的去重字段值 JSON 在高基数列上可达数万 Token。这里按频次为每列保留
+最常见的取值（附出现次数和「+N more」标记），并保证总量不超过 Token 预算。
+提供问题文本时，会通过取值查找索引优先纳入问题中提到的列和取值。
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import pandas as pd
+
+from .config import get_config
+
+_CJK_PATTERN = re.compile(r"[　-鿿＀-￯]")
+_ASCII_WORD = re.compile(r"^[0-9A-Za-z_ .&/-]+$")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 Token 数：中文等全角字符按 1 个/字，其余按 4 字符/Token"""
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _normalize(value: Any) -> str:
+    """查找用的归一化取值（去空白、小写）"""
+    return str(value).strip().lower()
+
+
+def _is_dictionary_column(col: pd.Series, keep_all_types: bool) -> bool:
+    """该列是否需要进入字段值字典（字符串列，或白名单字段）"""
+    if keep_all_types:
+        return True
+    return (
+        col.dtype == object
+        or isinstance(col.dtype, pd.CategoricalDtype)
+        or pd.api.types.is_string_dtype(col.dtype)
+    )
+
+
+def column_value_counts(col: pd.Series, keep_all_types: bool) -> pd.Series:
+    """按频次降序的取值计数（字符串去首尾空白后合并，非白名单字段仅保留非空字符串）"""
+    counts = col.value_counts(dropna=True)
+    counts = counts[counts > 0]  # category 列会包含未出现的分类
+    if counts.empty:
+        return counts
+
+    index = counts.index.to_series(index=range(len(counts)))
+    is_str = index.map(type).eq(str).to_numpy()
+    if not keep_all_types:
+        counts = counts[is_str]
+        index = index[is_str]
+        is_str = is_str[is_str]
+
+    keys = [str(v).strip() if s else v for v, s in zip(index.tolist(), is_str.tolist())]
+    merged = pd.Series(counts.to_numpy(), index=pd.Index(keys, dtype=object))
+    if not keep_all_types:
+        merged = merged[merged.index != ""]
+    merged = merged.groupby(level=0, sort=False).sum()
+    return merged.sort_values(ascending=False, kind="stable")
+
+
+@dataclass
+class TableValues:
+    """一张表的字段取值统计（按数据版本缓存）"""
+
+    counts: Dict[str, pd.Series]  # 列名 -> 取值计数（降序）
+    lookup: Dict[str, List[Tuple[str, Any]]]  # 归一化取值 -> [(列名, 原始取值)]
+
+
+def build_table_values(df: pd.DataFrame, field_whitelist: Sequence[str]) -> TableValues:
+    """统计一张表各字典列的取值频次，并构建取值查找索引"""
+    counts: Dict[str, pd.Series] = {}
+    lookup: Dict[str, List[Tuple[str, Any]]] = {}
+    for column in df.columns:
+        col = df[column]
+        keep_all_types = column in field_whitelist
+        if not _is_dictionary_column(col, keep_all_types):
+            continue
+        vc = column_value_counts(col, keep_all_types)
+        if vc.empty:
+            continue
+        counts[str(column)] = vc
+        for value in vc.index:
+            lookup.setdefault(_normalize(value), []).append((str(column), value))
+    return TableValues(counts=counts, lookup=lookup)
+
+
+def update_table_values(
+    values: TableValues,
+    removed: pd.DataFrame,
+    added: pd.DataFrame,
+    field_whitelist: Sequence[str],
+) -> TableValues:
+    """按被替换和新写入的行增量更新取值统计（不重新扫描整张表）
+
+    Args:
+        values: 旧的取值统计
+        removed: 从表中移除的行
+        added: 写入表中的行（列类型与新表一致）
+        field_whitelist: 保留所有类型值的字段白名单
+
+    Returns:
+        新的取值统计
+    """
+    counts = dict(values.counts)
+    for column in added.columns:
+        keep_all_types = column in field_whitelist
+        if not _is_dictionary_column(added[column], keep_all_types):
+            continue
+        name = str(column)
+        delta = column_value_counts(added[column], keep_all_types)
+        if len(removed):
+            delta = delta.sub(
+                column_value_counts(removed[column], keep_all_types), fill_value=0
+            )
+        if name in counts:
+            delta = counts[name].add(delta, fill_value=0)
+        delta = delta[delta > 0].astype("int64")
+        if delta.empty:
+            counts.pop(name, None)
+        else:
+            counts[name] = delta.sort_values(ascending=False, kind="stable")
+
+    lookup: Dict[str, List[Tuple[str, Any]]] = {}
+    for name, vc in counts.items():
+        for value in vc.index:
+            lookup.setdefault(_normalize(value), []).append((name, value))
+    return TableValues(counts=counts, lookup=lookup)
+
+
+def _question_terms(question: str, max_len: int = 64) -> Set[str]:
+    """问题文本的所有子串（用于在取值查找索引中做字典查找，而不是逐个取值扫描问题）"""
+    terms: Set[str] = set()
+    n = len(question)
+    for i in range(n):
+        for j in range(i + 2, min(n, i + max_len) + 1):
+            terms.add(question[i:j])
+    return terms
+
+
+def _mentions(question: str, term: str) -> bool:
+    """问题中是否提到了某个取值/列名（纯 ASCII 词要求词边界，避免 'it' 命中 'with'）"""
+    if len(term) < 2:
+        return False
+    if _ASCII_WORD.match(term):
+        return (
+            re.search(rf"(?<![0-9a-z]){re.escape(term)}(?![0-9a-z])", question)
+            is not None
+        )
+    return term in question
+
+
+@dataclass
+class _ColumnEntry:
+    """待写入字典的一列"""
+
+    table: str
+    column: str
+    counts: pd.Series
+    matched: List[Any] = field(default_factory=list)  # 问题中提到的取值
+    named: bool = False  # 问题中提到了列名
+
+    @property
+    def relevant(self) -> bool:
+        return self.named or bool(self.matched)
+
+    def render(self, max_values: int) -> Dict[str, Any]:
+        """渲染为字典片段：问题中提到的取值优先，其余按频次"""
+        chosen = list(self.matched)
+        for value in self.counts.index:
+            if len(chosen) >= max(max_values, len(self.matched)):
+                break
+            if value not in chosen:
+                chosen.append(value)
+
+        values = {str(v): int(self.counts[v]) for v in chosen}
+        entry: Dict[str, Any] = {"distinct": int(len(self.counts)), "values": values}
+        remaining = len(self.counts) - len(chosen)
+        if remaining > 0:
+            entry["values"]["..."] = f"+{remaining} more"
+        return entry
+
+
+def build_value_dictionary(
+    tables: List[Tuple[str, TableValues]],
+    question: Optional[str] = None,
+    token_budget: Optional[int] = None,
+    max_values_per_column: Optional[int] = None,
+) -> str:
+    """构建按 Token 预算裁剪的「表 -> 字段 -> {取值: 次数}」JSON
+
+    Args:
+        tables: [(表标识, 表取值统计)]
+        question: 当前用户问题，提供时优先纳入问题中提到的列和取值
+        token_budget: Token 预算，默认使用 excel.value_dictionary_token_budget
+        max_values_per_column: 每列最多保留的取值数，默认使用配置值
+
+    Returns:
+        JSON 字符串
+    """
+    excel_config = get_config().excel
+    if token_budget is None:
+        token_budget = excel_config.value_dictionary_token_budget
+    if max_values_per_column is None:
+        max_values_per_column = excel_config.value_dictionary_max_values
+
+    normalized_question = _normalize(question) if question else ""
+
+    # 1. 收集候选列，并通过取值查找索引找出问题中提到的取值
+    question_terms = _question_terms(normalized_question)
+    entries: List[_ColumnEntry] = []
+    for table, values in tables:
+        by_column = {
+            column: _ColumnEntry(table=table, column=column, counts=counts)
+            for column, counts in values.counts.items()
+        }
+        hits = [
+            term
+            for term in question_terms & values.lookup.keys()
+            if _mentions(normalized_question, term)
+        ]
+        # 只保留最长匹配：问题提到「服务123」时不再算作提到「服务12」
+        for term in hits:
+            if any(term != other and term in other for other in hits):
+                continue
+            for column, value in values.lookup[term]:
+                by_column[column].matched.append(value)
+        for column, entry in by_column.items():
+            # 问题中直接提到列名时，也视为相关列
+            entry.named = _mentions(normalized_question, _normalize(column))
+        entries.extend(by_column.values())
+
+    # 2. 相关列优先，其余按基数从低到高（低基数维度列对理解数据最有用）
+    entries.sort(key=lambda e: (not e.relevant, len(e.counts)))
+
+    # 3. 在预算内依次写入，放不下时减少该列的取值数
+    result: Dict[str, Dict[str, Any]] = {}
+    omitted: Dict[str, List[str]] = {}
+    # 预留各表标识与 _omitted_columns 键的开销
+    used = 2 + sum(
+        estimate_tokens(
+            json.dumps({table: {"_omitted_columns": []}}, ensure_ascii=False)
+        )
+        for table, _ in tables
+    )
+    for entry in entries:
+        max_values = max_values_per_column
+        while True:
+            fragment = entry.render(max_values)
+            cost = estimate_tokens(
+                json.dumps({entry.column: fragment}, ensure_ascii=False)
+            )
+            if used + cost <= token_budget or max_values <= 1:
+                break
+            max_values //= 2
+
+        if used + cost > token_budget:
+            omitted.setdefault(entry.table, []).append(entry.column)
+            used += estimate_tokens(json.dumps(entry.column, ensure_ascii=False)) + 1
+            continue
+
+        result.setdefault(entry.table, {})[entry.column] = fragment
+        used += cost
+
+    for table, columns in omitted.items():
+        result.setdefault(table, {})["_omitted_columns"] = columns
+
+    return json.dumps(result, ensure_ascii=False, default=str)
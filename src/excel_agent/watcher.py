@@ -0,0 +1,177 @@
+"""源文件监视 - 通过路径加载的表在文件变化后自动重新加载
+
+共享盘上的工作簿被覆盖后，已加载的表会过期。监视器在后台线程中定期检查文件的
+修改时间与大小，两次检查结果一致（文件已写完）且与上次加载时不同时，提交后台任务
+重新加载；内容哈希未变化时跳过（如仅被 touch）。新数据加载完成后原子替换表，
+正在执行的查询继续使用旧快照。
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from .config import get_config
+from .excel_loader import MultiExcelLoader
+from .jobs import Job, get_job_manager
+from .logger import get_logger
+from .session import current_session_id, use_session
+
+logger = get_logger("excel_agent.watcher")
+
+FileStat = Tuple[int, int]  # (修改时间 ns, 文件大小)
+
+
+def _stat(file_path: str) -> Optional[FileStat]:
+    """文件的修改时间与大小，文件不存在（如正在被替换）时返回 None"""
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+@dataclass
+class WatchEntry:
+    """一张被监视的表"""
+
+    workspace: MultiExcelLoader
+    session_id: str
+    table_id: str
+    file_path: str
+    loaded_stat: Optional[FileStat]  # 上次加载时的文件状态
+    pending_stat: Optional[FileStat] = None  # 检测到变化后等待稳定的文件状态
+    reloading: bool = False
+
+
+class FileWatcher:
+    """轮询式源文件监视器"""
+
+    def __init__(self, interval_seconds: float = 5.0):
+        """
+        Args:
+            interval_seconds: 轮询间隔（秒）
+        """
+        self.interval_seconds = interval_seconds
+        self._entries: Dict[Tuple[int, str], WatchEntry] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, workspace: MultiExcelLoader, table_id: str) -> None:
+        """开始监视表的源文件（在当前会话中调用）"""
+        info = workspace.get_table_info(table_id)
+        if info is None:
+            raise ValueError(f"表不存在: {table_id}")
+
+        entry = WatchEntry(
+            workspace=workspace,
+            session_id=current_session_id(),
+            table_id=table_id,
+            file_path=info.file_path,
+            loaded_stat=_stat(info.file_path),
+        )
+        with self._lock:
+            self._entries[(id(workspace), table_id)] = entry
+        info.watched = True
+        self._ensure_started()
+
+    def unwatch(self, workspace: MultiExcelLoader, table_id: str) -> None:
+        """停止监视"""
+        with self._lock:
+            self._entries.pop((id(workspace), table_id), None)
+        info = workspace.get_table_info(table_id)
+        if info is not None:
+            info.watched = False
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="file-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"检查源文件变化失败: {e}")
+
+    def poll(self) -> None:
+        """检查一次所有被监视的文件，变化且已稳定的文件提交重新加载任务"""
+        with self._lock:
+            entries = list(self._entries.items())
+
+        for key, entry in entries:
+            workspace = entry.workspace
+            if workspace.closed or workspace.get_table(entry.table_id) is None:
+                # 表已删除或工作区已关闭
+                with self._lock:
+                    self._entries.pop(key, None)
+                continue
+            if entry.reloading:
+                continue
+
+            stat = _stat(entry.file_path)
+            if stat is None or stat == entry.loaded_stat:
+                entry.pending_stat = None
+                continue
+            if stat != entry.pending_stat:
+                # 文件可能仍在写入，等下一次检查结果一致后再重新加载
+                entry.pending_stat = stat
+                continue
+
+            entry.reloading = True
+            with use_session(entry.session_id):
+                get_job_manager().submit(
+                    "reload",
+                    self._reload_job(entry, stat),
+                    message=f"源文件已变化，重新加载: {entry.file_path}",
+                )
+
+    def _reload_job(self, entry: WatchEntry, stat: FileStat):
+        def run(job: Job) -> Dict[str, object]:
+            try:
+                structure = entry.workspace.reload_table(entry.table_id, job.update)
+            finally:
+                entry.loaded_stat = stat
+                entry.pending_stat = None
+                entry.reloading = False
+            return {
+                "success": True,
+                "table_id": entry.table_id,
+                "reloaded": structure is not None,
+                "structure": structure,
+            }
+
+        return run
+
+    def stop(self) -> None:
+        """停止后台轮询线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_seconds + 1)
+        self._thread = None
+
+
+# 全局实例
+_file_watcher: Optional[FileWatcher] = None
+
+
+def get_file_watcher() -> FileWatcher:
+    """获取全局 FileWatcher 实例"""
+    global _file_watcher
+    if _file_watcher is None:
+        _file_watcher = FileWatcher(get_config().excel.watch_interval_seconds)
+    return _file_watcher
+
+
+def reset_file_watcher() -> None:
+    """停止并重置全局 FileWatcher 实例"""
+    global _file_watcher
+    if _file_watcher is not None:
+        _file_watcher.stop()
+    _file_watcher = None
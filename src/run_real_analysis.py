@@ -31,8 +31,10 @@ async def run_analysis():
         loader = get_loader()
         # 注意：这里我们加载默认的 sheet，loader 会自动寻找并读取 "解释和逻辑" 和 "问题" sheet
         # 我们显式指定加载 'CostDataBase' Sheet，因为这才是我们要分析的数据
-        table_id, structure = loader.add_table(file_path, sheet_name="CostDataBase")
-        table7_id, table7_structure = loader.add_table(file_path, sheet_name="Table7")
+        # 两个 Sheet 来自同一个工作簿，一次性加载以共享工作簿解析
+        (table_id, structure), (table7_id, table7_structure) = loader.add_tables(
+            file_path, ["CostDataBase", "Table7"]
+        )
 
         logger.info(f"✅ 数据加载成功! Table ID: {table_id}  Table7 ID: {table7_id}")
         logger.info(
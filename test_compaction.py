@@ -0,0 +1,168 @@
+"""类型压缩测试：压缩只改变字符串维度的存储方式，不改变数值列的类型与聚合结果
+
+用法:
+    python -m pytest -q test_compaction.py
+    python test_compaction.py
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from excel_agent import tools  # noqa: E402
+from excel_agent.compaction import compact_dataframe  # noqa: E402
+from excel_agent.excel_loader import get_loader, reset_loader  # noqa: E402
+from excel_agent.indexes import ColumnIndex  # noqa: E402
+from excel_agent.predicates import compile_filters, evaluate  # noqa: E402
+from excel_agent.session import new_session_id, use_session  # noqa: E402
+
+
+def _frame(n_rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "Month": rng.choice(["Oct", "Nov", "Dec"], n_rows),
+            "Key": rng.choice(["K1", "K2", "K3"], n_rows),
+            # 整数值的金额（float32 可无损表示每个值，但累加会失真）
+            "Amount": rng.integers(1, 10_000_000, n_rows).astype(np.float64),
+            "Rate": rng.uniform(0, 1, n_rows),
+            "Qty": rng.integers(0, 300, n_rows),
+        }
+    )
+
+
+def test_numeric_columns_keep_their_dtype():
+    df = _frame(1_000)
+    compacted, report = compact_dataframe(df)
+
+    for name in ["Amount", "Rate", "Qty"]:
+        assert compacted[name].dtype == df[name].dtype, name
+        assert name not in report.converted_columns
+    assert isinstance(compacted["Key"].dtype, pd.CategoricalDtype)
+    assert compacted["Month"].cat.ordered
+
+    # 查询中的算术不会因窄整数溢出
+    assert (compacted["Qty"] * 1000).equals(df["Qty"] * 1000)
+
+
+def test_aggregates_unchanged_after_compaction():
+    df = _frame(200_000)
+    compacted, _ = compact_dataframe(df)
+
+    for name in ["Amount", "Rate", "Qty"]:
+        assert compacted[name].sum() == df[name].sum(), name
+        assert compacted[name].mean() == df[name].mean(), name
+
+    expected = df.groupby("Key")["Amount"].sum()
+    actual = compacted.groupby("Key", observed=True)["Amount"].sum()
+    assert actual.to_dict() == expected.to_dict()
+
+
+def test_counts_skip_unobserved_categories():
+    """筛选后 category 列中未出现的分类不计入唯一值，也不生成值为 0 的图表项"""
+    with tempfile.TemporaryDirectory() as directory, use_session(new_session_id()):
+        try:
+            path = os.path.join(directory, "CostDataBase.csv")
+            _frame(1_000).to_csv(path, index=False)
+            workspace = get_loader()
+            table_id, _ = workspace.add_table(path)
+            workspace.set_active_table(table_id)
+            assert isinstance(
+                workspace.get_active_loader().dataframe["Key"].dtype,
+                pd.CategoricalDtype,
+            )
+
+            only_k2 = [{"column": "Key", "operator": "==", "value": "K2"}]
+            result = tools.get_unique_values.invoke(
+                {"column": "Key", "filters": only_k2}
+            )
+            assert result["total_unique"] == 1
+            assert [v["value"] for v in result["values"]] == ["K2"]
+
+            for chart_type in ["pie", "bar"]:
+                chart = tools.generate_chart.invoke(
+                    {
+                        "chart_type": chart_type,
+                        "x_column": "Key",
+                        "group_by": "Key",
+                        "filters": only_k2,
+                    }
+                )
+                assert "error" not in chart, chart
+                assert "K1" not in str(chart), chart
+        finally:
+            reset_loader()
+
+
+def test_range_filters_on_compacted_string_columns():
+    """压缩为无序 category 的字符串列（如 Year、文本日期）按字符串比较大小，与压缩前一致"""
+    rng = np.random.default_rng(0)
+    days = [f"2025-11-{d:02d}" for d in range(1, 31)]
+    df = pd.DataFrame(
+        {
+            "Year": rng.choice(["FY24", "FY25", "FY26"], 3_000),
+            "Date": rng.choice(days, 3_000),
+        }
+    )
+    df.loc[::17, "Date"] = None
+    compacted, _ = compact_dataframe(df)
+    for name in ["Year", "Date"]:
+        assert isinstance(compacted[name].dtype, pd.CategoricalDtype), name
+        assert not compacted[name].cat.ordered, name
+
+    cases = [
+        ("Date", ">=", "2025-11-05"),
+        ("Date", "<", "2025-11-05"),
+        ("Year", ">", "FY24"),
+        ("Year", "<=", "FY25"),
+        ("Year", ">", "FY99"),
+    ]
+    for column, operator, value in cases:
+        mask = {
+            ">": df[column] > value,
+            "<": df[column] < value,
+            ">=": df[column] >= value,
+            "<=": df[column] <= value,
+        }[operator]
+        expected = np.flatnonzero(mask.to_numpy(dtype=bool))
+        predicates = compile_filters(
+            compacted, [{"column": column, "operator": operator, "value": value}]
+        )
+        index = ColumnIndex.build(compacted[column])
+        for index_of in [None, lambda c: index]:
+            rows = evaluate(compacted, predicates, index_of)
+            assert np.array_equal(rows, expected), (column, operator, value)
+
+    # 查询代码中的字符串比较同样可用
+    with tempfile.TemporaryDirectory() as directory, use_session(new_session_id()):
+        try:
+            path = os.path.join(directory, "CostDataBase.csv")
+            df.to_csv(path, index=False)
+            workspace = get_loader()
+            table_id, _ = workspace.add_table(path)
+            workspace.set_active_table(table_id)
+            loaded = workspace.get_table(table_id).dataframe
+            assert isinstance(loaded["Year"].dtype, pd.CategoricalDtype)
+
+            result = tools.execute_pandas_query.invoke(
+                {"query": "(CostDataBase['Year'] > 'FY24').sum()"}
+            )
+            assert "error" not in result, result
+            assert result["result"] == int((df["Year"] > "FY24").sum())
+            # 还原类型只发生在查询副本上
+            assert isinstance(loaded["Year"].dtype, pd.CategoricalDtype)
+        finally:
+            reset_loader()
+
+
+if __name__ == "__main__":
+    test_numeric_columns_keep_their_dtype()
+    test_aggregates_unchanged_after_compaction()
+    test_counts_skip_unobserved_categories()
+    test_range_filters_on_compacted_string_columns()
+    print("ok")
@@ -0,0 +1,157 @@
+"""增量数据测试：追加前校验列类型，追加后依赖该表的连接表返回新数据
+
+用法:
+    python -m pytest -q test_delta.py
+    python test_delta.py
+"""
+
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from excel_agent.config import SheetSchema, get_config  # noqa: E402
+from excel_agent.excel_loader import get_loader, reset_loader  # noqa: E402
+from excel_agent.sheet_schema import SchemaDriftError  # noqa: E402
+from excel_agent.session import new_session_id, use_session  # noqa: E402
+
+BASE = pd.DataFrame(
+    {
+        "Month": ["Oct", "Nov", "Dec", "Oct"] * 25,
+        "Key": ["K1", "K2", "K1", "K2"] * 25,
+        "Amount": [10.0, 20.0, 30.0, 40.0] * 25,
+    }
+)
+RATES = pd.DataFrame({"Key": ["K1", "K2", "K3"], "Rate": [0.5, 0.25, 1.0]})
+
+
+def _write(directory: str, name: str, df: pd.DataFrame) -> str:
+    path = os.path.join(directory, f"{name}.csv")
+    df.to_csv(path, index=False)
+    return path
+
+
+def _load(directory: str):
+    """在当前会话中加载测试表，返回 (工作区, CostDataBase 表ID, Table7 表ID)"""
+    workspace = get_loader()
+    cdb_id, _ = workspace.add_table(_write(directory, "CostDataBase", BASE))
+    t7_id, _ = workspace.add_table(_write(directory, "Table7", RATES))
+    return workspace, cdb_id, t7_id
+
+
+def test_delta_with_non_text_values_in_text_column_is_rejected():
+    with tempfile.TemporaryDirectory() as directory, use_session(new_session_id()):
+        try:
+            workspace, cdb_id, _ = _load(directory)
+            table = workspace.get_table(cdb_id)
+            assert isinstance(table.dataframe["Key"].dtype, pd.CategoricalDtype)
+            before = table.dataframe
+
+            delta = pd.DataFrame({"Month": ["Oct"], "Key": [5], "Amount": [1.0]})
+            try:
+                workspace.append_table(cdb_id, _write(directory, "delta", delta))
+            except ValueError as e:
+                assert "Key" in str(e)
+            else:
+                raise AssertionError("文本列写入数值时应报错")
+
+            # 表数据与分类都未改变
+            assert table.dataframe is before
+            assert list(table.dataframe["Key"].cat.categories) == ["K1", "K2"]
+        finally:
+            reset_loader()
+
+
+def test_join_reflects_appended_rows():
+    with tempfile.TemporaryDirectory() as directory, use_session(new_session_id()):
+        try:
+            workspace, cdb_id, t7_id = _load(directory)
+            join_id, _ = workspace.join_tables(cdb_id, t7_id, ["Key"], ["Key"])
+            assert workspace.get_table_info(join_id).total_rows == len(BASE)
+
+            delta = pd.DataFrame(
+                {"Month": ["Oct", "Nov"], "Key": ["K3", "K1"], "Amount": [5.0, 6.0]}
+            )
+            workspace.append_table(cdb_id, _write(directory, "delta", delta))
+
+            joined = workspace.get_table(join_id).dataframe
+            expected = workspace.get_table(cdb_id).dataframe.merge(
+                workspace.get_table(t7_id).dataframe, on="Key"
+            )
+            assert len(joined) == len(BASE) + 2
+            assert workspace.get_table_info(join_id).total_rows == len(joined)
+            assert joined["Amount"].sum() == expected["Amount"].sum()
+            assert "K3" in set(joined["Key"].astype(str))
+        finally:
+            reset_loader()
+
+
+def test_delta_violating_schema_raises_schema_drift():
+    schemas = get_config().excel.sheet_schemas
+    schemas["CostDataBase"] = SheetSchema(
+        categorical=["Key"],
+        ordered={"Month": ["Oct", "Nov", "Dec"]},
+    )
+    with tempfile.TemporaryDirectory() as directory, use_session(new_session_id()):
+        try:
+            workspace, cdb_id, _ = _load(directory)
+            table = workspace.get_table(cdb_id)
+            before = table.dataframe
+            assert before["Month"].cat.ordered
+
+            for delta in [
+                pd.DataFrame({"Month": ["Foo"], "Key": ["K1"], "Amount": [1.0]}),
+                pd.DataFrame({"Month": ["Oct"], "Key": [5], "Amount": [1.0]}),
+            ]:
+                try:
+                    workspace.append_table(cdb_id, _write(directory, "delta", delta))
+                except SchemaDriftError:
+                    pass
+                else:
+                    raise AssertionError(f"不符合声明结构的增量应报错: {delta}")
+
+            assert table.dataframe is before
+            assert list(before["Month"].cat.categories) == ["Oct", "Nov", "Dec"]
+
+            # 符合声明的增量正常追加，有序维度的分类不变
+            delta = pd.DataFrame({"Month": ["Dec"], "Key": ["K3"], "Amount": [1.0]})
+            workspace.append_table(cdb_id, _write(directory, "delta", delta))
+            after = table.dataframe
+            assert len(after) == len(BASE) + 1
+            assert list(after["Month"].cat.categories) == ["Oct", "Nov", "Dec"]
+            assert after["Month"].cat.ordered
+        finally:
+            schemas.pop("CostDataBase", None)
+            reset_loader()
+
+
+def test_reload_keeps_appended_rows_when_source_unchanged():
+    with tempfile.TemporaryDirectory() as directory, use_session(new_session_id()):
+        try:
+            workspace, cdb_id, _ = _load(directory)
+            delta = pd.DataFrame({"Month": ["Oct"], "Key": ["K1"], "Amount": [1.0]})
+            workspace.append_table(cdb_id, _write(directory, "delta", delta))
+
+            # 只更新修改时间（如编辑器保存了相同内容），不重新加载
+            source = workspace.get_table_info(cdb_id).file_path
+            os.utime(source)
+            assert workspace.reload_table(cdb_id) is None
+            assert len(workspace.get_table(cdb_id).dataframe) == len(BASE) + 1
+
+            # 内容变化时以源文件为准
+            _write(directory, "CostDataBase", BASE.head(10))
+            assert workspace.reload_table(cdb_id) is not None
+            assert len(workspace.get_table(cdb_id).dataframe) == 10
+        finally:
+            reset_loader()
+
+
+if __name__ == "__main__":
+    test_delta_with_non_text_values_in_text_column_is_rejected()
+    test_join_reflects_appended_rows()
+    test_delta_violating_schema_raises_schema_drift()
+    test_reload_keeps_appended_rows_when_source_unchanged()
+    print("ok")
@@ -24,7 +24,10 @@ def test_hitl_feedback_loop():
 
     # 2. 确保已加载数据
     print("📂 Loading Excel file...")
-    requests.post(f"{BASE_URL}/load", json={"file_path": r"D:\AI_Python\AI2\AI2\back_end_code\Data\Function cost allocation analysis to IT 20260104.xlsx"})
+    job = requests.post(f"{BASE_URL}/load", json={"file_path": r"D:\AI_Python\AI2\AI2\back_end_code\Data\Function cost allocation analysis to IT 20260104.xlsx"}).json()
+    # 加载在后台任务中进行，等待完成
+    while requests.get(f"{BASE_URL}/jobs/{job['job_id']}").json()["status"] in ("pending", "running"):
+        time.sleep(0.5)
     
     # 3. 发起提问
     query = "IT cost 有哪些服务"
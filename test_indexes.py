@@ -0,0 +1,128 @@
+"""索引测试：全文索引、列索引与筛选结果必须与逐行扫描一致
+
+用法:
+    python -m pytest -q test_indexes.py
+    python test_indexes.py
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from excel_agent.excel_loader import get_loader, reset_loader  # noqa: E402
+from excel_agent.indexes import ColumnIndex, get_column_index  # noqa: E402
+from excel_agent.search_index import get_search_index  # noqa: E402
+from excel_agent.session import new_session_id, use_session  # noqa: E402
+
+
+def _frame(n_rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "Year": rng.choice(["FY24", "FY25"], n_rows),
+            "Key": rng.choice(["K1", "K2", "K3"], n_rows),
+            "Cost text": [f"服务{i % 50}" for i in range(n_rows)],
+            "Amount": rng.uniform(-1e3, 1e5, n_rows).round(2),
+            "Remark": [f"凭证 {i:08d} 摘要" for i in range(n_rows)],
+        }
+    )
+    df.loc[::7, "Remark"] = None
+    return df
+
+
+def _load(directory: str, df: pd.DataFrame):
+    """在当前会话中加载测试表，返回 (工作区, 加载器)"""
+    path = os.path.join(directory, "CostDataBase.csv")
+    df.to_csv(path, index=False)
+    workspace = get_loader()
+    table_id, _ = workspace.add_table(path)
+    workspace.set_active_table(table_id)
+    return workspace, workspace.get_active_loader()
+
+
+def _scan_search(df: pd.DataFrame, keyword: str, columns=None) -> np.ndarray:
+    """逐行扫描的搜索结果（不区分大小写，按字面匹配，空值不命中）"""
+    mask = np.zeros(len(df), dtype=bool)
+    for c in columns or df.columns:
+        text = df[c].astype(str).str.lower()
+        hit = text.str.contains(keyword.lower(), regex=False) & df[c].notna()
+        mask |= hit.to_numpy()
+    return np.flatnonzero(mask)
+
+
+def test_search_index_matches_scan():
+    with tempfile.TemporaryDirectory() as directory, use_session(new_session_id()):
+        try:
+            workspace, table = _load(directory, _frame(20_000))
+            source = table.dataframe
+            index = get_search_index(table)
+
+            # 逐行不同的列不进入索引，搜索时扫描
+            assert "Remark" in index.scan_columns
+            assert "Amount" in index.scan_columns
+            assert "Cost text" not in index.scan_columns
+
+            for keyword in ["服务1", "fy2", "K", "0001", "摘要", "12.5", "nan"]:
+                for columns in [None, ["Remark"], ["Cost text", "Amount"]]:
+                    rows, _ = index.search(source, keyword, columns)
+                    expected = _scan_search(source, keyword, columns)
+                    assert np.array_equal(rows, expected), (keyword, columns)
+
+            # 索引占用的内存计入预算统计
+            assert table.index_bytes >= index.nbytes > 0
+            assert workspace.memory_usage()["index_bytes"] == table.index_bytes
+        finally:
+            reset_loader()
+
+
+def test_index_after_upsert_matches_rebuild():
+    with tempfile.TemporaryDirectory() as directory, use_session(new_session_id()):
+        try:
+            _, table = _load(directory, _frame(20_000))
+            columns = ["Year", "Key", "Cost text"]
+            before = {c: get_column_index(table, c) for c in columns}
+            assert all(index is not None for index in before.values())
+            get_search_index(table)
+
+            # 按键替换两个键的全部行，并写入新键与新取值
+            delta = pd.DataFrame(
+                {
+                    "Year": ["FY25", "FY26", "FY24"],
+                    "Key": ["K4", "K1", "K4"],
+                    "Cost text": ["服务3", "服务7", "服务999"],
+                    "Amount": [1.0, 2.0, 3.0],
+                    "Remark": ["新增 摘要", None, "凭证 00000003 摘要"],
+                }
+            )
+            result = table.apply_delta(delta, key_columns=["Cost text"])
+            assert result["replaced"] > 0
+            source = table.dataframe
+
+            for c in columns:
+                updated = get_column_index(table, c)
+                assert updated is not before[c], c  # 在旧索引上增量更新
+                rebuilt = ColumnIndex.build(source[c])
+                assert updated.n_rows == rebuilt.n_rows == len(source)
+                assert set(updated.values) == set(rebuilt.values), c
+                for value in rebuilt.values:
+                    assert np.array_equal(
+                        updated.lookup(value), rebuilt.lookup(value)
+                    ), (c, value)
+
+            rows, _ = get_search_index(table).search(source, "服务99")
+            assert np.array_equal(rows, _scan_search(source, "服务99"))
+            rows, _ = get_search_index(table).search(source, "k4")
+            assert np.array_equal(rows, _scan_search(source, "k4"))
+        finally:
+            reset_loader()
+
+
+if __name__ == "__main__":
+    test_search_index_matches_scan()
+    test_index_after_upsert_matches_rebuild()
+    print("ok")
@@ -0,0 +1,104 @@
+"""筛选条件测试：字符串条件按不同取值求值，结果与逐行比较一致；命中行号按表的数据版本缓存
+
+用法:
+    python -m pytest -q test_predicates.py
+    python test_predicates.py
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from excel_agent.excel_loader import get_loader, reset_loader  # noqa: E402
+from excel_agent.indexes import ColumnIndex  # noqa: E402
+from excel_agent.predicates import compile_filters, evaluate, filter_rows  # noqa: E402
+from excel_agent.session import new_session_id, use_session  # noqa: E402
+
+
+def _dates(n_rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    days = pd.date_range("2025-09-01", "2026-02-28", freq="D")
+    df = pd.DataFrame({"Date": rng.choice(days, n_rows)})
+    df.loc[::11, "Date"] = pd.NaT
+    return df
+
+
+def test_prefix_matches_datetime_column():
+    df = _dates(5_000)
+    col = df["Date"]
+    assert pd.api.types.is_datetime64_any_dtype(col.dtype)
+    index = ColumnIndex.build(col)
+
+    compact = col.dt.strftime("%Y%m%d")
+    text = col.astype(str)
+    cases = [
+        ("startswith", "202511", compact.str.startswith("202511")),
+        ("startswith", "2025-11", text.str.startswith("2025-11")),
+        ("contains", "1104", compact.str.contains("1104")),
+        ("endswith", "01", compact.str.endswith("01")),
+    ]
+    for operator, value, expected in cases:
+        expected = np.flatnonzero(expected.to_numpy(dtype=bool, na_value=False))
+        assert len(expected), (operator, value)
+        predicates = compile_filters(
+            df, [{"column": "Date", "operator": operator, "value": value}]
+        )
+        # 逐列扫描与查索引两条路径结果一致，空值不命中
+        scanned = evaluate(df, predicates)
+        indexed = evaluate(df, predicates, lambda c: index)
+        assert np.array_equal(scanned, expected), (operator, value)
+        assert np.array_equal(indexed, expected), (operator, value)
+
+
+def test_cached_rows_follow_table_version():
+    df = pd.DataFrame(
+        {
+            "Year": ["FY24", "FY25"] * 50,
+            "Key": ["K1", "K2", "K3", "K4"] * 25,
+            "Amount": np.arange(100, dtype=np.float64),
+        }
+    )
+    with tempfile.TemporaryDirectory() as directory, use_session(new_session_id()):
+        try:
+            path = os.path.join(directory, "CostDataBase.csv")
+            df.to_csv(path, index=False)
+            workspace = get_loader()
+            table_id, _ = workspace.add_table(path)
+            table = workspace.get_table(table_id)
+
+            filters = [
+                {"column": "Year", "operator": "==", "value": "FY25"},
+                {"column": "Amount", "operator": ">", "value": 50},
+            ]
+            rows = filter_rows(table, filters)
+            expected = np.flatnonzero((df["Year"] == "FY25") & (df["Amount"] > 50))
+            assert np.array_equal(rows, expected)
+
+            # 条件顺序不同、不完整的条件不影响缓存键，命中同一份结果
+            same = [{"column": "Key", "operator": "==", "value": None}]
+            assert filter_rows(table, same + filters[::-1]) is rows
+            # 比较值类型不同的条件分开缓存
+            as_text = [filters[0], dict(filters[1], value="50")]
+            assert filter_rows(table, as_text) is not rows
+
+            # 数据变化后版本递增，不再返回旧结果
+            version = table.version
+            delta = pd.DataFrame({"Year": ["FY25"], "Key": ["K1"], "Amount": [99.5]})
+            table.apply_delta(delta)
+            assert table.version != version
+            after = filter_rows(table, filters)
+            assert after is not rows
+            assert np.array_equal(after, np.append(expected, len(df)))
+        finally:
+            reset_loader()
+
+
+if __name__ == "__main__":
+    test_prefix_matches_datetime_column()
+    test_cached_rows_follow_table_version()
+    print("ok")
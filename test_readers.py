@@ -0,0 +1,104 @@
+"""读取后端测试：CSV 分块读取时的编码回退、只读表头，以及大 Sheet 流式读取的列类型
+
+用法:
+    python -m pytest -q test_readers.py
+    python test_readers.py
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from excel_agent.config import get_config  # noqa: E402
+from excel_agent.readers import CsvReader, ExcelReader  # noqa: E402
+
+
+def test_csv_encoding_detected_after_first_chunk():
+    """前几块都是 ASCII、之后才出现 GB18030 中文的文件也能读取"""
+    excel_config = get_config().excel
+    chunk_rows = excel_config.streaming_chunk_rows
+    excel_config.streaming_chunk_rows = 1_000
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "CostDataBase.csv")
+            texts = ["service"] * 200_000 + ["服务"] * 100
+            df = pd.DataFrame({"Cost text": texts, "Amount": range(len(texts))})
+            df.to_csv(path, index=False, encoding="gb18030")
+
+            reader = CsvReader(path)
+            result = reader.parse("CostDataBase")
+            assert len(result) == len(df)
+            assert result["Cost text"].astype(str).tolist() == texts
+            assert result["Amount"].sum() == df["Amount"].sum()
+    finally:
+        excel_config.streaming_chunk_rows = chunk_rows
+
+
+def test_csv_header_reads_no_rows():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "Table7.csv")
+        pd.DataFrame({"Key": ["K1"] * 10, "RateNo": [0.5] * 10}).to_csv(
+            path, index=False
+        )
+        reader = CsvReader(path)
+        assert reader.header("Table7") == ["Key", "RateNo"]
+        assert len(reader.parse("Table7", nrows=0)) == 0
+
+
+def test_streaming_sheet_matches_read_excel_dtypes():
+    """前若干行为空的列，流式读取的类型与 pd.read_excel 一致（不退化为 object）"""
+    from openpyxl import Workbook
+
+    excel_config = get_config().excel
+    saved = excel_config.streaming_threshold_cells, excel_config.streaming_chunk_rows
+    excel_config.streaming_threshold_cells = 1
+    excel_config.streaming_chunk_rows = 100
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "CostDataBase.xlsx")
+            # 普通模式写入（只写模式不记录 Sheet 尺寸，读取时无法判断是否走流式读取）
+            wb = Workbook()
+            ws = wb.active
+            ws.title = "CostDataBase"
+            ws.append(["Key", "Amount", "Qty", "Date", "Text", "Mixed", "Blank"])
+            for i in range(500):
+                # 前 250 行（多个完整分块）只有 Key 有值
+                late = i >= 250
+                ws.append(
+                    [
+                        f"K{i % 4}",
+                        i * 1.5 if late else None,
+                        i if late else None,
+                        datetime(2025, 11, 1 + i % 28) if late else None,
+                        f"服务{i}" if late else None,
+                        (i if i % 2 else i + 0.5) if late else None,
+                        None,
+                    ]
+                )
+            wb.save(path)
+
+            expected = pd.read_excel(path, sheet_name="CostDataBase")
+            reader = ExcelReader(path)
+            try:
+                result = reader.parse("CostDataBase")
+            finally:
+                reader.close()
+            assert result.dtypes.to_dict() == expected.dtypes.to_dict()
+            pd.testing.assert_frame_equal(result, expected)
+    finally:
+        (
+            excel_config.streaming_threshold_cells,
+            excel_config.streaming_chunk_rows,
+        ) = saved
+
+
+if __name__ == "__main__":
+    test_csv_encoding_detected_after_first_chunk()
+    test_csv_header_reads_no_rows()
+    test_streaming_sheet_matches_read_excel_dtypes()
+    print("ok")
@@ -0,0 +1,77 @@
+"""快照测试：保存后恢复的工作区与原工作区的数据一致
+
+用法:
+    python -m pytest -q test_snapshot.py
+    python test_snapshot.py
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from excel_agent.excel_loader import get_loader, reset_loader  # noqa: E402
+from excel_agent.session import new_session_id, use_session  # noqa: E402
+from excel_agent.snapshot import restore_snapshot, save_snapshot  # noqa: E402
+
+
+def _frame(n_rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "Month": rng.choice(["Oct", "Nov", "Dec"], n_rows),
+            "Key": rng.choice(["K1", "K2", "K3"], n_rows),
+            "Amount": rng.uniform(-1e3, 1e5, n_rows).round(2),
+            "Qty": rng.integers(0, 300, n_rows),
+            "Remark": [f"凭证 {i:06d}" for i in range(n_rows)],
+        }
+    )
+    df.loc[::9, "Remark"] = None
+    df.loc[::13, "Amount"] = np.nan
+    return df
+
+
+def test_restored_tables_equal_saved_tables():
+    with tempfile.TemporaryDirectory() as directory, use_session(new_session_id()):
+        try:
+            cdb_path = os.path.join(directory, "CostDataBase.csv")
+            t7_path = os.path.join(directory, "Table7.csv")
+            _frame(5_000).to_csv(cdb_path, index=False)
+            rates = pd.DataFrame({"Key": ["K1", "K2", "K3"], "Rate": [0.5, 0.25, 1.0]})
+            rates.to_csv(t7_path, index=False)
+
+            workspace = get_loader()
+            cdb_id, _ = workspace.add_table(cdb_path)
+            t7_id, _ = workspace.add_table(t7_path)
+            join_id, _ = workspace.join_tables(cdb_id, t7_id, ["Key"], ["Key"])
+            workspace.set_active_table(cdb_id)
+            saved = {
+                table_id: workspace.get_table(table_id).dataframe.copy()
+                for table_id in (cdb_id, t7_id, join_id)
+            }
+
+            snapshot_dir = os.path.join(directory, "snapshot")
+            assert save_snapshot(snapshot_dir)["tables"] >= 3
+
+            # 模拟服务重启：丢弃内存中的工作区后从快照恢复
+            reset_loader()
+            assert not get_loader().is_loaded
+            assert restore_snapshot(snapshot_dir)["tables"] == 3
+
+            restored = get_loader()
+            assert restored is not workspace
+            assert restored.active_table_id == cdb_id
+            for table_id, expected in saved.items():
+                actual = restored.get_table(table_id).dataframe
+                pd.testing.assert_frame_equal(actual, expected, check_exact=True)
+        finally:
+            reset_loader()
+
+
+if __name__ == "__main__":
+    test_restored_tables_equal_saved_tables()
+    print("ok")
@@ -0,0 +1,66 @@
+"""溢出测试：共享同一数据的表共用一个溢出文件，最后一个引用释放时才删除
+
+用法:
+    python -m pytest -q test_spill.py
+    python test_spill.py
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from excel_agent.excel_loader import get_loader, reset_loader  # noqa: E402
+from excel_agent.session import new_session_id, use_session  # noqa: E402
+
+
+def test_shared_tables_spill_to_one_file():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "Key": rng.choice(["K1", "K2", "K3"], 10_000),
+            "Amount": rng.uniform(0, 1e5, 10_000).round(2),
+        }
+    )
+    sessions = [new_session_id(), new_session_id()]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "CostDataBase.csv")
+        df.to_csv(path, index=False)
+        spill_dir = os.path.join(directory, "spill")
+        try:
+            tables = []
+            for session_id in sessions:
+                with use_session(session_id):
+                    workspace = get_loader()
+                    table_id, _ = workspace.add_table(path)
+                    tables.append((workspace, table_id, workspace.get_table(table_id)))
+            (ws_a, id_a, a), (ws_b, id_b, b) = tables
+            assert a is not b and a.share_key == b.share_key
+            expected = a.dataframe.copy()
+
+            assert a.spill(spill_dir) and b.spill(spill_dir)
+            assert len(os.listdir(spill_dir)) == 1
+
+            # 一张表被删除后文件仍在，另一张表照常读回
+            ws_a.remove_table(id_a)
+            assert len(os.listdir(spill_dir)) == 1
+            pd.testing.assert_frame_equal(b.dataframe, expected)
+
+            # 读回后再次溢出复用同一文件，最后一个引用释放时删除
+            assert b.spill(spill_dir)
+            assert len(os.listdir(spill_dir)) == 1
+            ws_b.remove_table(id_b)
+            assert os.listdir(spill_dir) == []
+        finally:
+            for session_id in sessions:
+                with use_session(session_id):
+                    reset_loader()
+
+
+if __name__ == "__main__":
+    test_shared_tables_spill_to_one_file()
+    print("ok")
@@ -0,0 +1,228 @@
+"""工具只读测试：工具调用不得修改共享的表，也不得按整表大小复制数据
+
+用法:
+    python -m pytest -q test_tools_readonly.py
+    python test_tools_readonly.py
+"""
+
+import os
+import sys
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from excel_agent import tools  # noqa: E402
+from excel_agent.excel_loader import get_loader, reset_loader  # noqa: E402
+from excel_agent.session import new_session_id, use_session  # noqa: E402
+
+MONTHS = ["Oct", "Nov", "Dec", "Jan", "Feb", "Mar"]
+KEYS = ["K1", "K2", "K3", "K4"]
+
+
+def _write_tables(directory: str, n_rows: int) -> list:
+    """生成 CostDataBase / Table7 结构的 CSV（表名取自文件名）"""
+    rng = np.random.default_rng(0)
+    cdb = pd.DataFrame(
+        {
+            "Year": rng.choice(["FY24", "FY25"], n_rows),
+            "Scenario": rng.choice(["Actual", "Budget1"], n_rows),
+            "Month": rng.choice(MONTHS, n_rows),
+            "Function": rng.choice(["IT Allocation", "HR Allocation", "IT"], n_rows),
+            "Key": rng.choice(KEYS, n_rows),
+            "Cost text": [f"服务{i % 500}" for i in range(n_rows)],
+            "Category": rng.choice(["A", "B", "C"], n_rows),
+            "Amount": rng.uniform(-1e3, 1e5, n_rows).round(2),
+            "Remark": [f"凭证 {i:08d} 摘要" for i in range(n_rows)],
+        }
+    )
+    t7 = pd.DataFrame(
+        [
+            {
+                "Year": year,
+                "Scenario": scenario,
+                "Month": month,
+                "Key": key,
+                "BL": bl,
+                "CC": 1000 + i,
+                "RateNo": 0.25,
+            }
+            for year in ["FY24", "FY25"]
+            for scenario in ["Actual", "Budget1"]
+            for month in MONTHS
+            for key in KEYS
+            for i, bl in enumerate(["CT", "MI"])
+        ]
+    )
+    paths = []
+    for name, df in [("CostDataBase", cdb), ("Table7", t7)]:
+        path = os.path.join(directory, f"{name}.csv")
+        df.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def _load(directory: str, n_rows: int):
+    """在当前会话中加载测试表（CSV 写入 directory），返回 CostDataBase 加载器"""
+    cdb_path, t7_path = _write_tables(directory, n_rows)
+    workspace = get_loader()
+    workspace.add_table(t7_path)
+    table_id, _ = workspace.add_table(cdb_path)
+    workspace.set_active_table(table_id)
+    return workspace.get_active_loader()
+
+
+# 每个工具的调用参数（覆盖无筛选与有筛选两条路径）
+FILTERS = [
+    {"column": "Year", "operator": "==", "value": "FY25"},
+    {"column": "Amount", "operator": ">", "value": 100},
+]
+# 约 1% 的行命中
+SELECTIVE = [
+    {"column": "Year", "operator": "==", "value": "FY25"},
+    {"column": "Month", "operator": "==", "value": "Oct"},
+    {"column": "Key", "operator": "==", "value": "K1"},
+]
+TOOL_CALLS = [
+    (tools.filter_data, {"filters": FILTERS, "sort_by": "Amount"}),
+    (tools.filter_data, {"sort_by": "Amount", "ascending": False, "limit": 5}),
+    (tools.filter_data, {"column": "Cost text", "operator": "contains", "value": "1"}),
+    (tools.aggregate_data, {"column": "Amount", "agg_func": "sum"}),
+    (
+        tools.aggregate_data,
+        {"column": "Amount", "agg_func": "mean", "filters": FILTERS},
+    ),
+    (
+        tools.group_and_aggregate,
+        {"group_by": "Month", "agg_column": "Amount", "agg_func": "sum"},
+    ),
+    (
+        tools.group_and_aggregate,
+        {
+            "group_by": "Key",
+            "agg_column": "Amount",
+            "agg_func": "max",
+            "filters": FILTERS,
+        },
+    ),
+    (tools.sort_data, {"column": "Amount", "ascending": False}),
+    (
+        tools.sort_data,
+        {"column": "Month", "filters": FILTERS, "select_columns": ["Month", "Amount"]},
+    ),
+    (tools.search_data, {"keyword": "服务1"}),
+    (tools.get_column_stats, {"column": "Amount"}),
+    (tools.get_column_stats, {"column": "Amount", "filters": FILTERS}),
+    (tools.get_unique_values, {"column": "Function"}),
+    (tools.get_unique_values, {"column": "Key", "filters": FILTERS}),
+    (tools.get_data_preview, {"n_rows": 5}),
+    (
+        tools.generate_chart,
+        {"chart_type": "bar", "x_column": "Month", "y_column": "Amount"},
+    ),
+    (
+        tools.generate_chart,
+        {"group_by": "Category", "y_column": "Amount", "filters": FILTERS},
+    ),
+    (
+        tools.execute_pandas_query,
+        {"query": "CostDataBase.groupby('Month', observed=True)['Amount'].sum()"},
+    ),
+    (
+        tools.execute_pandas_query,
+        {"query": "CostDataBase['Amount'] = 0\nCostDataBase['Amount'].sum()"},
+    ),
+    (
+        tools.execute_pandas_query,
+        {
+            "query": "CostDataBase.loc[CostDataBase['Amount'] > 0, 'Amount'] = -1\nCostDataBase"
+        },
+    ),
+    (
+        tools.execute_pandas_query,
+        {"query": "a = CostDataBase['Amount'].values\na.sort()\na[0]"},
+    ),
+    (
+        tools.execute_pandas_query,
+        {"query": "k = CostDataBase['Key'].values\nk[:] = 'K4'\nk[0]"},
+    ),
+    (
+        tools.calculate_allocated_costs,
+        {
+            "target": "CT",
+            "target_type": "BL",
+            "year": "FY25",
+            "scenario": "Actual",
+            "function": "IT Allocation",
+        },
+    ),
+    (tools.analyze_cost_composition, {"year": "FY25", "scenario": "Actual"}),
+    (
+        tools.compare_scenarios,
+        {
+            "year1": "FY24",
+            "scenario1": "Actual",
+            "year2": "FY25",
+            "scenario2": "Budget1",
+        },
+    ),
+]
+
+
+def test_tools_do_not_mutate_shared_table():
+    with tempfile.TemporaryDirectory() as directory, use_session(new_session_id()):
+        try:
+            table = _load(directory, 2_000)
+            shared = table.dataframe
+            expected = shared.copy(deep=True)
+
+            for tool, args in TOOL_CALLS:
+                result = tool.invoke(args)
+                assert "error" not in result, f"{tool.name}{args}: {result}"
+
+                # 仍是同一个对象，且内容、列、类型都未改变
+                assert table.dataframe is shared, f"{tool.name} 替换了共享的表"
+                pd.testing.assert_frame_equal(
+                    shared, expected, obj=f"{tool.name}{args} 之后的共享表"
+                )
+        finally:
+            reset_loader()
+
+
+def test_tool_memory_scales_with_result():
+    """聚合、取唯一值、排序取前几行等的分配峰值应远小于表本身"""
+    with tempfile.TemporaryDirectory() as directory, use_session(new_session_id()):
+        try:
+            table = _load(directory, 200_000)
+            table_bytes = int(table.dataframe.memory_usage(deep=True).sum())
+            calls = [
+                (tools.aggregate_data, {"column": "Amount", "agg_func": "sum"}),
+                (
+                    tools.aggregate_data,
+                    {"column": "Amount", "agg_func": "sum", "filters": SELECTIVE},
+                ),
+                (tools.get_unique_values, {"column": "Function"}),
+                (tools.filter_data, {"sort_by": "Amount", "limit": 10}),
+                (tools.get_column_stats, {"column": "Amount", "filters": SELECTIVE}),
+                (tools.filter_data, {"filters": SELECTIVE, "limit": 10}),
+            ]
+            for tool, args in calls:
+                tool.invoke(args)  # 预热（构建缓存等）
+                tracemalloc.start()
+                tool.invoke(args)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                assert (
+                    peak < table_bytes / 4
+                ), f"{tool.name}{args}: 峰值 {peak} 字节，表 {table_bytes} 字节"
+        finally:
+            reset_loader()
+
+
+if __name__ == "__main__":
+    test_tools_do_not_mutate_shared_table()
+    test_tool_memory_scales_with_result()
+    print("ok")